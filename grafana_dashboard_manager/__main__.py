@@ -7,11 +7,7 @@ https://opensource.org/licenses/MIT.
 """
 
 import argparse
-
-from grafana_dashboard_manager.commands import download_dashboards, upload_dashboards
-from grafana_dashboard_manager.global_config import GlobalConfig
-from grafana_dashboard_manager.grafana import GrafanaApi
-from grafana_dashboard_manager.utils import configure_logging, show_info
+from contextlib import nullcontext
 
 
 def app():
@@ -34,6 +30,12 @@ def app():
         type=int,
         help="An optional property that specifies the organization to which the action is applied.",
     )
+    parent_parser.add_argument(
+        "--all-orgs",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Apply the action to every organization, using a subdirectory for each. Requires a server admin login",
+    )
     parent_parser.add_argument("-v", "--verbose", action="count", default=0, help="Verbosity level")
     parent_parser.add_argument(
         "--non-interactive",
@@ -44,12 +46,68 @@ def app():
     parent_parser.add_argument(
         "--skip-home", default=False, action=argparse.BooleanOptionalAction, help="Do not set the home dashboard"
     )
+    parent_parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="Number of concurrent requests to make to Grafana (default 1)"
+    )
+    parent_parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="Number of times to retry a request after a connection error or a 429/5xx response (default 5)",
+    )
+    parent_parser.add_argument(
+        "--max-connections", type=int, help="Size of the HTTP connection pool (default: the larger of 100 and --jobs)"
+    )
+    parent_parser.add_argument(
+        "--keepalive-expiry", type=float, default=5.0, help="Seconds to keep idle connections open (default 5)"
+    )
+    parent_parser.add_argument(
+        "--http2",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Multiplex requests over HTTP/2 connections, requires httpx[http2]",
+    )
+    parent_parser.add_argument(
+        "--compression",
+        default=True,
+        action=argparse.BooleanOptionalAction,
+        help="Request gzip (or brotli, if installed) compressed responses",
+    )
+    parent_parser.add_argument(
+        "--connect-timeout", type=float, default=5.0, help="Seconds to wait to establish a connection (default 5)"
+    )
+    parent_parser.add_argument(
+        "--read-timeout", type=float, default=30.0, help="Seconds to wait for a response to be received (default 30)"
+    )
+    parent_parser.add_argument(
+        "--metrics-file",
+        type=str,
+        help="Write request and timing metrics at the end of the run, as a Prometheus textfile if the name ends in "
+        ".prom and as json otherwise",
+    )
+    parent_parser.add_argument(
+        "--profile",
+        type=str,
+        help="Profile the command and write the profile to this file in the pstats format, with a summary of the "
+        "hottest functions alongside it",
+    )
+    parent_parser.add_argument(
+        "--profile-memory",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Also trace memory allocations when profiling, which is much slower",
+    )
+    parent_parser.add_argument(
+        "--profile-top", type=int, default=25, help="Number of entries in the profile summary (default 25)"
+    )
     parent_parser.add_argument(
         "--skip-verify", default=False, action=argparse.BooleanOptionalAction, help="Skip HTTPS server cert validation"
     )
 
     # Add subcommands
-    sub_parsers = parser.add_subparsers(title="Commands", required=True, help="Read/Write Dashboard JSONs:")
+    sub_parsers = parser.add_subparsers(
+        title="Commands", dest="command", required=True, help="Read/Write Dashboard JSONs:"
+    )
 
     # Upload
     parser_upload = sub_parsers.add_parser(
@@ -57,41 +115,212 @@ def app():
         help="Inserts (and overwrites) dashboard definitions from json files to webapp",
         parents=[parent_parser],
     )
-    parser_upload.add_argument("-s", "--source", required=True, help="Input folder of dashboards")
+    parser_upload.add_argument("-s", "--source", required=True, help="Input folder of dashboards, or a .tar.gz bundle")
     parser_upload.add_argument("--overwrite", default=False, action=argparse.BooleanOptionalAction)
-    parser_upload.set_defaults(func=upload_dashboards)
+    parser_upload.add_argument(
+        "--skip-unchanged",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Only upload dashboards that differ from those already in Grafana",
+    )
+    parser_upload.add_argument(
+        "--datasource-uid",
+        dest="datasource_uids",
+        action="append",
+        metavar="OLD=NEW",
+        help="Replace a datasource uid in the dashboards, can be given more than once",
+    )
+    parser_upload.add_argument(
+        "--resume",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Skip the folders and dashboards that an interrupted upload already completed, as recorded in its journal",
+    )
+    parser_upload.add_argument(
+        "--journal",
+        type=str,
+        help="Journal file recording the progress of the upload (default .upload-journal.jsonl in the source)",
+    )
+    parser_upload.add_argument(
+        "--snapshot",
+        nargs="?",
+        const="latest",
+        metavar="NAME",
+        help="Restore the snapshot with this name, or the latest if no name is given, from the snapshot store that is "
+        "the source",
+    )
+    parser_upload.add_argument(
+        "--read-jobs",
+        type=int,
+        help="Number of dashboard files to read and decode at once, while others are uploaded (default: --jobs)",
+    )
+    parser_upload.add_argument(
+        "--read-processes",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Read and decode the files in worker processes instead of threads, for very large dashboards",
+    )
+    add_filter_arguments(parser_upload)
+    parser_upload.set_defaults(func="upload_dashboards")
 
     # Download
     parser_download = sub_parsers.add_parser(
         "download", help="Retrieve current dashboards from webapp and save to json files", parents=[parent_parser]
     )
-    parser_download.add_argument("-d", "--destination", required=True, help="Output folder for dashboards")
-    parser_download.set_defaults(func=download_dashboards)
+    parser_download.add_argument(
+        "-d",
+        "--destination",
+        required=True,
+        help="Output folder for dashboards, or a .tar.gz bundle file to stream them into",
+    )
+    parser_download.add_argument(
+        "--incremental",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Only fetch dashboards that have changed since the previous download to the same destination",
+    )
+    parser_download.add_argument(
+        "--file-format",
+        choices=["pretty", "raw", "envelope"],
+        default="pretty",
+        help="pretty: reformat each dashboard consistently for version control (default), raw: save each dashboard "
+        "as sent by Grafana which is much faster, envelope: save the whole response as sent including its meta",
+    )
+    parser_download.add_argument(
+        "--resume",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Skip the dashboards that an interrupted download already completed, as recorded in its journal",
+    )
+    parser_download.add_argument(
+        "--journal",
+        type=str,
+        help="Journal file recording the progress of the download (default .download-journal.jsonl in the destination)",
+    )
+    parser_download.add_argument(
+        "--snapshot",
+        nargs="?",
+        const="",
+        metavar="NAME",
+        help="Add a snapshot to the snapshot store that is the destination, in which unchanged dashboards are only "
+        "stored once. Named with the current UTC time if no name is given",
+    )
+    parser_download.add_argument(
+        "--keep-days",
+        type=int,
+        help="After downloading a snapshot, delete the snapshots older than this many days and the dashboards that are "
+        "no longer in any snapshot",
+    )
+    add_filter_arguments(parser_download)
+    parser_download.set_defaults(func="download_dashboards")
+
+    # Mirror
+    parser_mirror = sub_parsers.add_parser(
+        "mirror",
+        help="Copy dashboards directly from the webapp given by --host to the one given by --target-host",
+        parents=[parent_parser],
+    )
+    parser_mirror.add_argument("--target-scheme", type=str, default="https", help="http or https")
+    parser_mirror.add_argument("--target-host", type=str, required=True, help="Target Grafana host")
+    parser_mirror.add_argument("--target-port", type=int, default=443, help="Target Grafana port (default 443)")
+    parser_mirror.add_argument("--target-username", type=str, help="Target Grafana admin login username")
+    parser_mirror.add_argument("--target-password", type=str, help="Target Grafana admin login password")
+    parser_mirror.add_argument("--target-token", type=str, help="Target Grafana API token with admin privileges")
+    parser_mirror.add_argument("--target-org", type=int, help="The organization in the target to copy dashboards to")
+    parser_mirror.add_argument(
+        "--target-skip-verify",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Skip HTTPS server cert validation for the target",
+    )
+    parser_mirror.add_argument(
+        "--datasource-uid",
+        dest="datasource_uids",
+        action="append",
+        metavar="OLD=NEW",
+        help="Replace a datasource uid in the dashboards, can be given more than once",
+    )
+    parser_mirror.set_defaults(func="mirror_dashboards")
+
+    # History
+    parser_history = sub_parsers.add_parser(
+        "history",
+        help="Append the versions of each dashboard that are newer than the last export to a history directory",
+        parents=[parent_parser],
+    )
+    parser_history.add_argument(
+        "-d",
+        "--destination",
+        required=True,
+        help="Output folder holding a file of versions for each dashboard, which is appended to by each export",
+    )
+    add_filter_arguments(parser_history)
+    parser_history.set_defaults(func="export_history", create_destination=True)
 
     args = parser.parse_args()
 
+    # The rest of the package and its dependencies are only imported once the arguments are known to be valid, so that
+    # --help and usage errors return quickly
+    from grafana_dashboard_manager import commands
+    from grafana_dashboard_manager.global_config import GlobalConfig
+    from grafana_dashboard_manager.grafana.factory import client_from_config
+    from grafana_dashboard_manager.utils import configure_logging, show_info
+
     configure_logging(args.verbose)
 
     # Validate the config from the arguments into a known config object
-    config = GlobalConfig.model_validate(vars(args))
+    config = GlobalConfig.model_validate({**vars(args), "func": getattr(commands, args.func)})
     if args.verbose:
         show_info("Config", config.model_dump(exclude={"func"}))
 
     # API Client
-    client = GrafanaApi(
-        scheme=config.scheme,
-        host=config.host,
-        port=config.port,
-        username=config.username,
-        password=config.password,
-        token=config.token,
-        org=config.org,
-        skip_verify=config.skip_verify,
-        verbose=args.verbose > 0,
-    )
-
-    # Run the desired command
-    config.func(config, client)
+    client = client_from_config(config)
+
+    # Run the desired command, recording the metrics even if it fails
+    success = False
+    profile = nullcontext()
+    if config.profile:
+        from grafana_dashboard_manager.profiling import profiled
+
+        profile = profiled(config.profile, memory=config.profile_memory, top=config.profile_top)
+    try:
+        with profile:
+            if config.all_orgs:
+                commands.run_for_all_orgs(config, client)
+            else:
+                config.func(config, client)
+        success = True
+    finally:
+        if config.metrics_file:
+            client.metrics.write(config.metrics_file, args.command, success)
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the options that select which folders and dashboards a command works on"""
+    group = parser.add_argument_group(
+        "Filters", "Only include the selected dashboards. Each option can be given more than once"
+    )
+    group.add_argument(
+        "--folder",
+        dest="folders",
+        action="append",
+        metavar="PATH",
+        help="Include the dashboards in a folder and its subfolders, given by its path such as 'Team/Services'",
+    )
+    group.add_argument(
+        "--tag",
+        dest="tags",
+        action="append",
+        help="Include the dashboards that have this tag, or all of the tags if given more than once",
+    )
+    group.add_argument("--uid", dest="uids", action="append", help="Include the dashboard with this uid")
+    group.add_argument(
+        "--title",
+        dest="titles",
+        action="append",
+        metavar="GLOB",
+        help="Include the dashboards with a title matching this pattern, such as 'Team A *', ignoring case",
+    )
 
 
 if __name__ == "__main__":
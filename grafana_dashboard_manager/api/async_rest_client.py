@@ -0,0 +1,144 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import asyncio
+import copy
+import logging
+import time
+
+import httpx
+
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.api.limiter import AsyncAdaptiveConcurrencyLimiter
+from grafana_dashboard_manager.api.metrics import Metrics
+from grafana_dashboard_manager.api.retry import RetryPolicy
+from grafana_dashboard_manager.api.transport import TransportConfig
+from grafana_dashboard_manager.exceptions import GrafanaApiException
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRestClient:
+    """Provides RESTful calls from coroutines"""
+
+    def __init__(
+        self,
+        headers,
+        auth,
+        base_url,
+        skip_verify,
+        *,
+        retry_policy: RetryPolicy | None = None,
+        max_concurrency: int = 1,
+        transport: TransportConfig | None = None,
+        metrics: Metrics | None = None,
+    ):
+        """
+        Wrapper on the httpx async client with the same retries, concurrency limit and metrics as RestClient
+
+        Unlike RestClient, a request that cannot connect after all of its retries raises a GrafanaApiException rather
+        than exiting, so that the client can be embedded in a long running service.
+
+        Args:
+            headers: common headers to apply to all requests
+            auth: an httpx auth object
+            base_url: url host
+            skip_verify: set to true to skip verification of https connection certs
+            retry_policy: how to retry connection errors and throttled or failed responses (default: {RetryPolicy()})
+            max_concurrency: upper bound of the adaptive limit on requests in flight (default: {1})
+            transport: connection pool, protocol and timeout options (default: {TransportConfig()})
+            metrics: where to record each request, which may be shared with other clients (default: {Metrics()})
+
+        """
+        client_kwargs = (transport or TransportConfig()).client_kwargs(max_concurrency)
+        client_kwargs["headers"] = {**headers, **client_kwargs["headers"]}
+        self.client = httpx.AsyncClient(auth=auth, base_url=base_url, verify=not skip_verify, **client_kwargs)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.limiter = AsyncAdaptiveConcurrencyLimiter(max_concurrency)
+        self.request_headers: dict[str, str] = {}
+        self.metrics = metrics or Metrics()
+
+    def with_headers(self, headers: dict[str, str]) -> "AsyncRestClient":
+        """
+        A view of this client that adds headers to each of its requests, while sharing the connection pool, retry policy
+        and concurrency limit with this client
+        """
+        view = copy.copy(self)
+        view.request_headers = {**self.request_headers, **headers}
+        return view
+
+    async def aclose(self) -> None:
+        """Closes the connections of this client and all of its views"""
+        await self.client.aclose()
+
+    async def get(self, resource: str) -> httpx.Response:
+        """HTTP GET"""
+        return await self._make_request("GET", resource)
+
+    async def post(self, resource: str, body: dict | None = None, *, idempotent: bool = False) -> httpx.Response:
+        """HTTP POST, which is only retried after an error if it is idempotent or if it was throttled"""
+        return await self._make_request("POST", resource, body, idempotent=idempotent)
+
+    async def put(self, resource: str, body: dict) -> httpx.Response:
+        """HTTP PUT"""
+        return await self._make_request("PUT", resource, body)
+
+    async def patch(self, resource: str, body: dict) -> httpx.Response:
+        """HTTP PATCH"""
+        return await self._make_request("PATCH", resource, body)
+
+    async def delete(self, resource: str) -> httpx.Response:
+        """HTTP DELETE"""
+        return await self._make_request("DELETE", resource)
+
+    async def _make_request(
+        self, verb: str, resource: str, body: dict | None = None, *, idempotent: bool = True
+    ) -> httpx.Response:
+        attempt = 0
+        while True:
+            response = await self._send(verb, resource, body)
+            if not self.retry_policy.should_retry(attempt, response, idempotent=idempotent):
+                break
+
+            delay = self.retry_policy.backoff(attempt, response)
+            reason = f"HTTP {response.status_code}" if response is not None else "connection error"
+            logger.warning(f"{verb} {resource} failed with {reason}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if response is None:
+            raise GrafanaApiException(f"Could not connect to {self.client.base_url}{resource}")
+
+        return response
+
+    async def _send(self, verb: str, resource: str, body: dict | None) -> httpx.Response | None:
+        """Makes a single attempt at a request, returning None if a retryable connection error occurred"""
+        content = None if body is None else json_codec.dumps(body, compatible=False)
+        bytes_sent = len(content) if content else 0
+
+        await self.limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = await self.client.request(verb, resource, content=content, headers=self.request_headers or None)
+        except httpx.TransportError as exc:
+            latency = time.monotonic() - start
+            await self.limiter.release(latency, congested=True)
+            self.metrics.record_request(verb, resource, None, latency, bytes_sent, 0)
+            logger.debug(f"{verb} {resource}: {exc!r}")
+            return None
+        except BaseException:
+            # Including cancellation of the request, which must still free its slot
+            await asyncio.shield(self.limiter.release(time.monotonic() - start))
+            raise
+
+        latency = time.monotonic() - start
+        await self.limiter.release(latency, congested=response.status_code in self.retry_policy.retry_statuses)
+        self.metrics.record_request(
+            verb, resource, response.status_code, latency, bytes_sent, response.num_bytes_downloaded
+        )
+        return response
@@ -0,0 +1,141 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of requests in flight, adapting the limit to the health of the server using AIMD
+
+    The limit grows additively (by about one per limit's worth of healthy requests) up to max_limit, and is cut
+    multiplicatively when a request is throttled, fails, or when recent latency rises well above the long running
+    average latency.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        *,
+        min_limit: int = 1,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+    ):
+        """
+        Create a limiter that starts at its maximum limit
+
+        Args:
+            max_limit: the most requests allowed in flight
+            min_limit: the fewest requests allowed in flight (default: {1})
+            decrease_factor: multiplier applied to the limit when the server is struggling (default: {0.5})
+            latency_tolerance: how many times slower than average recent requests can be before backing off
+                (default: {2.0})
+
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+
+        self._limit = float(max_limit)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._recent_latency: float | None = None
+        self._average_latency: float | None = None
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self) -> int:
+        """The current number of requests allowed in flight"""
+        return max(self.min_limit, int(self._limit))
+
+    def acquire(self) -> None:
+        """Block until a request may be made"""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float, *, congested: bool = False) -> None:
+        """
+        Record the outcome of a request and free its slot
+
+        Args:
+            latency: seconds the request took
+            congested: set if the request was throttled or failed due to the server
+
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self.update(latency, congested=congested)
+            self._condition.notify_all()
+
+    def update(self, latency: float, *, congested: bool = False) -> None:
+        """Adapts the limit to the outcome of a request, the caller must hold the lock that guards the limit"""
+        slow = self._record_latency(latency)
+
+        if congested or slow:
+            self._decrease()
+        elif self._limit < self.max_limit:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def _record_latency(self, latency: float) -> bool:
+        """Updates the moving averages of latency, returning true if recent requests are unusually slow"""
+        if self._recent_latency is None or self._average_latency is None:
+            self._recent_latency = self._average_latency = latency
+            return False
+
+        self._recent_latency += 0.3 * (latency - self._recent_latency)
+        self._average_latency += 0.02 * (latency - self._average_latency)
+        return self._recent_latency > self.latency_tolerance * self._average_latency
+
+    def _decrease(self) -> None:
+        # Only back off once per round trip, as requests already in flight will report the same congestion
+        now = time.monotonic()
+        if now - self._last_decrease < (self._recent_latency or 0):
+            return
+
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        if self.limit != previous:
+            logger.debug(f"Reducing concurrent requests from {previous} to {self.limit}")
+
+
+class AsyncAdaptiveConcurrencyLimiter:
+    """The same adaptive limit on requests in flight as AdaptiveConcurrencyLimiter, for coroutines on one event loop"""
+
+    def __init__(self, max_limit: int, **kwargs):
+        """Create a limiter that starts at its maximum limit, taking the same options as AdaptiveConcurrencyLimiter"""
+        # Only the limit is used from the synchronous limiter, its lock and in flight count are not
+        self.limits = AdaptiveConcurrencyLimiter(max_limit, **kwargs)
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        """The current number of requests allowed in flight"""
+        return self.limits.limit
+
+    async def acquire(self) -> None:
+        """Wait until a request may be made"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limits.limit)
+            self._in_flight += 1
+
+    async def release(self, latency: float, *, congested: bool = False) -> None:
+        """Record the outcome of a request and free its slot"""
+        async with self._condition:
+            self._in_flight -= 1
+            self.limits.update(latency, congested=congested)
+            self._condition.notify_all()
@@ -0,0 +1,244 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from grafana_dashboard_manager import json_codec
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "grafana_dashboard_manager"
+
+# Upper bounds of the request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Identifiers in resource paths are replaced so that each endpoint is a single series
+ENDPOINT_PATTERNS = (
+    (re.compile(r"^dashboards/uid/[^/]+/versions/[^/]+"), "dashboards/uid/:uid/versions/:version"),
+    (re.compile(r"^dashboards/uid/[^/]+"), "dashboards/uid/:uid"),
+    (re.compile(r"^dashboards/id/[^/]+"), "dashboards/id/:id"),
+    (re.compile(r"^folders/uid/[^/]+"), "folders/uid/:uid"),
+    (re.compile(r"^folders/id/[^/]+"), "folders/id/:id"),
+    (re.compile(r"^folders/(?!uid/|id/)[^/]+"), "folders/:uid"),
+)
+
+
+def endpoint_template(resource: str) -> str:
+    """The endpoint of a resource path, without its query string and with any identifiers replaced"""
+    endpoint = resource.split("?", 1)[0].strip("/")
+    for pattern, replacement in ENDPOINT_PATTERNS:
+        endpoint = pattern.sub(replacement, endpoint)
+    return endpoint
+
+
+@dataclass
+class EndpointMetrics:
+    """Totals for the requests made to a single endpoint with a single method"""
+
+    statuses: dict[str, int] = field(default_factory=dict)
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    latency_sum: float = 0.0
+    latency_buckets: list[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+
+    @property
+    def count(self) -> int:
+        """The number of requests, including retries"""
+        return sum(self.statuses.values())
+
+
+@dataclass
+class PhaseMetrics:
+    """Totals for a phase of work such as listing, fetching, writing or uploading"""
+
+    seconds: float = 0.0
+    count: int = 0
+
+
+class Metrics:
+    """
+    Thread-safe record of the requests made by a RestClient and the time spent in each phase of a command, which can be
+    written as a Prometheus textfile collector file or a json summary at the end of a run
+    """
+
+    def __init__(self):
+        """Starts the clock for the run"""
+        self.lock = threading.Lock()
+        self.endpoints: dict[tuple[str, str], EndpointMetrics] = {}
+        self.phases: dict[str, PhaseMetrics] = {}
+        self.started = time.time()
+
+    def record_request(
+        self, method: str, resource: str, status: int | None, seconds: float, bytes_sent: int, bytes_received: int
+    ) -> None:
+        """
+        Records a single request attempt
+
+        Args:
+            method: the HTTP method
+            resource: the resource path requested, which may contain identifiers and a query string
+            status: the response status code, or None if no response was received
+            seconds: time taken to receive the response
+            bytes_sent: size of the request body
+            bytes_received: size of the response body as transferred, before any decompression
+
+        """
+        key = (method, endpoint_template(resource))
+        status_label = str(status) if status is not None else "error"
+        with self.lock:
+            endpoint = self.endpoints.setdefault(key, EndpointMetrics())
+            endpoint.statuses[status_label] = endpoint.statuses.get(status_label, 0) + 1
+            endpoint.bytes_sent += bytes_sent
+            endpoint.bytes_received += bytes_received
+            endpoint.latency_sum += seconds
+            for i, upper_bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= upper_bound:
+                    endpoint.latency_buckets[i] += 1
+                    break
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Adds the time spent in the block to the named phase, summed across all threads"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        """Adds time spent elsewhere, e.g. in a worker process, to the named phase"""
+        with self.lock:
+            phase = self.phases.setdefault(name, PhaseMetrics())
+            phase.seconds += seconds
+            phase.count += 1
+
+    def summary(self, command: str, success: bool) -> dict:
+        """The metrics of the run as a json-serializable dict"""
+        with self.lock:
+            return {
+                "command": command,
+                "success": success,
+                "started": self.started,
+                "duration_seconds": time.time() - self.started,
+                "requests": [
+                    {
+                        "method": method,
+                        "endpoint": endpoint,
+                        "count": metrics.count,
+                        "statuses": dict(metrics.statuses),
+                        "bytes_sent": metrics.bytes_sent,
+                        "bytes_received": metrics.bytes_received,
+                        "latency_seconds_sum": metrics.latency_sum,
+                        "latency_seconds_buckets": dict(
+                            zip(map(str, LATENCY_BUCKETS), metrics.latency_buckets, strict=True)
+                        ),
+                    }
+                    for (method, endpoint), metrics in sorted(self.endpoints.items())
+                ],
+                "phases": {
+                    name: {"seconds": phase.seconds, "count": phase.count}
+                    for name, phase in sorted(self.phases.items())
+                },
+            }
+
+    def prometheus(self, command: str, success: bool) -> str:
+        """The metrics of the run in the Prometheus text exposition format"""
+        summary = self.summary(command, success)
+        run_labels = f'command="{command}"'
+        lines = []
+
+        def metric(name: str, kind: str, description: str, samples: list[tuple[str, str, float]]) -> None:
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            lines.extend(f"{METRIC_PREFIX}_{name}{suffix}{{{labels}}} {value}" for suffix, labels, value in samples)
+
+        metric("run_success", "gauge", "Whether the last run succeeded", [("", run_labels, int(success))])
+        metric("run_timestamp_seconds", "gauge", "When the last run started", [("", run_labels, summary["started"])])
+        metric(
+            "run_duration_seconds",
+            "gauge",
+            "How long the last run took",
+            [("", run_labels, summary["duration_seconds"])],
+        )
+
+        requests = summary["requests"]
+        labels = [f'{run_labels},method="{r["method"]}",endpoint="{r["endpoint"]}"' for r in requests]
+        metric(
+            "requests_total",
+            "counter",
+            "Requests made to the Grafana API, including retries",
+            [
+                ("", f'{label},status="{status}"', count)
+                for label, r in zip(labels, requests, strict=True)
+                for status, count in r["statuses"].items()
+            ],
+        )
+        metric(
+            "request_sent_bytes_total",
+            "counter",
+            "Bytes sent in request bodies",
+            [("", label, r["bytes_sent"]) for label, r in zip(labels, requests, strict=True)],
+        )
+        metric(
+            "request_received_bytes_total",
+            "counter",
+            "Bytes received in response bodies",
+            [("", label, r["bytes_received"]) for label, r in zip(labels, requests, strict=True)],
+        )
+
+        histogram = []
+        for label, r in zip(labels, requests, strict=True):
+            cumulative = 0
+            for upper_bound, count in r["latency_seconds_buckets"].items():
+                cumulative += count
+                histogram.append(("_bucket", f'{label},le="{upper_bound}"', cumulative))
+            histogram.append(("_bucket", f'{label},le="+Inf"', r["count"]))
+            histogram.append(("_sum", label, r["latency_seconds_sum"]))
+            histogram.append(("_count", label, r["count"]))
+        metric("request_duration_seconds", "histogram", "Time taken to receive a response", histogram)
+
+        phases = summary["phases"]
+        metric(
+            "phase_duration_seconds_total",
+            "counter",
+            "Time spent in each phase of the run, summed across concurrent jobs",
+            [("", f'{run_labels},phase="{name}"', phase["seconds"]) for name, phase in phases.items()],
+        )
+        metric(
+            "phase_operations_total",
+            "counter",
+            "Operations completed in each phase of the run",
+            [("", f'{run_labels},phase="{name}"', phase["count"]) for name, phase in phases.items()],
+        )
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path, command: str, success: bool) -> None:
+        """
+        Writes the metrics to a file, in the Prometheus textfile collector format if the file has a .prom suffix and as
+        a json summary otherwise
+
+        The file is written to a temporary file and renamed, so that a collector never reads a partially written file.
+        """
+        if path.suffix == ".prom":
+            content = self.prometheus(command, success).encode()
+        else:
+            content = json_codec.dumps(self.summary(command, success), indent=2)
+
+        partial = path.with_name(f"{path.name}.partial")
+        partial.write_bytes(content)
+        os.replace(partial, path)
+        logger.info(f"Wrote metrics to {path}")
@@ -6,17 +6,37 @@ license that can be found in the LICENSE file or at
 https://opensource.org/licenses/MIT.
 """
 
+import copy
 import logging
+import time
 
 import httpx
 
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.api.limiter import AdaptiveConcurrencyLimiter
+from grafana_dashboard_manager.api.metrics import Metrics
+from grafana_dashboard_manager.api.retry import RetryPolicy
+from grafana_dashboard_manager.api.transport import TransportConfig
+
 logger = logging.getLogger(__name__)
 
 
 class RestClient:
     """Provides RESTful calls"""
 
-    def __init__(self, headers, auth, base_url, skip_verify, verbose):
+    def __init__(
+        self,
+        headers,
+        auth,
+        base_url,
+        skip_verify,
+        verbose,
+        *,
+        retry_policy: RetryPolicy | None = None,
+        max_concurrency: int = 1,
+        transport: TransportConfig | None = None,
+        metrics: Metrics | None = None,
+    ):
         """
         Wrapper on the httpx client to centralise request level exception handling
 
@@ -26,18 +46,42 @@ class RestClient:
             base_url: url host
             skip_verify: set to true to skip verification of https connection certs
             verbose: increased logging output
+            retry_policy: how to retry connection errors and throttled or failed responses (default: {RetryPolicy()})
+            max_concurrency: upper bound of the adaptive limit on requests in flight (default: {1})
+            transport: connection pool, protocol and timeout options (default: {TransportConfig()})
+            metrics: where to record each request, which may be shared with other clients (default: {Metrics()})
 
         """
-        self.client = httpx.Client(headers=headers, auth=auth, base_url=base_url, verify=skip_verify)
+        client_kwargs = (transport or TransportConfig()).client_kwargs(max_concurrency)
+        client_kwargs["headers"] = {**headers, **client_kwargs["headers"]}
+        self.client = httpx.Client(auth=auth, base_url=base_url, verify=not skip_verify, **client_kwargs)
         self.verbose = verbose
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.limiter = AdaptiveConcurrencyLimiter(max_concurrency)
+        self.request_headers: dict[str, str] = {}
+        self.metrics = metrics or Metrics()
+
+    def with_headers(self, headers: dict[str, str]) -> "RestClient":
+        """
+        A view of this client that adds headers to each of its requests, while sharing the connection pool, retry policy
+        and concurrency limit with this client
+        """
+        view = copy.copy(self)
+        view.request_headers = {**self.request_headers, **headers}
+        return view
 
     def get(self, resource: str) -> httpx.Response:
         """HTTP GET"""
         return self._make_request("GET", resource)
 
-    def post(self, resource: str, body: dict | None = None) -> httpx.Response:
-        """HTTP POST"""
-        return self._make_request("POST", resource, body)
+    def post(self, resource: str, body: dict | bytes | None = None, *, idempotent: bool = False) -> httpx.Response:
+        """
+        HTTP POST, with a body that is encoded as json unless it is already encoded
+
+        The request is only retried after an error if it is idempotent, e.g. because it carries a uid, or if it was
+        throttled.
+        """
+        return self._make_request("POST", resource, body, idempotent=idempotent)
 
     def put(self, resource: str, body: dict) -> httpx.Response:
         """HTTP PUT"""
@@ -51,15 +95,56 @@ class RestClient:
         """HTTP DELETE"""
         return self._make_request("DELETE", resource)
 
-    def _make_request(self, verb: str, resource: str, body: dict | None = None) -> httpx.Response:
+    def _make_request(
+        self, verb: str, resource: str, body: dict | bytes | None = None, *, idempotent: bool = True
+    ) -> httpx.Response:
+        attempt = 0
+        while True:
+            response = self._send(verb, resource, body, attempt)
+            if not self.retry_policy.should_retry(attempt, response, idempotent=idempotent):
+                break
+
+            delay = self.retry_policy.backoff(attempt, response)
+            reason = f"HTTP {response.status_code}" if response is not None else "connection error"
+            logger.warning(f"{verb} {resource} failed with {reason}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
         # Handle connection errors
+        if response is None:
+            logger.error(f"Could not connect to {self.client.base_url}{resource}")
+            exit(1)
+
+        return response
+
+    def _send(self, verb: str, resource: str, body: dict | bytes | None, attempt: int) -> httpx.Response | None:
+        """Makes a single attempt at a request, returning None if a retryable connection error occurred"""
+        content = body if body is None or isinstance(body, bytes) else json_codec.dumps(body, compatible=False)
+        bytes_sent = len(content) if content else 0
+
+        self.limiter.acquire()
+        start = time.monotonic()
         try:
-            response = self.client.request(verb, resource, json=body)
+            response = self.client.request(verb, resource, content=content, headers=self.request_headers or None)
+        except httpx.TransportError as exc:
+            latency = time.monotonic() - start
+            self.limiter.release(latency, congested=True)
+            self.metrics.record_request(verb, resource, None, latency, bytes_sent, 0)
+            if self.verbose and attempt >= self.retry_policy.max_retries:
+                raise
+            logger.debug(f"{verb} {resource}: {exc!r}")
+            return None
         except Exception as exc:
+            self.limiter.release(time.monotonic() - start)
             if self.verbose:
                 raise
             logger.error(f"Could not connect to {self.client.base_url}{resource}")
             logger.error(exc)
             exit(1)
 
+        latency = time.monotonic() - start
+        self.limiter.release(latency, congested=response.status_code in self.retry_policy.retry_statuses)
+        self.metrics.record_request(
+            verb, resource, response.status_code, latency, bytes_sent, response.num_bytes_downloaded
+        )
         return response
@@ -0,0 +1,72 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Controls how requests are retried after connection errors and throttled or failed responses"""
+
+    max_retries: int = 5
+    backoff_factor: float = 0.5
+    max_backoff: float = 30.0
+    retry_statuses: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+
+    def should_retry(self, attempt: int, response: httpx.Response | None = None, *, idempotent: bool = True) -> bool:
+        """
+        Whether a request should be retried, response is None if the request failed to connect
+
+        A request that isn't idempotent may have taken effect despite failing, e.g. creating a folder without a uid, so
+        it is only retried if the server clearly turned it away to throttle it.
+        """
+        if attempt >= self.max_retries:
+            return False
+        if not idempotent:
+            return response is not None and (
+                response.status_code == 429 or (response.status_code == 503 and "Retry-After" in response.headers)
+            )
+        return response is None or response.status_code in self.retry_statuses
+
+    def backoff(self, attempt: int, response: httpx.Response | None = None) -> float:
+        """
+        Seconds to wait before the next attempt
+
+        The server's Retry-After header is honoured if present, otherwise exponential backoff with full jitter is used
+        so that concurrent workers don't retry in lockstep.
+        """
+        if response is not None and (retry_after := parse_retry_after(response)) is not None:
+            return min(retry_after, self.max_backoff)
+
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2**attempt))
+
+
+def parse_retry_after(response: httpx.Response) -> float | None:
+    """Parse a Retry-After header, which is either a number of seconds or an HTTP date"""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=UTC)
+    return max(0.0, (retry_at - datetime.now(UTC)).total_seconds())
@@ -0,0 +1,66 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+from dataclasses import dataclass
+from importlib.util import find_spec
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TransportConfig:
+    """Tuning options for the HTTP connections made to Grafana"""
+
+    max_connections: int | None = None
+    max_keepalive_connections: int | None = None
+    keepalive_expiry: float = 5.0
+    http2: bool = False
+    compression: bool = True
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    write_timeout: float = 30.0
+    pool_timeout: float | None = None
+
+    def client_kwargs(self, max_concurrency: int = 1) -> dict:
+        """
+        Keyword arguments for httpx.Client
+
+        Args:
+            max_concurrency: number of requests that may be made concurrently, so that the connection pool can keep
+                a connection alive for each of them
+
+        """
+        max_connections = self.max_connections or max(100, max_concurrency)
+        max_keepalive_connections = self.max_keepalive_connections or min(max_connections, max(20, max_concurrency))
+
+        http2 = self.http2
+        if http2 and find_spec("h2") is None:
+            logger.warning("HTTP/2 requires the h2 package (pip install 'httpx[http2]'), falling back to HTTP/1.1")
+            http2 = False
+
+        # httpx decodes gzip and deflate responses by default, and also brotli if it is installed
+        headers = {} if self.compression else {"Accept-Encoding": "identity"}
+
+        return {
+            "http2": http2,
+            "headers": headers,
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            "timeout": httpx.Timeout(
+                connect=self.connect_timeout,
+                read=self.read_timeout,
+                write=self.write_timeout,
+                pool=self.pool_timeout,
+            ),
+        }
@@ -0,0 +1,129 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import io
+import logging
+import tarfile
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_SUFFIXES = (".tar.gz", ".tgz", ".tar")
+FOLDERS_FILE = "folders.json"
+HOME_FILE = "home.json"
+
+
+def is_bundle(path: Path) -> bool:
+    """Whether a path refers to a bundle file rather than a directory of dashboards"""
+    return path.name.endswith(BUNDLE_SUFFIXES)
+
+
+@dataclass(frozen=True)
+class DashboardFile:
+    """A dashboard json file within a folder, either on disk or already read from a bundle"""
+
+    folder: str
+    name: str
+    path: Path | None = None
+    content: bytes | None = None
+
+    def read(self) -> bytes:
+        """The raw contents of the file"""
+        if self.content is not None:
+            return self.content
+        if self.path is None:
+            raise ValueError(f"No content for {self.folder}/{self.name}")
+        return self.path.read_bytes()
+
+
+class BundleWriter:
+    """
+    Streams files into a tar archive, which is gzip compressed unless it has a plain .tar suffix
+
+    The archive has the same layout as a download to a directory, so it can also be extracted with standard tools. It is
+    written to a temporary file which is renamed into place once closed successfully.
+    """
+
+    def __init__(self, path: Path):
+        """Open a bundle for writing at the given path"""
+        self.path = path
+        self._partial_path = path.with_name(f"{path.name}.partial")
+        mode = "w|" if path.name.endswith(".tar") else "w|gz"
+        self._tar = tarfile.open(str(self._partial_path), mode)
+
+    def add(self, name: str, content: bytes | memoryview) -> None:
+        """Append a file to the bundle"""
+        info = tarfile.TarInfo(name)
+        info.size = len(content)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(content))
+
+    def close(self, *, complete: bool = True) -> None:
+        """Finish the bundle, only replacing any previous bundle if complete"""
+        self._tar.close()
+        if complete:
+            self._partial_path.replace(self.path)
+        else:
+            self._partial_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "BundleWriter":
+        """Use as a context manager, which discards the bundle if an exception is raised"""
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        """Close the bundle"""
+        self.close(complete=exc_type is None)
+
+
+class BundleReader:
+    """
+    Reads a bundle sequentially without extracting it or holding it in memory
+
+    A folders.json at the start of the bundle is available before iterating the dashboards, and the home dashboard is
+    available once they have all been iterated.
+    """
+
+    def __init__(self, path: Path):
+        """Open a bundle for reading from the given path"""
+        self.path = path
+        self.folders_json: bytes | None = None
+        self.home_json: bytes | None = None
+
+        self._members = self._read_members()
+        self._first = next(self._members, None)
+        if self._first is not None and self._first[0] == FOLDERS_FILE:
+            self.folders_json = self._first[1]
+            self._first = None
+
+    def dashboards(self) -> Iterator[DashboardFile]:
+        """Yields each dashboard in the bundle in the order they were written"""
+        if self._first is not None:
+            yield from self._to_dashboard(*self._first)
+            self._first = None
+
+        for name, content in self._members:
+            yield from self._to_dashboard(name, content)
+
+    def _to_dashboard(self, name: str, content: bytes) -> Iterator[DashboardFile]:
+        if name == HOME_FILE:
+            self.home_json = content
+        elif "/" in name and name.endswith(".json"):
+            folder, file_name = name.rsplit("/", 1)
+            yield DashboardFile(folder, file_name, content=content)
+        else:
+            logger.debug(f"Ignoring {name} in {self.path}")
+
+    def _read_members(self) -> Iterator[tuple[str, bytes]]:
+        with tarfile.open(str(self.path), "r|*") as tar:
+            for member in tar:
+                file = tar.extractfile(member) if member.isfile() else None
+                if file is not None:
+                    yield member.name, file.read()
@@ -1,2 +1,20 @@
-from .dashboard_download import download_dashboards
-from .dashboard_upload import upload_dashboards
+import importlib
+
+# The commands are imported on first use, so that importing this package doesn't import every command's dependencies
+_COMMAND_MODULES = {
+    "download_dashboards": ".dashboard_download",
+    "download_dashboards_async": ".async_transfer",
+    "export_history": ".dashboard_history",
+    "mirror_dashboards": ".mirror",
+    "run_for_all_orgs": ".organizations",
+    "upload_dashboards": ".dashboard_upload",
+    "upload_dashboards_async": ".async_transfer",
+}
+
+__all__ = list(_COMMAND_MODULES)
+
+
+def __getattr__(name: str):
+    if name in _COMMAND_MODULES:
+        return getattr(importlib.import_module(_COMMAND_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
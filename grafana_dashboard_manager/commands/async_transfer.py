@@ -0,0 +1,194 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import asyncio
+import logging
+from pathlib import Path
+
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.bundle import FOLDERS_FILE, HOME_FILE
+from grafana_dashboard_manager.commands.dashboard_download import dashboard_filename, folders_json, write_if_changed
+from grafana_dashboard_manager.commands.dashboard_upload import dashboard_rewriter, folder_levels
+from grafana_dashboard_manager.concurrency import amap_concurrently
+from grafana_dashboard_manager.exceptions import GrafanaApiException
+from grafana_dashboard_manager.grafana.async_grafana_api import AsyncGrafanaApi
+from grafana_dashboard_manager.handlers.api_dashboards import ApiDashboards
+from grafana_dashboard_manager.models import DashboardFolderLookup, DashboardSummary
+from grafana_dashboard_manager.models.folder import Folder
+from grafana_dashboard_manager.rewrite import FolderIndex
+
+logger = logging.getLogger(__name__)
+
+
+async def download_dashboards_async(client: AsyncGrafanaApi, destination: Path, *, jobs: int = 1) -> None:
+    """
+    Download every dashboard in folders to json files in a directory per folder, in the same layout as the download
+    command so that the files can be uploaded by either
+
+    Unlike the download command this never prompts, and overwrites any existing files in the destination.
+
+    Args:
+        client: the Grafana to download from
+        destination: directory to write to, which is created if needed
+        jobs: number of dashboards to download at once
+
+    Raises:
+        GrafanaApiException: if any of the dashboards could not be downloaded, after the others have been saved
+
+    """
+    logger.info(f"Pulling all dashboards into {destination}...")
+
+    folders = await client.folders.folder_tree()
+    folder_dashboards: dict[str, DashboardFolderLookup] = {
+        path: DashboardFolderLookup(id=folder.id, uid=folder.uid, title=folder.title, parentUid=folder.parentUid)
+        for path, folder in folders.items()
+    }
+
+    folders_by_uid = {folder.uid: folder for folder in folder_dashboards.values()}
+    async for dashboard in client.folders.all_dashboards():
+        folder = folders_by_uid.get(dashboard.folderUid)
+        if folder is None:
+            logger.warning(f"Dashboard {dashboard.title} is in an unknown folder (uid={dashboard.folderUid})")
+            continue
+        folder.dashboards.append(dashboard)
+
+    downloads = [
+        (dashboard, destination / folder_path / dashboard_filename(dashboard.title))
+        for folder_path, folder in folder_dashboards.items()
+        for dashboard in folder.dashboards
+    ]
+
+    async def save(download: tuple[DashboardSummary, Path]) -> None:
+        dashboard, dest_file_path = download
+        content = ApiDashboards.file_content(await client.dashboards.dashboard_json(dashboard.uid))
+        with client.metrics.phase("write"):
+            # File writes would otherwise block the event loop, and so every other download running on it
+            await asyncio.to_thread(_write_file, dest_file_path, content)
+
+    failures: list[str] = []
+    async for task in amap_concurrently(save, downloads, jobs):
+        dashboard, dest_file_path = task.item
+        if task.ok:
+            logger.debug(f"Saved {dashboard.title} to {dest_file_path}")
+        else:
+            logger.error(f"Failed to save {dashboard.title} (uid={dashboard.uid}): {task.error!r}")
+            failures.append(dashboard.uid)
+    logger.info(f"Saved {len(downloads) - len(failures)} dashboards to {destination}")
+
+    home = ApiDashboards.file_content(await client.dashboards.home_dashboard_json())
+    await asyncio.to_thread(_write_file, destination / HOME_FILE, home)
+    await asyncio.to_thread(_write_file, destination / FOLDERS_FILE, folders_json(folder_dashboards))
+
+    if failures:
+        raise GrafanaApiException(f"Failed to download {len(failures)} dashboards: {', '.join(failures)}")
+
+
+async def upload_dashboards_async(
+    client: AsyncGrafanaApi,
+    source: Path,
+    *,
+    jobs: int = 1,
+    datasource_uids: dict[str, str] | None = None,
+    skip_home: bool = False,
+) -> None:
+    """
+    Upload a directory of dashboards, as written by the download command or download_dashboards_async, to Grafana
+
+    Args:
+        client: the Grafana to upload to
+        source: directory containing a directory per folder of dashboard json files
+        jobs: number of dashboards to upload at once
+        datasource_uids: datasource uids to replace in the dashboards, mapped to their replacements
+        skip_home: don't upload and set the home dashboard
+
+    Raises:
+        GrafanaApiException: if a folder could not be created, or if any of the dashboards could not be uploaded after
+            the others have been
+
+    """
+    logger.info(f"Uploading dashboards from {source}")
+
+    folder_info_file = source / FOLDERS_FILE
+    if folder_info_file.is_file():
+        data = json_codec.loads(await asyncio.to_thread(folder_info_file.read_bytes))
+        folder_info = {key: Folder.model_validate(value) for key, value in data.items()}
+    else:
+        logger.warning(f"The {FOLDERS_FILE} file is missing from {source}, folders will not have the same folderUid")
+        folder_info = await client.folders.folder_tree()
+
+    # The dashboards refer to the folders as they were where they were downloaded from
+    source_folders = dict(folder_info)
+
+    folders = await asyncio.to_thread(_folder_directories, source)
+
+    async def create_folder(path: str) -> Folder:
+        parent_path, _, name = path.rpartition("/")
+        parent_uid = folder_info[parent_path].uid if parent_path else None
+        known_folder = folder_info.get(path)
+        if known_folder:
+            return await client.folders.create(known_folder.title, known_folder.uid, parent_uid=parent_uid)
+        return await client.folders.create(name, parent_uid=parent_uid)
+
+    # Parents are created before their children, one level of nesting at a time
+    for level in folder_levels(folders):
+        async for task in amap_concurrently(create_folder, level, jobs):
+            if not task.ok:
+                raise GrafanaApiException(f"Could not create folder '{task.item}'") from task.error
+            folder_info[task.item] = task.result
+
+    rewriter = dashboard_rewriter(FolderIndex.build(folder_info, source_folders), datasource_uids)
+
+    uploads = [
+        (folder_path, json_file)
+        for folder_path, files in folders.items()
+        for json_file in files
+        if json_file.is_file() and not json_file.name.startswith(".")
+    ]
+
+    async def upload(item: tuple[str, Path]) -> None:
+        folder_path, json_file = item
+        with client.metrics.phase("read"):
+            dashboard = ApiDashboards.load_file(await asyncio.to_thread(json_file.read_bytes))
+        await client.dashboards.create(dashboard=rewriter.rewrite(dashboard), folder_uid=folder_info[folder_path].uid)
+
+    failures: list[str] = []
+    async for task in amap_concurrently(upload, uploads, jobs):
+        folder_path, json_file = task.item
+        if task.ok:
+            logger.info(f"{folder_path}: uploaded dashboard {json_file.name}")
+        else:
+            logger.error(f"{folder_path}: failed to add dashboard {json_file.name} - {task.error}")
+            failures.append(f"{folder_path}/{json_file.name}")
+
+    # The home dashboard may link to any of the other dashboards so it is set last
+    home_file = source / HOME_FILE
+    if skip_home:
+        logger.info("Skipped setting the home dashboard")
+    elif not home_file.is_file():
+        logger.warning(f"No {HOME_FILE} file found, cannot set the home dashboard")
+    else:
+        dashboard = rewriter.rewrite(ApiDashboards.load_file(await asyncio.to_thread(home_file.read_bytes)))
+        await client.dashboards.set_home(await client.dashboards.create_home(dashboard))
+        logger.info(f"Set home dashboard: {dashboard['title']}")
+
+    if failures:
+        raise GrafanaApiException(f"Failed to upload {len(failures)} dashboards: {', '.join(failures)}")
+
+
+def _folder_directories(source: Path) -> dict[str, list[Path]]:
+    """The files in every directory at any depth, keyed by path and skipping hidden directories such as .git"""
+    return {
+        folder.relative_to(source).as_posix(): sorted(folder.iterdir())
+        for folder in sorted(source.rglob("*"))
+        if folder.is_dir() and not any(part.startswith(".") for part in folder.relative_to(source).parts)
+    }
+
+
+def _write_file(path: Path, content: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_if_changed(path, content)
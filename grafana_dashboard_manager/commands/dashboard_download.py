@@ -6,67 +6,426 @@ license that can be found in the LICENSE file or at
 https://opensource.org/licenses/MIT.
 """
 
-import json
 import logging
 import os
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
 
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.bundle import FOLDERS_FILE, HOME_FILE, BundleWriter, is_bundle
+from grafana_dashboard_manager.concurrency import map_concurrently
+from grafana_dashboard_manager.exceptions import GrafanaApiException
+from grafana_dashboard_manager.filters import DashboardFilter
 from grafana_dashboard_manager.global_config import GlobalConfig
 from grafana_dashboard_manager.grafana.grafana_api import GrafanaApi
-from grafana_dashboard_manager.models import DashboardFolderLookup, DashboardSearchResult
+from grafana_dashboard_manager.journal import DOWNLOAD_JOURNAL_FILE, Journal
+from grafana_dashboard_manager.models import (
+    DashboardFolderLookup,
+    DashboardManifestEntry,
+    DashboardSummary,
+    Folder,
+    Snapshot,
+)
+from grafana_dashboard_manager.snapshots import LATEST_SNAPSHOT, SnapshotStore, snapshot_name
 from grafana_dashboard_manager.utils import confirm, show_dashboard_folders
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_FILE = "manifest.json"
+
 
 def download_dashboards(config: GlobalConfig, client: GrafanaApi):
-    """Download folder-structured dashboards and write to json files at the destination_root path"""
-    destination_dir = config.destination
-    if destination_dir is None:
+    """
+    Download folder-structured dashboards and write to json files at the destination_root path, or stream them into a
+    single bundle file if the destination has a bundle suffix
+    """
+    destination = config.destination
+    if destination is None:
         raise ValueError("No destination directory set")
 
-    # Check destination folder is empty
-    dest_contents = os.listdir(destination_dir)
-    destination_is_empty = len(dest_contents) == 0 or (len(dest_contents) == 1 and ".DS_Store" in dest_contents)
+    if config.keep_days is not None and config.snapshot is None:
+        raise ValueError("--keep-days can only be used when downloading a snapshot")
+
+    # A snapshot only adds to the store in the destination, so nothing is overwritten
+    if config.snapshot is not None:
+        if is_bundle(destination):
+            raise ValueError("Snapshots are written to a directory, not to a bundle")
+        if config.resume:
+            raise ValueError("Resuming is not supported when downloading a snapshot, use --incremental instead")
+        manifest = {}
+    elif is_bundle(destination):
+        if config.incremental:
+            raise ValueError("Incremental downloads are not supported when downloading to a bundle")
+        if config.resume:
+            raise ValueError("Resuming is not supported when downloading to a bundle")
+        manifest = {}
+        if destination.exists() and not config.non_interactive:
+            confirm(f"{destination} already exists. Confirm overwrite?")
+
+    # An incremental download expects to find the previous download in the destination, while a resumed download
+    # carries on writing to the same destination and uses its manifest only if the interrupted run got to write one
+    elif config.incremental or config.resume:
+        manifest = load_manifest(destination) if config.incremental or (destination / MANIFEST_FILE).is_file() else {}
+        logger.info(f"{len(manifest)} dashboards in the existing manifest")
+    else:
+        manifest = {}
 
-    if config.non_interactive or config.overwrite and not destination_is_empty:
-        logger.warning(f"Potentially overwriting files in {destination_dir}")
-    if not destination_is_empty and not config.non_interactive:
-        confirm("Destination directory is not empty. Confirm overwrite?")
+        # Check destination folder is empty
+        dest_contents = os.listdir(destination)
+        destination_is_empty = len(dest_contents) == 0 or (len(dest_contents) == 1 and ".DS_Store" in dest_contents)
 
-    logger.info(f"Pulling all dashboards into {destination_dir}...")
+        if config.non_interactive or config.overwrite and not destination_is_empty:
+            logger.warning(f"Potentially overwriting files in {destination}")
+        if not destination_is_empty and not config.non_interactive:
+            confirm("Destination directory is not empty. Confirm overwrite?")
 
-    # Get the folders to replicate locally in the destination_dir
-    folders = client.folders.all_folders()
+    logger.info(f"Pulling all dashboards into {destination}...")
 
-    # Keeps track of folders and the dashboards they contain
+    # Get the folders at every level of nesting to replicate locally in the destination
+    folders = client.folders.folder_tree()
+    dashboard_filter = DashboardFilter.from_config(config)
+
+    # Keeps track of folders and the dashboards they contain, keyed by the folder's path. The parents of the selected
+    # folders are kept too, so that the folders can be recreated with the same nesting
     folder_dashboards: dict[str, DashboardFolderLookup] = {
-        folder.title: DashboardFolderLookup(id=folder.id, uid=folder.uid, title=folder.title) for folder in folders
+        path: DashboardFolderLookup(id=folder.id, uid=folder.uid, title=folder.title, parentUid=folder.parentUid)
+        for path, folder in folders.items()
+        if dashboard_filter.needs_folder(path)
     }
     logger.info(f"Grafana folders found: {', '.join(folder_dashboards.keys())}")
 
-    # Iterate over each folder and grab the dashboards
-    for folder_title, folder in folder_dashboards.items():
-        dashboards = client.folders.dashboards_in_folder(folder.id)
-        folder_dashboards[folder_title].dashboards.extend(
-            [DashboardSearchResult.model_validate(dashboard) for dashboard in dashboards]
-        )
+    # List every dashboard in one paginated search, filtered by Grafana as far as it can be, and group them by folder
+    selected_folder_ids = [
+        folder.id for path, folder in folder_dashboards.items() if dashboard_filter.selects_folder(path)
+    ]
+    if dashboard_filter.folders and not selected_folder_ids:
+        logger.warning(f"No folders match {', '.join(dashboard_filter.folders)}")
+    else:
+        search_params = dashboard_filter.search_params(selected_folder_ids)
+        paths_by_uid = {folder.uid: path for path, folder in folders.items()}
+        for dashboard in client.folders.all_dashboards(search_params=search_params):
+            path = paths_by_uid.get(dashboard.folderUid)
+            if path is None:
+                logger.warning(f"Dashboard {dashboard.title} is in an unknown folder (uid={dashboard.folderUid})")
+                continue
+            if not dashboard_filter.selects(path, dashboard.uid, dashboard.title, dashboard.tags):
+                continue
+            folder_dashboards[path].dashboards.append(dashboard)
 
     show_dashboard_folders(folder_dashboards)
     if not config.non_interactive:
-        confirm(f"Download these dashboard jsons files to '{destination_dir}'?")
+        confirm(f"Download these dashboard jsons files to '{destination}'?")
 
-    for folder_title, folder in folder_dashboards.items():
-        for dashboard in folder.dashboards:
-            escaped_dashboard_title = dashboard.title.replace("/", "-").replace("\\", "-").replace(" ", "_")
-            dest_file_path = destination_dir / folder_title / f"{escaped_dashboard_title}.json"
-            client.dashboards.save(dashboard.uid, dest_file_path)
-        logger.info(f"Saved {len(folder.dashboards)} dashboards to {destination_dir / folder_title}")
+    if config.snapshot is not None:
+        failures = download_to_snapshot(config, client, folder_dashboards)
+        raise_for_failures(failures)
+        return
+
+    if is_bundle(destination):
+        failures = download_to_bundle(config, client, folder_dashboards)
+        raise_for_failures(failures)
+        return
+
+    # The journal is kept if the download fails, so that it can be resumed
+    header = {
+        "command": "download",
+        "host": client.host,
+        "org": client.org,
+        "destination": str(destination),
+        "filter": dashboard_filter.as_dict(),
+        "file_format": config.file_format,
+    }
+    with Journal(config.journal or destination / DOWNLOAD_JOURNAL_FILE, header, resume=config.resume) as journal:
+        failures = download_to_directory(config, client, folder_dashboards, manifest, journal)
+        raise_for_failures(failures)
+
+
+def raise_for_failures(failures: list[tuple[str, Exception]]) -> None:
+    """Fails the download if any dashboards could not be downloaded"""
+    if failures:
+        raise GrafanaApiException(
+            f"Failed to download {len(failures)} dashboards: {', '.join(uid for uid, _ in failures)}"
+        )
+
+
+def download_to_directory(
+    config: GlobalConfig,
+    client: GrafanaApi,
+    folder_dashboards: dict[str, DashboardFolderLookup],
+    manifest: dict[str, DashboardManifestEntry],
+    journal: Journal | None = None,
+) -> list[tuple[str, Exception]]:
+    """
+    Saves each dashboard to its own file in a directory per folder, returning any that failed
+
+    Each saved dashboard is recorded in the journal if given, and dashboards that the journal shows were already saved
+    by an interrupted download are skipped.
+    """
+    destination_dir = config.destination
+    if destination_dir is None:
+        raise ValueError("No destination directory set")
+
+    failures: list[tuple[str, Exception]] = []
+    saved_per_folder: dict[str, int] = {}
+    new_manifest: dict[str, DashboardManifestEntry] = {}
+    unchanged = 0
+    resumed = 0
+
+    def pending_downloads() -> Iterator[tuple[str, DashboardSummary, Path]]:
+        nonlocal resumed
+        for folder_path, folder in folder_dashboards.items():
+            for dashboard in folder.dashboards:
+                dest_file_path = destination_dir / folder_path / dashboard_filename(dashboard.title)
+                completed = journal.completed("dashboard", dashboard.uid) if journal else None
+                if completed and completed["path"] == dest_file_path.relative_to(destination_dir).as_posix():
+                    new_manifest[dashboard.uid] = DashboardManifestEntry.model_validate(completed)
+                    resumed += 1
+                    continue
+                yield folder_path, dashboard, dest_file_path
+
+    def save(download: tuple[str, DashboardSummary, Path]) -> tuple[DashboardManifestEntry, bool]:
+        """Saves a dashboard unless the manifest shows the local copy is up to date, and whether it was fetched"""
+        _, dashboard, dest_file_path = download
+        path = dest_file_path.relative_to(destination_dir).as_posix()
+
+        # The version history is far cheaper to request than the dashboard itself
+        previous = manifest.get(dashboard.uid)
+        if previous and previous.path == path and dest_file_path.is_file():
+            if client.dashboards.latest_version(dashboard.uid) == previous.version:
+                return previous.model_copy(update={"title": dashboard.title, "tags": list(dashboard.tags)}), False
+
+        version, sha256 = client.dashboards.save(
+            dashboard.uid,
+            dest_file_path,
+            unchanged_sha256=previous.sha256 if previous else None,
+            file_format=config.file_format,
+        )
+        entry = DashboardManifestEntry(
+            uid=dashboard.uid,
+            version=version,
+            sha256=sha256,
+            path=path,
+            title=dashboard.title,
+            tags=list(dashboard.tags),
+        )
+        return entry, True
+
+    # Results are yielded in order, so the log output is the same regardless of the number of jobs
+    for task in map_concurrently(save, pending_downloads(), config.jobs):
+        folder_path, dashboard, dest_file_path = task.item
+        if task.ok:
+            entry, fetched = task.result
+            new_manifest[dashboard.uid] = entry
+            if journal:
+                journal.record("dashboard", dashboard.uid, entry.model_dump())
+            if fetched:
+                logger.debug(f"Saved {dashboard.title} to {dest_file_path}")
+                saved_per_folder[folder_path] = saved_per_folder.get(folder_path, 0) + 1
+            else:
+                unchanged += 1
+        else:
+            logger.error(f"Failed to save {dashboard.title} (uid={dashboard.uid}): {task.error!r}")
+            failures.append((dashboard.uid, task.error))
+            # Keep the previous entry so the local copy is still tracked
+            if dashboard.uid in manifest:
+                new_manifest[dashboard.uid] = manifest[dashboard.uid]
+
+    for folder_path in folder_dashboards:
+        logger.info(f"Saved {saved_per_folder.get(folder_path, 0)} dashboards to {destination_dir / folder_path}")
+    if config.incremental:
+        logger.info(f"Skipped {unchanged} unchanged dashboards")
+    if resumed:
+        logger.info(f"Skipped {resumed} dashboards that were already downloaded")
 
     # Home
     client.dashboards.save_home(destination_dir)
 
     # Store folder information in a folders.json file for use when re-creating folders, we can ensure they have the same
     # folderUid
-    with (destination_dir / "folders.json").open("w") as file:
-        data = {key: value.model_dump() for key, value in folder_dashboards.items()}
-        file.write(json.dumps(data, indent=2))
+    folders_data = {key: value.model_dump() for key, value in folder_dashboards.items()}
+
+    # A filtered download only refreshes the selected folders and dashboards, so the rest of the destination is still
+    # described by the files of the earlier downloads
+    if DashboardFilter.from_config(config):
+        folders_file = destination_dir / FOLDERS_FILE
+        if folders_file.is_file():
+            folders_data = {**json_codec.loads(folders_file.read_bytes()), **folders_data}
+        if not config.incremental and (destination_dir / MANIFEST_FILE).is_file():
+            manifest = load_manifest(destination_dir)
+        new_manifest = {**manifest, **new_manifest}
+
+    write_if_changed(destination_dir / FOLDERS_FILE, json_codec.dumps(folders_data, indent=2))
+
+    # The manifest records what was downloaded, so that the next incremental download can skip unchanged dashboards
+    data = {uid: entry.model_dump() for uid, entry in sorted(new_manifest.items())}
+    write_if_changed(destination_dir / MANIFEST_FILE, json_codec.dumps(data, indent=2, compatible=False))
+
+    return failures
+
+
+def download_to_bundle(
+    config: GlobalConfig, client: GrafanaApi, folder_dashboards: dict[str, DashboardFolderLookup]
+) -> list[tuple[str, Exception]]:
+    """Streams every dashboard into a single bundle file as they are downloaded, returning any that failed"""
+    if config.destination is None:
+        raise ValueError("No destination directory set")
+
+    downloads = (
+        (folder_path, dashboard) for folder_path, folder in folder_dashboards.items() for dashboard in folder.dashboards
+    )
+    failures: list[tuple[str, Exception]] = []
+
+    def fetch(download: tuple[str, DashboardSummary]) -> bytes | memoryview:
+        _, dashboard = download
+        return client.dashboards.content(dashboard.uid, file_format=config.file_format)[0]
+
+    with BundleWriter(config.destination) as bundle:
+        # The folders are needed first when uploading, so that they exist before any dashboards are added to them
+        bundle.add(FOLDERS_FILE, folders_json(folder_dashboards))
+
+        # Only the fetches run concurrently, results arrive in order and are written from this thread
+        for task in map_concurrently(fetch, downloads, config.jobs):
+            folder_path, dashboard = task.item
+            if task.ok:
+                with client.metrics.phase("write"):
+                    bundle.add(f"{folder_path}/{dashboard_filename(dashboard.title)}", task.result)
+            else:
+                logger.error(f"Failed to save {dashboard.title} (uid={dashboard.uid}): {task.error!r}")
+                failures.append((dashboard.uid, task.error))
+
+        bundle.add(HOME_FILE, client.dashboards.file_content(client.dashboards.home_dashboard_json()))
+
+    saved = sum(len(folder.dashboards) for folder in folder_dashboards.values()) - len(failures)
+    logger.info(f"Saved {saved} dashboards to {config.destination}")
+    return failures
+
+
+def download_to_snapshot(
+    config: GlobalConfig, client: GrafanaApi, folder_dashboards: dict[str, DashboardFolderLookup]
+) -> list[tuple[str, Exception]]:
+    """
+    Adds a snapshot of every dashboard to the store in the destination, returning any that failed
+
+    Only the dashboards whose content isn't already in the store are written. An incremental download also skips
+    fetching the dashboards whose version is unchanged since the latest snapshot. The snapshot is saved even if some
+    dashboards failed, without them, and then any snapshots older than --keep-days are deleted along with the
+    dashboards that only they referred to.
+    """
+    if config.destination is None:
+        raise ValueError("No destination directory set")
+
+    store = SnapshotStore(config.destination)
+    created = datetime.now(UTC)
+    name = config.snapshot or snapshot_name(created)
+    if name == LATEST_SNAPSHOT:
+        raise ValueError(f"'{LATEST_SNAPSHOT}' refers to the most recent snapshot, and can't be used as a name")
+    if store.exists(name):
+        raise ValueError(f"A snapshot named '{name}' already exists in {config.destination}")
+
+    # The versions of dashboards are only comparable within the same Grafana and organization, so an incremental
+    # download carries on from the latest snapshot taken of them
+    previous: dict[str, DashboardManifestEntry] = {}
+    if config.incremental:
+        same_source = [
+            snapshot for snapshot in store.snapshots() if snapshot.host == client.host and snapshot.org == client.org
+        ]
+        if same_source:
+            previous = same_source[-1].dashboards
+        else:
+            logger.warning(f"No snapshot of {client.host} in {config.destination}, all dashboards will be downloaded")
+    logger.info(f"Writing snapshot {name}, {len(previous)} dashboards in the previous snapshot")
+
+    downloads = (
+        (folder_path, dashboard) for folder_path, folder in folder_dashboards.items() for dashboard in folder.dashboards
+    )
+
+    def fetch(download: tuple[str, DashboardSummary]) -> tuple[DashboardManifestEntry, bool]:
+        """Adds a dashboard to the store unless it is unchanged since the previous snapshot, and whether it was new"""
+        folder_path, dashboard = download
+        path = f"{folder_path}/{dashboard_filename(dashboard.title)}"
+
+        entry = previous.get(dashboard.uid)
+        if entry and store.has_blob(entry.sha256):
+            if client.dashboards.latest_version(dashboard.uid) == entry.version:
+                update = {"path": path, "title": dashboard.title, "tags": list(dashboard.tags)}
+                return entry.model_copy(update=update), False
+
+        content, version = client.dashboards.content(dashboard.uid, file_format=config.file_format)
+        with client.metrics.phase("write"):
+            sha256, written = store.put(content)
+        entry = DashboardManifestEntry(
+            uid=dashboard.uid,
+            version=version,
+            sha256=sha256,
+            path=path,
+            title=dashboard.title,
+            tags=list(dashboard.tags),
+        )
+        return entry, written
+
+    failures: list[tuple[str, Exception]] = []
+    entries: dict[str, DashboardManifestEntry] = {}
+    written = 0
+    for task in map_concurrently(fetch, downloads, config.jobs):
+        _, dashboard = task.item
+        if task.ok:
+            entry, new_blob = task.result
+            entries[dashboard.uid] = entry
+            written += new_blob
+        else:
+            logger.error(f"Failed to save {dashboard.title} (uid={dashboard.uid}): {task.error!r}")
+            failures.append((dashboard.uid, task.error))
+
+    home, _ = store.put(client.dashboards.file_content(client.dashboards.home_dashboard_json()))
+    store.save(
+        Snapshot(
+            name=name,
+            created=created,
+            host=client.host,
+            org=client.org,
+            folders={
+                path: Folder(id=folder.id, uid=folder.uid, title=folder.title, parentUid=folder.parentUid)
+                for path, folder in folder_dashboards.items()
+            },
+            dashboards=dict(sorted(entries.items())),
+            home=home,
+        )
+    )
+    logger.info(f"Saved snapshot {name} of {len(entries)} dashboards, {written} of which were new to the store")
+
+    if config.keep_days is not None:
+        store.prune(config.keep_days, now=created)
+        store.collect_garbage()
+
+    return failures
+
+
+def folders_json(folder_dashboards: dict[str, DashboardFolderLookup]) -> bytes:
+    """The content of the folders.json file"""
+    data = {key: value.model_dump() for key, value in folder_dashboards.items()}
+    return json_codec.dumps(data, indent=2)
+
+
+def load_manifest(directory: Path) -> dict[str, DashboardManifestEntry]:
+    """Reads the manifest of a previous download, keyed by dashboard uid"""
+    manifest_file = directory / MANIFEST_FILE
+    if not manifest_file.is_file():
+        logger.warning(f"No {MANIFEST_FILE} found in {directory}, all dashboards will be downloaded")
+        return {}
+
+    data = json_codec.loads(manifest_file.read_bytes())
+    return {uid: DashboardManifestEntry.model_validate(entry) for uid, entry in data.items()}
+
+
+def write_if_changed(path: Path, content: bytes) -> None:
+    """Writes a file only if its content would change, preserving the modification time otherwise"""
+    if path.is_file() and path.read_bytes() == content:
+        return
+    path.write_bytes(content)
+
+
+def dashboard_filename(title: str) -> str:
+    """Converts a dashboard title into a safe json file name"""
+    escaped_dashboard_title = title.replace("/", "-").replace("\\", "-").replace(" ", "_")
+    return f"{escaped_dashboard_title}.json"
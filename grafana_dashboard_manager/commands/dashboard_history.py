@@ -0,0 +1,95 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+from collections.abc import Iterator
+
+from grafana_dashboard_manager.bundle import is_bundle
+from grafana_dashboard_manager.concurrency import map_concurrently
+from grafana_dashboard_manager.exceptions import GrafanaApiException
+from grafana_dashboard_manager.filters import DashboardFilter
+from grafana_dashboard_manager.global_config import GlobalConfig
+from grafana_dashboard_manager.grafana.grafana_api import GrafanaApi
+from grafana_dashboard_manager.history import HistoryStore
+from grafana_dashboard_manager.models import DashboardSummary
+
+logger = logging.getLogger(__name__)
+
+
+def export_history(config: GlobalConfig, client: GrafanaApi):
+    """
+    CLI command handler to append the versions of each dashboard that are newer than the last export to a history
+    store in the destination directory
+
+    The dashboards are exported concurrently, with the versions of each dashboard fetched in order so that its file is
+    only ever appended to. A dashboard that fails is reported at the end of the run, and is retried from the same
+    version by the next run.
+    """
+    destination = config.destination
+    if destination is None or is_bundle(destination):
+        raise ValueError("Exporting history requires a destination directory")
+
+    destination.mkdir(parents=True, exist_ok=True)
+    dashboards = selected_dashboards(config, client)
+    store = HistoryStore(destination)
+    watermarks = store.watermarks()
+    logger.info(f"Exporting the history of {len(dashboards)} dashboards, {len(watermarks)} exported previously")
+
+    def timed_writes(versions: Iterator[tuple[int, bytes]]) -> Iterator[tuple[int, bytes]]:
+        # The store writes each version before asking for the next, so the time until it does is the time to write it,
+        # while fetching the next version is left out
+        for version in versions:
+            with client.metrics.phase("write"):
+                yield version
+
+    def export(dashboard: DashboardSummary) -> tuple[int, int]:
+        history = client.dashboards.history(dashboard.uid, after=watermarks.get(dashboard.uid, 0))
+        return store.append(dashboard.uid, timed_writes(history))
+
+    failures: list[str] = []
+    appended = 0
+    try:
+        for task in map_concurrently(export, dashboards, config.jobs):
+            dashboard = task.item
+            if task.ok:
+                count, newest = task.result
+                if count:
+                    logger.debug(f"Appended {count} versions of {dashboard.title} up to version {newest}")
+                    watermarks[dashboard.uid] = newest
+                    appended += count
+            else:
+                logger.error(f"Failed to export the history of {dashboard.title} (uid={dashboard.uid}): {task.error}")
+                failures.append(dashboard.uid)
+    finally:
+        # The versions that were appended are recorded even if the run is interrupted
+        store.save_watermarks(watermarks)
+
+    logger.info(f"Appended {appended} new versions to {destination}")
+    if failures:
+        raise GrafanaApiException(f"Failed to export the history of {len(failures)} dashboards: {', '.join(failures)}")
+
+
+def selected_dashboards(config: GlobalConfig, client: GrafanaApi) -> list[DashboardSummary]:
+    """The dashboards in every folder that are selected by the filters, using as few search requests as possible"""
+    folders = client.folders.folder_tree()
+    dashboard_filter = DashboardFilter.from_config(config)
+
+    selected_folder_ids = [folder.id for path, folder in folders.items() if dashboard_filter.selects_folder(path)]
+    if dashboard_filter.folders and not selected_folder_ids:
+        logger.warning(f"No folders match {', '.join(dashboard_filter.folders)}")
+        return []
+
+    paths_by_uid = {folder.uid: path for path, folder in folders.items()}
+    return [
+        dashboard
+        for dashboard in client.folders.all_dashboards(
+            search_params=dashboard_filter.search_params(selected_folder_ids)
+        )
+        if dashboard.folderUid in paths_by_uid
+        and dashboard_filter.selects(paths_by_uid[dashboard.folderUid], dashboard.uid, dashboard.title, dashboard.tags)
+    ]
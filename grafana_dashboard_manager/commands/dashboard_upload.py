@@ -6,147 +6,443 @@ license that can be found in the LICENSE file or at
 https://opensource.org/licenses/MIT.
 """
 
-import json
 import logging
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from enum import Enum
+from functools import partial
 from pathlib import Path
 
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.bundle import FOLDERS_FILE, HOME_FILE, BundleReader, DashboardFile, is_bundle
+from grafana_dashboard_manager.commands.dashboard_download import MANIFEST_FILE, load_manifest
+from grafana_dashboard_manager.concurrency import TaskResult, map_concurrently
+from grafana_dashboard_manager.exceptions import GrafanaApiException
+from grafana_dashboard_manager.filters import DashboardFilter
 from grafana_dashboard_manager.global_config import GlobalConfig
 from grafana_dashboard_manager.grafana.grafana_api import GrafanaApi
+from grafana_dashboard_manager.handlers.api_dashboards import ApiDashboards
+from grafana_dashboard_manager.journal import UPLOAD_JOURNAL_FILE, Journal
+from grafana_dashboard_manager.models import DashboardManifestEntry, Snapshot
 from grafana_dashboard_manager.models.folder import Folder
+from grafana_dashboard_manager.rewrite import (
+    DashboardRewriter,
+    DatasourceRemapPass,
+    FolderIndex,
+    FolderRemapPass,
+    StripVersionPass,
+)
+from grafana_dashboard_manager.snapshots import SnapshotStore
 
 from ..utils import confirm, show_dashboards
 
 logger = logging.getLogger(__name__)
 
+# The rewriter of a worker process that prepares dashboards, which is sent once rather than with every dashboard
+_worker_rewriter: DashboardRewriter | None = None
+
+
+@dataclass(frozen=True)
+class PreparedDashboard:
+    """A dashboard that has been rewritten and encoded, ready to be uploaded"""
+
+    uid: str | None
+    title: str
+    content: bytes
+    # Only computed when comparing with the dashboards already in Grafana
+    content_hash: str | None = None
+    # The time taken to prepare the dashboard, which is recorded by the main process when prepared by a worker process
+    read_seconds: float = 0.0
+
+
+class UploadStatus(Enum):
+    """The outcome of uploading a single dashboard"""
+
+    UPLOADED = "uploaded"
+    CREATED = "created"
+    UPDATED = "updated"
+    UNCHANGED = "unchanged"
+
 
 def upload_dashboards(config: GlobalConfig, client: GrafanaApi):
-    """CLI command handler to take a source directory of dashboards and write them to Grafana via the HTTP API"""
-    source_dir = config.source
+    """
+    CLI command handler to take a source directory, bundle file or snapshot of dashboards and write them to Grafana via
+    the HTTP API
+    """
+    source = config.source
 
-    if not isinstance(source_dir, Path):
-        raise ValueError(f"Unsupported source: {source_dir=}")
+    if not isinstance(source, Path):
+        raise ValueError(f"Unsupported source: {source=}")
 
-    logger.info(f"Uploading dashboards from {source_dir}")
-    show_dashboards(source_dir)
+    logger.info(f"Uploading dashboards from {source}")
 
     # Load the folders.json information if present, but otherwise we can still query for the folders with the caveat
     # being folderUids won't be consistent across Grafana installs
-    folder_info_dir = source_dir / "folders.json"
-    if not (folder_info_dir.exists() and folder_info_dir.is_file()):
-        logger.warning(f"The {folder_info_dir} file is missing, which is created when downloading dashboards")
+    snapshot: Snapshot | None = None
+    if config.snapshot is not None:
+        store = SnapshotStore(source)
+        snapshot = store.load(config.snapshot)
+        logger.info(f"Restoring snapshot {snapshot.name} of {snapshot.host}, taken at {snapshot.created}")
+        folders_json = None
+        folder_paths = list(snapshot.folders)
+        dashboard_files = store.dashboard_files(snapshot)
+    elif is_bundle(source):
+        bundle = BundleReader(source)
+        folders_json = bundle.folders_json
+        folder_paths: list[str] = []
+        dashboard_files = bundle.dashboards()
+    else:
+        show_dashboards(source)
+        folder_info_file = source / FOLDERS_FILE
+        folders_json = folder_info_file.read_bytes() if folder_info_file.is_file() else None
+
+        # Every directory at any depth is a folder, skipping hidden directories such as .git
+        folders = {
+            folder.relative_to(source).as_posix(): folder
+            for folder in sorted(source.rglob("*"))
+            if folder.is_dir() and not any(part.startswith(".") for part in folder.relative_to(source).parts)
+        }
+        folder_paths = list(folders)
+        dashboard_files = (
+            DashboardFile(folder_path, json_file.name, path=json_file)
+            for folder_path, folder in folders.items()
+            for json_file in folder.iterdir()
+            if json_file.is_file() and not json_file.name.startswith(".")
+        )
+
+    if snapshot is not None:
+        folder_info: dict[str, Folder] = dict(snapshot.folders)
+    elif folders_json is None:
+        logger.warning(
+            f"The {FOLDERS_FILE} file is missing from {source}, which is created when downloading dashboards"
+        )
         logger.warning("The folders will not have the same folderUid and links/bookmarks will break")
-        folder_info: dict[str, Folder] = {x.title: Folder.model_validate(x) for x in client.folders.all_folders()}
+        folder_info = client.folders.folder_tree()
     else:
-        with folder_info_dir.open("r") as file:
-            folder_info = {key: Folder.model_validate(value) for key, value in json.loads(file.read()).items()}
+        data = json_codec.loads(folders_json)
+        folder_info = {key: Folder.model_validate(value) for key, value in data.items()}
 
     if config.non_interactive is False:
         confirm("Folder hierarchy will be preserved. Press any key to confirm upload...")
 
-    for folder in source_dir.glob("*"):
-        if not folder.is_dir():
-            continue
+    # The dashboards refer to the folders as they were where they were downloaded from
+    source_folders = dict(folder_info)
 
-        # Create the folders using a known folderUid, either from the local file or from a live install
-        known_folder = folder_info.get(folder.name)
+    # A bundle is read as a stream, so the folders are known up front from its folders.json
+    if is_bundle(source):
+        folder_paths = list(folder_info)
 
-        if known_folder:
-            client.folders.create(folder.name, known_folder.uid)
-        # For cases where the folder isn't present in either, then we can just create it and use the autogenerated
-        # folderUid. In this scenario, the source dashboards may contain references to folders which now have a
-        # different folderUid.
+    # Only the selected dashboards are read, using the manifest of the download where possible to avoid reading the
+    # files that aren't selected
+    dashboard_filter = DashboardFilter.from_config(config)
+    if dashboard_filter:
+        if snapshot is not None:
+            manifest = snapshot.dashboards
         else:
-            _folder = client.folders.create(folder.name)
-            folder_info[_folder.title] = _folder
-
-        # Create the folders and dashboards
-        for json_file in folder.iterdir():
-            logger.info(f"{folder.name}: adding dashboard {json_file.name}")
-            with json_file.open("r") as file:
-                dashboard = json.loads(file.read())
-
-            dashboard = update_dashlist_folder_ids(dashboard, folder_info)
-            client.dashboards.create(dashboard=dashboard, folder_uid=folder_info[folder.name].uid)
-
-    if not config.skip_home:
-        set_home_dashboard(config, client, folder_info)
+            manifest = load_manifest(source) if (source / MANIFEST_FILE).is_file() else {}
+        folder_paths = [path for path in folder_paths if dashboard_filter.needs_folder(path)]
+        dashboard_files = select_dashboard_files(dashboard_files, dashboard_filter, manifest)
+
+    # The journal is kept if the upload fails, so that it can be resumed
+    if config.journal:
+        journal_path = config.journal
+    elif is_bundle(source):
+        journal_path = source.with_name(f"{source.name}{UPLOAD_JOURNAL_FILE}")
     else:
-        logger.info("Skipped setting the home dashboard")
+        journal_path = source / UPLOAD_JOURNAL_FILE
+    header = {
+        "command": "upload",
+        "host": client.host,
+        "org": client.org,
+        "source": str(source),
+        "filter": dashboard_filter.as_dict(),
+    }
+    if snapshot is not None:
+        header["snapshot"] = snapshot.name
+    try:
+        journal = Journal(journal_path, header, resume=config.resume)
+    except OSError as e:
+        # The source may be on a read-only mount, which is only a problem if the journal was asked for
+        if config.journal or config.resume:
+            raise
+        logger.warning(f"Unable to write the journal {journal_path} ({e}), the upload can't be resumed if interrupted")
+        journal = Journal(None, header)
+    with journal:
+
+        def create_folder(path: str) -> Folder:
+            # Folders are created after their parent, which is found from the path
+            parent_path, _, name = path.rpartition("/")
+            parent_uid = folder_info[parent_path].uid if parent_path else None
+
+            # Create the folders using a known folderUid, either from the local file or from a live install
+            known_folder = folder_info.get(path)
+            if known_folder:
+                return client.folders.create(known_folder.title, known_folder.uid, parent_uid=parent_uid)
+
+            # For cases where the folder isn't present in either, then we can just create it and use the autogenerated
+            # folderUid. In this scenario, the source dashboards may contain references to folders which now have a
+            # different folderUid.
+            return client.folders.create(name, parent_uid=parent_uid)
+
+        # Folders created before the upload was interrupted keep the uid they were given
+        for path in folder_paths:
+            completed = journal.completed("folder", path)
+            if completed:
+                folder_info[path] = Folder.model_validate(completed)
+
+        # All folders must exist before any dashboards can be added to them
+        pending_folders = [path for path in folder_paths if not journal.completed("folder", path)]
+        for task in create_folders_by_level(create_folder, pending_folders, config.jobs):
+            if not task.ok:
+                raise GrafanaApiException(f"Could not create folder '{task.item}'") from task.error
+            folder_info[task.item] = task.result
+            journal.record("folder", task.item, task.result.model_dump())
+        created_folders = set(folder_paths)
+
+        def ensure_folder(path: str) -> None:
+            if path in created_folders:
+                return
+            parent_path = path.rpartition("/")[0]
+            if parent_path:
+                ensure_folder(parent_path)
+            completed = journal.completed("folder", path)
+            if completed:
+                folder_info[path] = Folder.model_validate(completed)
+            else:
+                folder_info[path] = create_folder(path)
+                journal.record("folder", path, folder_info[path].model_dump())
+            folder_index.add(folder_info[path], source_folders.get(path))
+            created_folders.add(path)
+
+        resumed = 0
+
+        def with_folders_created(dashboard_files: Iterable[DashboardFile]) -> Iterator[DashboardFile]:
+            """
+            Creates any folders that were not known up front, before their dashboards are uploaded, and skips
+            dashboards that were already uploaded
+            """
+            nonlocal resumed
+            for dashboard_file in dashboard_files:
+                if journal.completed("dashboard", f"{dashboard_file.folder}/{dashboard_file.name}") is not None:
+                    resumed += 1
+                    continue
+                ensure_folder(dashboard_file.folder)
+                yield dashboard_file
+
+        # Each dashboard is rewritten for this Grafana in a single walk of its panels
+        folder_index = FolderIndex.build(folder_info, source_folders)
+        rewriter = dashboard_rewriter(folder_index, config.datasource_uids)
+
+        # Which dashboards already exist, and in which folder, can be found in a few bulk search requests
+        existing_folder_uids: dict[str, str] = {}
+        if config.skip_unchanged:
+            existing_folder_uids = {dashboard.uid: dashboard.folderUid for dashboard in client.folders.all_dashboards()}
+            logger.info(f"Found {len(existing_folder_uids)} existing dashboards to compare against")
+
+        def upload(prepared: TaskResult[DashboardFile, PreparedDashboard]) -> UploadStatus:
+            if not prepared.ok or prepared.result is None:
+                raise prepared.error or ValueError(f"No dashboard read from {prepared.item.name}")
+            dashboard = prepared.result
+            client.metrics.add_phase("read", dashboard.read_seconds)
+            folder_uid = folder_info[prepared.item.folder].uid
+
+            def create() -> None:
+                client.dashboards.create_encoded(dashboard.content, dashboard.title, folder_uid, uid=dashboard.uid)
+
+            if not config.skip_unchanged:
+                create()
+                return UploadStatus.UPLOADED
+
+            if dashboard.uid not in existing_folder_uids:
+                create()
+                return UploadStatus.CREATED
+
+            # Only POST when the dashboard has moved folder or its content differs, to avoid creating a new version
+            if existing_folder_uids[dashboard.uid] == folder_uid:
+                existing = client.dashboards.dashboard_json(dashboard.uid)
+                if client.dashboards.content_hash(existing) == dashboard.content_hash:
+                    return UploadStatus.UNCHANGED
+
+            create()
+            return UploadStatus.UPDATED
+
+        # The files are read, rewritten and encoded by one pool of workers and uploaded by another, so that preparing
+        # the next dashboards overlaps with uploading the previous ones. At most a few dashboards per job are buffered
+        # between the two
+        read_jobs = config.read_jobs or config.jobs
+        read_processes = config.read_processes
+        if read_processes and is_bundle(source):
+            # A bundle's folders may only be found while it is streamed, after the workers were sent the rewriter
+            logger.warning("--read-processes is ignored for a bundle, whose dashboards are read by threads instead")
+            read_processes = False
+
+        if read_processes:
+            # Worker processes can't share the rewriter, so each is sent it once when it starts. The folders of a
+            # directory or snapshot were all created up front, so the rewriter's index is already complete
+            prepared = map_concurrently(
+                partial(prepare_in_worker, with_hash=config.skip_unchanged),
+                with_folders_created(dashboard_files),
+                read_jobs,
+                processes=True,
+                initializer=init_read_worker,
+                initargs=(rewriter,),
+            )
+        else:
+            prepared = map_concurrently(
+                partial(prepare_dashboard, rewriter, with_hash=config.skip_unchanged),
+                with_folders_created(dashboard_files),
+                read_jobs,
+            )
+
+        failures: list[str] = []
+        counts = Counter[UploadStatus]()
+        for task in map_concurrently(upload, prepared, config.jobs):
+            dashboard_file = task.item.item
+            if task.ok:
+                counts[task.result] += 1
+                journal.record("dashboard", f"{dashboard_file.folder}/{dashboard_file.name}")
+                logger.info(f"{dashboard_file.folder}: {task.result.value} dashboard {dashboard_file.name}")
+            else:
+                logger.error(f"{dashboard_file.folder}: failed to add dashboard {dashboard_file.name} - {task.error}")
+                failures.append(f"{dashboard_file.folder}/{dashboard_file.name}")
+
+        if counts:
+            logger.info(", ".join(f"{status.value} {count}" for status, count in counts.items()).capitalize())
+        if resumed:
+            logger.info(f"Skipped {resumed} dashboards that were already uploaded")
+
+        # The home dashboard may link to any of the other dashboards so it is set last. A bundle's home dashboard is
+        # only available once all of the other dashboards have been read
+        if config.skip_home:
+            logger.info("Skipped setting the home dashboard")
+        elif dashboard_filter:
+            logger.info("Skipped setting the home dashboard, as only some of the dashboards were uploaded")
+        elif journal.completed("home", HOME_FILE) is not None:
+            logger.info("Skipped setting the home dashboard, which was already set")
+        elif snapshot is not None:
+            set_home_dashboard(client, store.get(snapshot.home) if snapshot.home else None, rewriter)
+            journal.record("home", HOME_FILE)
+        elif is_bundle(source):
+            set_home_dashboard(client, bundle.home_json, rewriter)
+            journal.record("home", HOME_FILE)
+        else:
+            home_file = source / HOME_FILE
+            set_home_dashboard(client, home_file.read_bytes() if home_file.is_file() else None, rewriter)
+            journal.record("home", HOME_FILE)
 
+        if failures:
+            raise GrafanaApiException(f"Failed to upload {len(failures)} dashboards: {', '.join(failures)}")
 
-def set_home_dashboard(config: GlobalConfig, client: GrafanaApi, folder_info: dict[str, Folder]):
-    """Uploads the home.json dashboard"""
-    if config.source is None:
-        logger.warning("No source directory, cannot find home.json file")
-        return
 
-    home_dashboard = config.source / "home.json"
+def select_dashboard_files(
+    dashboard_files: Iterable[DashboardFile],
+    dashboard_filter: DashboardFilter,
+    manifest: dict[str, DashboardManifestEntry],
+) -> Iterator[DashboardFile]:
+    """
+    Yields the dashboard files that are selected by the filter
 
-    if not home_dashboard.is_file():
-        logger.warning(f"{home_dashboard} is not a file")
-        return
+    The folder of a file is known from its path, and the uid, title and tags are taken from the download's manifest
+    where it has them. Otherwise the file has to be read to find them, and its content is kept so it isn't read again.
+    """
+    entries_by_path = {entry.path: entry for entry in manifest.values()}
+
+    for dashboard_file in dashboard_files:
+        if not dashboard_filter.selects_folder(dashboard_file.folder):
+            continue
+        if not dashboard_filter.filters_dashboards:
+            yield dashboard_file
+            continue
 
-    with home_dashboard.open("r") as file:
-        dashboard = json.loads(file.read())
-        dashboard = update_dashlist_folder_ids(dashboard, folder_info)
+        entry = entries_by_path.get(f"{dashboard_file.folder}/{dashboard_file.name}")
+        if entry is not None and entry.title is not None:
+            if dashboard_filter.selects(dashboard_file.folder, entry.uid, entry.title, entry.tags):
+                yield dashboard_file
+            continue
 
-        dashboard_uid = client.dashboards.create_home(dashboard)
-        logger.info(f"Set home dashboard: {dashboard['title']}")
+        content = dashboard_file.read()
+        dashboard = ApiDashboards.load_file(content)
+        if dashboard_filter.selects(
+            dashboard_file.folder, dashboard.get("uid"), dashboard.get("title"), dashboard.get("tags") or []
+        ):
+            yield DashboardFile(dashboard_file.folder, dashboard_file.name, content=content)
 
-    client.dashboards.set_home(dashboard_uid)
 
+def prepare_dashboard(
+    rewriter: DashboardRewriter, dashboard_file: DashboardFile, *, with_hash: bool = False
+) -> PreparedDashboard:
+    """
+    Reads, rewrites and re-encodes a dashboard file ready to be uploaded
 
-def update_dashlist_folder_ids(dashboard: dict, folder_info: dict[str, Folder]) -> dict:
+    This is run in a worker process when reading with --read-processes, which only has to send back the encoded
+    dashboard rather than the much slower to transfer decoded one.
     """
-    Checks consistency between the id of folders in the database with the dashlist panel definitions,
-    updating if necessary.
+    start = time.perf_counter()
+    dashboard = rewriter.rewrite(ApiDashboards.load_file(dashboard_file.read()))
+    dashboard.pop("id", None)
+    return PreparedDashboard(
+        uid=dashboard.get("uid"),
+        title=dashboard["title"],
+        content=json_codec.dumps(dashboard, compatible=False),
+        content_hash=ApiDashboards.content_hash(dashboard) if with_hash else None,
+        read_seconds=time.perf_counter() - start,
+    )
+
+
+def init_read_worker(rewriter: DashboardRewriter) -> None:
+    """Keeps the rewriter for the dashboards prepared by this worker process"""
+    global _worker_rewriter
+    _worker_rewriter = rewriter
+
+
+def prepare_in_worker(dashboard_file: DashboardFile, *, with_hash: bool = False) -> PreparedDashboard:
+    """Prepares a dashboard with the rewriter the worker process was started with"""
+    if _worker_rewriter is None:
+        raise RuntimeError("The worker process was not started with a rewriter")
+    return prepare_dashboard(_worker_rewriter, dashboard_file, with_hash=with_hash)
+
+
+def create_folders_by_level(
+    create_folder: Callable[[str], Folder], folder_paths: Iterable[str], jobs: int
+) -> Iterator[TaskResult[str, Folder]]:
     """
-    # Some dashboards use a list of "rows" with "panels" nested within, some dashboards just use "panels".
-    # If using "rows", we need to iterate over "rows" to extract all of the "panels"
-    if dashboard.get("panels"):
-        dashboard["panels"] = [update_panel_dashlist_folder_ids(panel, folder_info) for panel in dashboard["panels"]]
-
-    elif dashboard.get("rows"):
-        for row in dashboard["rows"]:
-            dashboard["rows"]["panels"] = [
-                update_panel_dashlist_folder_ids(panel, folder_info) for panel in row["panels"]
-            ]
-    else:
-        logger.info(f"{dashboard['title']} does not have any any panels")
+    Creates nested folders one level at a time, with the folders of each level created concurrently
 
-    return dashboard
+    Each level is only started once the results of the previous level have been consumed, so a parent folder's result
+    is available when its children are created. The folder paths are made up of folder names separated by "/".
+    """
+    for level in folder_levels(folder_paths):
+        yield from map_concurrently(create_folder, level, jobs)
 
 
-def update_panel_dashlist_folder_ids(panel: dict, folder_info: dict[str, Folder]) -> dict:
-    """Updates folder ID/UID for dashlist panels"""
-    if panel["type"] != "dashlist":
-        return panel
+def folder_levels(folder_paths: Iterable[str]) -> list[list[str]]:
+    """Groups folder paths by their level of nesting, least nested first, so that parents are created first"""
+    levels: dict[int, list[str]] = {}
+    for path in folder_paths:
+        levels.setdefault(path.count("/"), []).append(path)
+    return [levels[depth] for depth in sorted(levels)]
 
-    folder_name = panel["title"]
-    folder = folder_info.get(folder_name)
 
-    # If there's no folder, it could be referencing other things like recent dashboards, alerts etc
-    if folder is None:
-        logger.debug(f"Panel {folder_name} was not found in folders")
-        return panel
+def dashboard_rewriter(folder_index: FolderIndex, datasource_uids: dict[str, str] | None = None) -> DashboardRewriter:
+    """The rewrites applied to each dashboard before it is uploaded"""
+    passes = [StripVersionPass(), FolderRemapPass(folder_index)]
+    if datasource_uids:
+        passes.append(DatasourceRemapPass(datasource_uids))
+    return DashboardRewriter(passes)
 
-    # Some dashboard panels may not contain an `options` field
-    if not panel.get("options"):
-        logger.warning(f"Panel {folder_name} does not have an options field to modify")
-        return panel
 
-    # Look up the target folder using the panel title - it needs to match!
-    logger.info(f"Updating Panel {folder_name} with {folder.uid=} and {folder.id=}")
+def set_home_dashboard(client: GrafanaApi, home_json: bytes | None, rewriter: DashboardRewriter):
+    """Uploads the home.json dashboard"""
+    if home_json is None:
+        logger.warning(f"No {HOME_FILE} file found, cannot set the home dashboard")
+        return
 
-    # Ensure that the folder id and uid in the dashboard definition matches
-    if panel_folder_id := panel["options"].get("folderId"):
-        if panel_folder_id != folder.id:
-            logger.info(f"Updating folderId to {folder.id}")
-            panel["options"]["folderId"] = folder.id
+    dashboard = ApiDashboards.load_file(home_json)
+    dashboard = rewriter.rewrite(dashboard)
 
-    if panel_folder_uid := panel["options"].get("folderUID"):
-        if panel_folder_uid != folder.uid:
-            logger.info(f"Updating folderUID to {folder.uid}")
-            panel["options"]["folderUID"] = folder.uid
+    dashboard_uid = client.dashboards.create_home(dashboard)
+    logger.info(f"Set home dashboard: {dashboard['title']}")
 
-    return panel
+    client.dashboards.set_home(dashboard_uid)
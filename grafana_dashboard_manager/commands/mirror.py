@@ -0,0 +1,87 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+
+from grafana_dashboard_manager.commands.dashboard_upload import create_folders_by_level, dashboard_rewriter
+from grafana_dashboard_manager.concurrency import TaskResult, map_concurrently
+from grafana_dashboard_manager.exceptions import GrafanaApiException
+from grafana_dashboard_manager.global_config import GlobalConfig
+from grafana_dashboard_manager.grafana.factory import client_from_config
+from grafana_dashboard_manager.grafana.grafana_api import GrafanaApi
+from grafana_dashboard_manager.models import DashboardSummary, Folder
+from grafana_dashboard_manager.rewrite import FolderIndex
+from grafana_dashboard_manager.utils import confirm
+
+logger = logging.getLogger(__name__)
+
+
+def mirror_dashboards(config: GlobalConfig, client: GrafanaApi, target: GrafanaApi | None = None):
+    """
+    Copy folders and dashboards from one Grafana instance to another without writing them to disk
+
+    Dashboards are fetched from the source and uploaded to the target by two worker pools connected by a bounded
+    buffer, so that reads from the source overlap with writes to the target.
+    """
+    if target is None:
+        target = client_from_config(config, target=True, metrics=client.metrics)
+
+    # Folders are keyed by their path, so that nested folders are created after their parents
+    source_folders = client.folders.folder_tree()
+    paths_by_uid = {folder.uid: path for path, folder in source_folders.items()}
+    dashboards = [dashboard for dashboard in client.folders.all_dashboards() if dashboard.folderUid in paths_by_uid]
+    logger.info(f"Found {len(source_folders)} folders and {len(dashboards)} dashboards in {client.host}")
+
+    if not config.non_interactive:
+        confirm(f"Copy these dashboards to {target.host}, overwriting any with the same uid?")
+
+    # Create the folders using the same folderUid as the source, so that links and bookmarks carry over
+    def create_folder(path: str) -> Folder:
+        folder = source_folders[path]
+        return target.folders.create(folder.title, folder.uid, parent_uid=folder.parentUid)
+
+    folder_info: dict[str, Folder] = {}
+    for task in create_folders_by_level(create_folder, source_folders, config.jobs):
+        if not task.ok:
+            raise GrafanaApiException(f"Could not create folder '{task.item}'") from task.error
+        folder_info[task.item] = task.result
+
+    # Each dashboard is rewritten for the target in a single walk of its panels
+    rewriter = dashboard_rewriter(FolderIndex.build(folder_info, source_folders), config.datasource_uids)
+
+    def fetch(dashboard: DashboardSummary) -> dict:
+        return client.dashboards.dashboard_json(dashboard.uid)
+
+    def upload(fetched: TaskResult[DashboardSummary, dict]) -> None:
+        if not fetched.ok or fetched.result is None:
+            raise GrafanaApiException(f"Could not fetch from source: {fetched.error}")
+
+        folder_path = paths_by_uid[fetched.item.folderUid]
+        dashboard = rewriter.rewrite(fetched.result)
+        target.dashboards.create(dashboard=dashboard, folder_uid=folder_info[folder_path].uid)
+
+    # The fetch results are consumed lazily as upload slots free up, so at most a few dashboards per job are buffered
+    failures: list[str] = []
+    for task in map_concurrently(upload, map_concurrently(fetch, dashboards, config.jobs), config.jobs):
+        dashboard = task.item.item
+        if task.ok:
+            logger.info(f"{paths_by_uid[dashboard.folderUid]}: copied dashboard {dashboard.title}")
+        else:
+            logger.error(f"Failed to copy {dashboard.title} (uid={dashboard.uid}): {task.error}")
+            failures.append(dashboard.uid)
+
+    # The home dashboard may link to any of the other dashboards so it is set last
+    if config.skip_home:
+        logger.info("Skipped setting the home dashboard")
+    else:
+        home = rewriter.rewrite(client.dashboards.home_dashboard_json())
+        target.dashboards.set_home(target.dashboards.create_home(home))
+        logger.info(f"Set home dashboard: {home['title']}")
+
+    if failures:
+        raise GrafanaApiException(f"Failed to copy {len(failures)} dashboards: {', '.join(failures)}")
@@ -0,0 +1,123 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+from pathlib import Path
+
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.bundle import is_bundle
+from grafana_dashboard_manager.concurrency import map_concurrently
+from grafana_dashboard_manager.exceptions import GrafanaApiException
+from grafana_dashboard_manager.global_config import GlobalConfig
+from grafana_dashboard_manager.grafana.grafana_api import GrafanaApi
+from grafana_dashboard_manager.models import Org
+from grafana_dashboard_manager.utils import confirm
+
+logger = logging.getLogger(__name__)
+
+ORGS_FILE = "orgs.json"
+
+
+def run_for_all_orgs(config: GlobalConfig, client: GrafanaApi):
+    """
+    Runs the selected download or upload command for every organization concurrently, using a subdirectory of the
+    destination or source for each organization
+    """
+    if config.org:
+        raise ValueError("Cannot use both --org and --all-orgs")
+    # Each organization keeps its own journal in its subdirectory
+    if config.journal:
+        raise ValueError("Cannot use both --journal and --all-orgs")
+
+    # Each organization's command runs without prompts, so confirm the whole run once up front
+    if config.destination is not None:
+        org_dirs = _plan_download(config, client)
+        if not config.non_interactive:
+            confirm(f"Download the dashboards of {len(org_dirs)} organizations to '{config.destination}'?")
+    elif config.source is not None:
+        org_dirs = _plan_upload(config, client)
+        if not config.non_interactive:
+            confirm(f"Upload the dashboards of {len(org_dirs)} organizations from '{config.source}'?")
+    else:
+        raise ValueError("No source or destination directory set")
+
+    def run(org_dir: tuple[Path, Org]) -> None:
+        directory, org = org_dir
+        org_config = config.model_copy(
+            update={
+                "source": directory if config.source is not None else None,
+                "destination": directory if config.destination is not None else None,
+                "org": org.id,
+                "non_interactive": True,
+            }
+        )
+        org_config.func(org_config, client.for_org(org.id))
+
+    # The organizations share the client's connection pool and concurrency limit
+    failures: list[str] = []
+    for task in map_concurrently(run, org_dirs, config.jobs):
+        directory, org = task.item
+        if task.ok:
+            logger.info(f"Completed organization '{org.name}' (id={org.id}) using {directory}")
+        else:
+            logger.error(f"Failed organization '{org.name}' (id={org.id}): {task.error}")
+            failures.append(org.name)
+
+    if failures:
+        raise GrafanaApiException(f"Failed for {len(failures)} organizations: {', '.join(failures)}")
+
+
+def org_dirname(org: Org) -> str:
+    """Converts an organization name into a safe directory name"""
+    return org.name.replace("/", "-").replace("\\", "-").replace(" ", "_")
+
+
+def _plan_download(config: GlobalConfig, client: GrafanaApi) -> list[tuple[Path, Org]]:
+    """Creates a subdirectory for each organization, and records them in an orgs.json file"""
+    root = config.destination
+    if root is None or is_bundle(root):
+        raise ValueError("Downloading all organizations requires a destination directory")
+
+    orgs = client.orgs.all_orgs()
+    logger.info(f"Grafana organizations found: {', '.join(org.name for org in orgs)}")
+
+    org_dirs = {org_dirname(org): org for org in orgs}
+    for dirname in org_dirs:
+        (root / dirname).mkdir(exist_ok=True)
+
+    data = {dirname: org.model_dump() for dirname, org in org_dirs.items()}
+    (root / ORGS_FILE).write_bytes(json_codec.dumps(data, indent=2))
+
+    return [(root / dirname, org) for dirname, org in org_dirs.items()]
+
+
+def _plan_upload(config: GlobalConfig, client: GrafanaApi) -> list[tuple[Path, Org]]:
+    """Matches each subdirectory to an organization by name, creating organizations that don't exist"""
+    root = config.source
+    if root is None or is_bundle(root):
+        raise ValueError("Uploading all organizations requires a source directory")
+
+    # The orgs.json file has the original organization names, which may have been changed to make directory names
+    orgs_file = root / ORGS_FILE
+    known_names: dict[str, str] = {}
+    if orgs_file.is_file():
+        known_names = {dirname: org["name"] for dirname, org in json_codec.loads(orgs_file.read_bytes()).items()}
+    else:
+        logger.warning(f"The {orgs_file} file is missing, organizations will be matched by directory name")
+
+    existing = {org.name: org for org in client.orgs.all_orgs()}
+
+    org_dirs: list[tuple[Path, Org]] = []
+    for directory in sorted(root.iterdir()):
+        if not directory.is_dir():
+            continue
+        name = known_names.get(directory.name, directory.name)
+        org = existing.get(name) or client.orgs.create(name)
+        org_dirs.append((directory, org))
+
+    return org_dirs
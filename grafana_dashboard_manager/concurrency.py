@@ -0,0 +1,151 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class TaskResult(Generic[T, R]):
+    """The outcome of running a function against a single work item"""
+
+    item: T
+    result: R | None = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        """True if the task completed without raising"""
+        return self.error is None
+
+
+def _run_task(func: Callable[[T], R], item: T) -> TaskResult[T, R]:
+    try:
+        return TaskResult(item, result=func(item))
+    except Exception as exc:
+        logger.debug(f"Task failed for {item}: {exc!r}")
+        return TaskResult(item, error=exc)
+
+
+async def _run_task_async(func: Callable[[T], Awaitable[R]], item: T) -> TaskResult[T, R]:
+    try:
+        return TaskResult(item, result=await func(item))
+    except Exception as exc:
+        logger.debug(f"Task failed for {item}: {exc!r}")
+        return TaskResult(item, error=exc)
+
+
+def map_concurrently(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    jobs: int = 1,
+    *,
+    processes: bool = False,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple = (),
+) -> Iterator[TaskResult[T, R]]:
+    """
+    Apply func to every item over a bounded pool of worker threads, yielding results in the order of the input
+
+    Exceptions raised by func are captured on the returned TaskResult instead of being raised, so that a single failure
+    does not abort the remaining work. At most 2 * jobs items are in flight at any time, which keeps memory bounded
+    when items is a lazy iterable.
+
+    Args:
+        func: the function to call for each item, it must be safe to call from multiple threads
+        items: the work items
+        jobs: the number of worker threads, 1 runs everything on the calling thread
+        processes: use a pool of worker processes instead, for work that is CPU bound and would otherwise hold the GIL.
+            func, the items and the results must all be picklable
+        initializer: called with initargs by each worker before it starts on the items, e.g. to give worker processes
+            state that would otherwise be sent with every item
+        initargs: the arguments of the initializer
+
+    Yields:
+        a TaskResult for each item, in the same order as items
+
+    """
+    if jobs <= 1 and not processes:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield _run_task(func, item)
+        return
+
+    executor: Executor
+    if processes:
+        # Forking a process that is running other threads can deadlock the child, so the workers are started afresh
+        executor = ProcessPoolExecutor(
+            max_workers=max(jobs, 1),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+            initargs=initargs,
+        )
+    else:
+        executor = ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix="gdm-worker", initializer=initializer, initargs=initargs
+        )
+
+    with executor:
+        pending: deque[Future[TaskResult[T, R]]] = deque()
+        for item in items:
+            pending.append(executor.submit(_run_task, func, item))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+async def amap_concurrently(
+    func: Callable[[T], Awaitable[R]], items: Iterable[T], jobs: int = 1
+) -> AsyncIterator[TaskResult[T, R]]:
+    """
+    The asyncio equivalent of map_concurrently, running func as concurrent tasks on the current event loop
+
+    Args:
+        func: the coroutine function to call for each item
+        items: the work items
+        jobs: the number of items to work on at once
+
+    Yields:
+        a TaskResult for each item, in the same order as items
+
+    """
+    jobs = max(jobs, 1)
+    # As with the worker threads, only jobs items are worked on at once while the next results are queued up
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def limited(item: T) -> R:
+        async with semaphore:
+            return await func(item)
+
+    pending: deque[asyncio.Task[TaskResult[T, R]]] = deque()
+    try:
+        for item in items:
+            pending.append(asyncio.ensure_future(_run_task_async(limited, item)))
+            if len(pending) >= 2 * jobs:
+                yield await pending.popleft()
+
+        while pending:
+            yield await pending.popleft()
+    finally:
+        # The consumer stopped early or was cancelled, so the remaining work is abandoned
+        for task in pending:
+            task.cancel()
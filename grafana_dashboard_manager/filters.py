@@ -0,0 +1,112 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import TYPE_CHECKING
+from urllib.parse import urlencode
+
+if TYPE_CHECKING:
+    from grafana_dashboard_manager.global_config import GlobalConfig
+
+logger = logging.getLogger(__name__)
+
+# Bracket expressions and wildcards, which can't be searched for as text
+GLOB_SPECIAL = re.compile(r"\[[^\]]*\]|[*?]")
+
+
+@dataclass(frozen=True)
+class DashboardFilter:
+    """
+    Selects which folders and dashboards are downloaded or uploaded
+
+    A dashboard is selected if it is in one of the folders, including their subfolders, has all of the tags, has one of
+    the uids and has a title matching one of the glob patterns. Each criterion that is empty selects everything.
+    """
+
+    folders: tuple[str, ...] = ()
+    tags: tuple[str, ...] = ()
+    uids: tuple[str, ...] = ()
+    titles: tuple[str, ...] = ()
+
+    @classmethod
+    def from_config(cls, config: "GlobalConfig") -> "DashboardFilter":
+        """The filter given by the --folder, --tag, --uid and --title options"""
+        return cls(
+            folders=tuple(config.folders),
+            tags=tuple(config.tags),
+            uids=tuple(config.uids),
+            titles=tuple(config.titles),
+        )
+
+    def __bool__(self) -> bool:
+        """Whether the filter selects anything less than everything"""
+        return bool(self.folders or self.filters_dashboards)
+
+    @property
+    def filters_dashboards(self) -> bool:
+        """Whether the filter depends on the content of a dashboard, and not only on its folder"""
+        return bool(self.tags or self.uids or self.titles)
+
+    def as_dict(self) -> dict[str, list[str]]:
+        """The criteria as JSON-compatible lists, e.g. to record the filter a run was made with"""
+        return {
+            "folders": list(self.folders),
+            "tags": list(self.tags),
+            "uids": list(self.uids),
+            "titles": list(self.titles),
+        }
+
+    def selects_folder(self, path: str) -> bool:
+        """Whether the dashboards in the folder with the given path are selected"""
+        return not self.folders or any(path == folder or path.startswith(f"{folder}/") for folder in self.folders)
+
+    def needs_folder(self, path: str) -> bool:
+        """Whether the folder with the given path is selected, or is the parent of a selected folder"""
+        return self.selects_folder(path) or any(folder.startswith(f"{path}/") for folder in self.folders)
+
+    def selects(self, folder: str, uid: str | None, title: str | None, tags: Iterable[str]) -> bool:
+        """Whether a dashboard in the folder with the given path is selected"""
+        if not self.selects_folder(folder):
+            return False
+        if self.uids and uid not in self.uids:
+            return False
+        if self.tags and not set(self.tags).issubset(tags):
+            return False
+        # The search API matches titles regardless of case, and so do the patterns
+        if self.titles and not any(fnmatchcase((title or "").lower(), pattern.lower()) for pattern in self.titles):
+            return False
+        return True
+
+    def search_params(self, folder_ids: Iterable[int] = ()) -> str:
+        """
+        Query parameters for the search API that have Grafana list only the selected dashboards, or as few more as
+        possible where the filter can't be expressed in a search
+
+        Args:
+            folder_ids: the ids of the selected folders, which are only used if the filter selects folders
+
+        Returns:
+            the query parameters, each preceded by "&"
+
+        """
+        params = [("dashboardUIDs", uid) for uid in self.uids]
+        params += [("tag", tag) for tag in self.tags]
+        if self.folders:
+            params += [("folderIds", str(folder_id)) for folder_id in folder_ids]
+
+        # A search query matches part of the title, so the longest text in the pattern narrows down the results
+        if len(self.titles) == 1:
+            text = max(GLOB_SPECIAL.split(self.titles[0]), key=len)
+            if text:
+                params.append(("query", text))
+
+        return f"&{urlencode(params)}" if params else ""
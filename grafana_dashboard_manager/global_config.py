@@ -10,11 +10,37 @@ import logging
 from pathlib import Path
 from typing import Callable, Literal
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, NonNegativeInt, PositiveFloat, PositiveInt, ValidationInfo, field_validator
+
+from grafana_dashboard_manager.bundle import is_bundle
 
 logger = logging.getLogger(__name__)
 
 
+def bundle_or_folder_exists(path: Path | str, *, writable: bool = False, create: bool = False) -> Path:
+    """
+    Checks if a given path is a folder, or a bundle file (only its parent folder must exist if it will be written). A
+    folder that will be created by the command only must not be something other than a folder
+    """
+    if isinstance(path, Path):
+        return path
+
+    _path = Path(path).absolute()
+    if not is_bundle(_path):
+        if create and not _path.exists():
+            return _path
+        if not _path.is_dir():
+            raise ValueError(f"Directory '{path}' does not exist")
+        return _path
+
+    if writable and not _path.parent.is_dir():
+        raise ValueError(f"Bundle directory '{_path.parent}' does not exist")
+    if not writable and not _path.is_file():
+        raise ValueError(f"Bundle '{path}' does not exist")
+
+    return _path
+
+
 def folder_exists(path: Path | str) -> Path:
     """Checks if a given path is a folder"""
     if isinstance(path, Path):
@@ -27,15 +53,6 @@ def folder_exists(path: Path | str) -> Path:
     return _path
 
 
-def files_not_more_than_one_folder_deep(path: Path) -> Path:
-    """Raises exception if there is more than one level of nesting in the given directory path"""
-    # Iterate through the files and subdirectories in the given directory
-    for item in path.iterdir():
-        if item.is_dir() and any(subdir.is_dir() for subdir in item.iterdir()):
-            raise ValueError("Nested folders using the nestedFolders feature toggle is not yet supported")
-    return path
-
-
 class GlobalConfig(BaseModel):
     """Holds configuration for all the commands"""
 
@@ -49,56 +66,140 @@ class GlobalConfig(BaseModel):
     password: str | None = None
     token: str | None = None
     org: int | None = None
+    all_orgs: bool = False
     skip_verify: bool = False
 
     non_interactive: bool = False
     skip_home: bool = False
+    jobs: PositiveInt = 1
+    max_retries: NonNegativeInt = 5
+
+    # HTTP transport
+    max_connections: PositiveInt | None = None
+    keepalive_expiry: PositiveFloat = 5.0
+    http2: bool = False
+    compression: bool = True
+    connect_timeout: PositiveFloat = 5.0
+    read_timeout: PositiveFloat = 30.0
+
+    # Reporting
+    metrics_file: Path | None = None
+    profile: Path | None = None
+    profile_memory: bool = False
+    profile_top: PositiveInt = 25
+
+    # Filters
+    folders: list[str] = []
+    tags: list[str] = []
+    uids: list[str] = []
+    titles: list[str] = []
+
+    # Resuming
+    resume: bool = False
+    journal: Path | None = None
+
+    # Snapshots, which are defined before the source so that its validators can tell if it is a snapshot store
+    snapshot: str | None = None
+    keep_days: PositiveInt | None = None
 
     # Upload
     source: Path | None = None
     overwrite: bool = False
+    skip_unchanged: bool = False
+    datasource_uids: dict[str, str] = {}
+    read_jobs: PositiveInt | None = None
+    read_processes: bool = False
 
-    # Download
+    # Download, with whether the command creates the destination defined first so that its validator can tell
+    create_destination: bool = False
     destination: Path | None = None
+    incremental: bool = False
+    file_format: Literal["pretty", "raw", "envelope"] = "pretty"
+
+    # Mirror
+    target_scheme: Literal["http", "https"] = "https"
+    target_host: str | None = None
+    target_port: int = 443
+    target_username: str | None = None
+    target_password: str | None = None
+    target_token: str | None = None
+    target_org: int | None = None
+    target_skip_verify: bool = False
 
     # Internal
     home_dashboard: bool = False
+    verbose: int = 0
 
-    @field_validator("host")
+    @field_validator("metrics_file", "profile", "journal")
     @classmethod
-    def strip_trailing_slash(cls, host: str) -> str:
-        """Pydantic validator to remove trailing slashes entered with the --host option"""
-        if host[-1] == "/":
-            host = host[:-1]
-        return host
+    def report_directory_exists(cls, path: Path | None) -> Path | None:
+        """Pydantic validator to check the metrics, profile and journal files can be written"""
+        if path is not None and not path.parent.is_dir():
+            raise ValueError(f"Directory '{path.parent}' does not exist")
+        return path
 
-    @field_validator("source", "destination")
+    @field_validator("datasource_uids", mode="before")
     @classmethod
-    def folder_exists_if_not_none(cls, path: Path | None) -> Path | None:
-        """Pydantic validator to check given directories exist"""
-        if path is None:
-            return path
+    def parse_datasource_uids(cls, value: list[str] | dict[str, str] | None) -> dict[str, str]:
+        """Pydantic validator to parse OLD=NEW datasource uid mappings"""
+        if value is None:
+            return {}
+        if isinstance(value, dict):
+            return value
+
+        uids = {}
+        for mapping in value:
+            old_uid, separator, new_uid = mapping.partition("=")
+            if not separator or not old_uid or not new_uid:
+                raise ValueError(f"Datasource uid mapping '{mapping}' should be in the form OLD=NEW")
+            uids[old_uid] = new_uid
+        return uids
+
+    @field_validator("folders", "tags", "uids", "titles", mode="before")
+    @classmethod
+    def filters_default_to_empty(cls, value: list[str] | None) -> list[str]:
+        """Pydantic validator for filter options that were not given"""
+        return value or []
 
-        path = folder_exists(path)
+    @field_validator("folders")
+    @classmethod
+    def strip_folder_slashes(cls, folders: list[str]) -> list[str]:
+        """Pydantic validator to allow folder paths to be given with leading or trailing slashes"""
+        return [folder.strip("/") for folder in folders]
 
-        return path
+    @field_validator("snapshot")
+    @classmethod
+    def snapshot_name_is_filename(cls, name: str | None) -> str | None:
+        """Pydantic validator to check a snapshot name can be used as its file name"""
+        if name and (name.startswith(".") or "/" in name or "\\" in name):
+            raise ValueError(f"Snapshot name '{name}' can't start with '.' or contain path separators")
+        return name
 
-    @field_validator("source")
+    @field_validator("host", "target_host")
     @classmethod
-    def validate_source_folder(cls, path: Path | None) -> Path | None:
-        """Pydantic validator to check depth of source folder. Currently does not support multiple level folders"""
+    def strip_trailing_slash(cls, host: str | None) -> str | None:
+        """Pydantic validator to remove trailing slashes entered with the --host option"""
+        if host and host[-1] == "/":
+            host = host[:-1]
+        return host
+
+    @field_validator("source", "destination", mode="before")
+    @classmethod
+    def folder_exists_if_not_none(cls, path: Path | str | None, info: ValidationInfo) -> Path | None:
+        """Pydantic validator to check given directories, or bundle files, exist"""
         if path is None:
             return path
 
-        path = files_not_more_than_one_folder_deep(path)
+        writable = info.field_name == "destination"
+        path = bundle_or_folder_exists(path, writable=writable, create=writable and info.data.get("create_destination"))
 
         return path
 
     @field_validator("source")
     @classmethod
-    def validate_source_contains_home_dashboard(cls, path: Path | None) -> Path | None:
+    def validate_source_contains_home_dashboard(cls, path: Path | None, info: ValidationInfo) -> Path | None:
         """Ensures the home dashboard exists"""
-        if path is None:
+        if path is None or is_bundle(path) or info.data.get("all_orgs") or info.data.get("snapshot") is not None:
             return path
 
         # Iterate over the contents of the directory
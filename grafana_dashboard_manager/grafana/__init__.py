@@ -6,4 +6,5 @@ license that can be found in the LICENSE file or at
 https://opensource.org/licenses/MIT.
 """
 
+from .async_grafana_api import AsyncGrafanaApi
 from .grafana_api import GrafanaApi, GrafanaAuthType
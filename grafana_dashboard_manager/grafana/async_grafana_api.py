@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import copy
+import logging
+
+from grafana_dashboard_manager.api.async_rest_client import AsyncRestClient
+from grafana_dashboard_manager.api.metrics import Metrics
+from grafana_dashboard_manager.api.retry import RetryPolicy
+from grafana_dashboard_manager.api.transport import TransportConfig
+from grafana_dashboard_manager.grafana.grafana_api import ORG_HEADER, GrafanaApi
+from grafana_dashboard_manager.handlers.async_api_dashboards import AsyncApiDashboards
+from grafana_dashboard_manager.handlers.async_api_folders import AsyncApiFolders
+
+logger = logging.getLogger()
+
+
+class AsyncGrafanaApi:
+    """The asyncio equivalent of GrafanaApi, for embedding in services that run an event loop"""
+
+    CLIENT_HEADERS = GrafanaApi.CLIENT_HEADERS
+
+    def __init__(
+        self,
+        scheme: str,
+        host: str,
+        port: int,
+        username: str | None = None,
+        password: str | None = None,
+        token: str | None = None,
+        org: int | None = None,
+        skip_verify: bool = False,
+        max_retries: int = 5,
+        max_concurrency: int = 1,
+        transport: TransportConfig | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
+        """
+        Wrapper object to interact with Grafana entities like Folders and Dashboards via the HTTP API from coroutines
+
+        The client should be closed with aclose, or used as an async context manager, when it is no longer needed.
+        """
+        self.host = f"{scheme}://{host}:{port}"
+
+        self._api = AsyncRestClient(
+            self.CLIENT_HEADERS,
+            GrafanaApi._init_auth(token, username, password),
+            f"{self.host}/api/",
+            skip_verify,
+            retry_policy=RetryPolicy(max_retries=max_retries),
+            max_concurrency=max_concurrency,
+            transport=transport,
+            metrics=metrics,
+        )
+        self.metrics = self._api.metrics
+
+        # Set the X-Grafana-Org-Id header if this request is for a given organization
+        self.org = org
+        if org:
+            self._api = self._api.with_headers({ORG_HEADER: str(org)})
+
+        self._init_handlers()
+
+    async def __aenter__(self) -> "AsyncGrafanaApi":
+        """Use the client as an async context manager, which closes it on exit"""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Closes the client"""
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Closes the connections of this client, and of any clients for other organizations made from it"""
+        await self._api.aclose()
+
+    def for_org(self, org: int) -> "AsyncGrafanaApi":
+        """
+        A client for the given organization which shares this client's connections, so that several organizations can
+        be worked on concurrently
+        """
+        client = copy.copy(self)
+        client.org = org
+        client._api = self._api.with_headers({ORG_HEADER: str(org)})
+        client._init_handlers()
+        return client
+
+    def _init_handlers(self):
+        self.folders = AsyncApiFolders(self._api)
+        self.dashboards = AsyncApiDashboards(self._api)
@@ -0,0 +1,68 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+from grafana_dashboard_manager.api.metrics import Metrics
+from grafana_dashboard_manager.api.transport import TransportConfig
+from grafana_dashboard_manager.global_config import GlobalConfig
+from grafana_dashboard_manager.grafana.grafana_api import GrafanaApi
+
+
+def client_from_config(config: GlobalConfig, *, target: bool = False, metrics: Metrics | None = None) -> GrafanaApi:
+    """
+    Creates the API client for the Grafana instance given in the config
+
+    Args:
+        config: the validated command line options
+        target: create the client for the target instance of the mirror command, rather than the main instance
+        metrics: record the client's requests here, to combine them with another client's
+
+    Returns:
+        the API client
+
+    """
+    if target:
+        if config.target_host is None:
+            raise ValueError("No target host set")
+        connection = {
+            "scheme": config.target_scheme,
+            "host": config.target_host,
+            "port": config.target_port,
+            "username": config.target_username,
+            "password": config.target_password,
+            "token": config.target_token,
+            "org": config.target_org,
+            "skip_verify": config.target_skip_verify,
+        }
+    else:
+        connection = {
+            "scheme": config.scheme,
+            "host": config.host,
+            "port": config.port,
+            "username": config.username,
+            "password": config.password,
+            "token": config.token,
+            "org": config.org,
+            "skip_verify": config.skip_verify,
+        }
+
+    return GrafanaApi(
+        **connection,
+        verbose=config.verbose > 0,
+        max_retries=config.max_retries,
+        max_concurrency=config.jobs,
+        transport=TransportConfig(
+            max_connections=config.max_connections,
+            keepalive_expiry=config.keepalive_expiry,
+            http2=config.http2,
+            compression=config.compression,
+            connect_timeout=config.connect_timeout,
+            read_timeout=config.read_timeout,
+            write_timeout=config.read_timeout,
+        ),
+        metrics=metrics,
+    )
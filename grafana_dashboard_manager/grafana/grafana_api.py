@@ -6,15 +6,22 @@ license that can be found in the LICENSE file or at
 https://opensource.org/licenses/MIT.
 """
 
+import copy
 import logging
 
 from grafana_dashboard_manager.api.auth import GrafanaAuth, GrafanaAuthType
+from grafana_dashboard_manager.api.metrics import Metrics
 from grafana_dashboard_manager.api.rest_client import RestClient
+from grafana_dashboard_manager.api.retry import RetryPolicy
+from grafana_dashboard_manager.api.transport import TransportConfig
 from grafana_dashboard_manager.handlers.api_dashboards import ApiDashboards
 from grafana_dashboard_manager.handlers.api_folders import ApiFolders
+from grafana_dashboard_manager.handlers.api_orgs import ApiOrgs
 
 logger = logging.getLogger()
 
+ORG_HEADER = "X-Grafana-Org-Id"
+
 
 class GrafanaApi:
     """HTTP REST calls with status code checking and common auth/headers"""
@@ -35,26 +42,52 @@ class GrafanaApi:
         org: int | None = None,
         skip_verify: bool = False,
         verbose: bool = False,
+        max_retries: int = 5,
+        max_concurrency: int = 1,
+        transport: TransportConfig | None = None,
+        metrics: Metrics | None = None,
     ) -> None:
         """Wrapper object to interact with Grafana entities like Folders and Dashboards via the HTTP API"""
         self.host = f"{scheme}://{host}:{port}"
 
-        # Set the X-Grafana-Org-Id header if this request is for a given organization
-        if org:
-            self.CLIENT_HEADERS.update({"X-Grafana-Org-Id": str(org)})
-
         self._api = RestClient(
             self.CLIENT_HEADERS,
             self._init_auth(token, username, password),
             f"{self.host}/api/",
             skip_verify,
             verbose,
+            retry_policy=RetryPolicy(max_retries=max_retries),
+            max_concurrency=max_concurrency,
+            transport=transport,
+            metrics=metrics,
         )
+        self.metrics = self._api.metrics
+
+        # Set the X-Grafana-Org-Id header if this request is for a given organization
+        self.org = org
+        if org:
+            self._api = self._api.with_headers({ORG_HEADER: str(org)})
+
+        self._init_handlers()
+
+    def for_org(self, org: int) -> "GrafanaApi":
+        """
+        A client for the given organization which shares this client's connections, so that several organizations can
+        be worked on concurrently
+        """
+        client = copy.copy(self)
+        client.org = org
+        client._api = self._api.with_headers({ORG_HEADER: str(org)})
+        client._init_handlers()
+        return client
 
+    def _init_handlers(self):
         self.folders = ApiFolders(self._api)
         self.dashboards = ApiDashboards(self._api)
+        self.orgs = ApiOrgs(self._api)
 
-    def _init_auth(self, token, username, password):
+    @staticmethod
+    def _init_auth(token, username, password):
         if token:
             logger.info("Using Bearer token header auth")
             auth = GrafanaAuth(GrafanaAuthType.BEARER, token=token)
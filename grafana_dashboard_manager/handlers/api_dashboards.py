@@ -6,13 +6,17 @@ license that can be found in the LICENSE file or at
 https://opensource.org/licenses/MIT.
 """
 
-import json
+import hashlib
 import logging
+import os
+from collections.abc import Iterator
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import urlencode
 
 import httpx
 
+from grafana_dashboard_manager import json_codec
 from grafana_dashboard_manager.api.rest_client import RestClient
 from grafana_dashboard_manager.exceptions import GrafanaApiException
 from grafana_dashboard_manager.handlers.base_handler import BaseHandler
@@ -20,6 +24,9 @@ from grafana_dashboard_manager.models import DashboardResponse
 
 logger = logging.getLogger(__name__)
 
+# The number of versions to request per page when listing the history of a dashboard
+VERSIONS_PAGE_SIZE = 100
+
 
 class ApiDashboards(BaseHandler):
     """Handler class to interact with Dashboards via API"""
@@ -40,59 +47,248 @@ class ApiDashboards(BaseHandler):
         response = self.api.get(f"dashboards/uid/{uid}")
         return self._response_to_model(response)
 
-    def save(self, uid: str, file: Path) -> None:
-        """Download a dashboard to a local path"""
+    def dashboard_json(self, uid: str) -> dict:
+        """Get the raw json definition of a dashboard with a dashboard UID string"""
+        with self.api.metrics.phase("fetch"):
+            response = self.api.get(f"dashboards/uid/{uid}")
+            if response.status_code != 200:
+                raise GrafanaApiException(f"{response.status_code}: Failed to get dashboard {uid} - {response.json()}")
+            return json_codec.loads(response.content)["dashboard"]
+
+    def latest_version(self, uid: str) -> int | None:
+        """Get the latest version number of a dashboard, which is much cheaper than fetching the whole dashboard"""
+        with self.api.metrics.phase("list"):
+            response = self.api.get(f"dashboards/uid/{uid}/versions?limit=1")
+        if response.status_code != 200:
+            logger.debug(f"Could not get versions of dashboard {uid}: {response.status_code}")
+            return None
+
+        # Newer Grafana versions wrap the list of versions in an object with a continueToken
+        body = json_codec.loads(response.content)
+        versions = body.get("versions", []) if isinstance(body, dict) else body
+        return versions[0]["version"] if versions else None
+
+    def versions(self, uid: str, *, after: int = 0, page_size: int = VERSIONS_PAGE_SIZE) -> list[int]:
+        """
+        List the versions of a dashboard that are newer than a given version
+
+        Grafana lists the newest versions first, so only the pages down to the given version are requested.
+
+        Args:
+            uid: the dashboard uid
+            after: the newest version that is already known, or 0 for every version
+            page_size: number of versions to request per page
+
+        Returns:
+            the version numbers, oldest first
+
+        """
+        versions: set[int] = set()
+        params = urlencode({"limit": page_size})
+        start = 0
+        while True:
+            with self.api.metrics.phase("list"):
+                response = self.api.get(f"dashboards/uid/{uid}/versions?{params}")
+            if response.status_code != 200:
+                raise GrafanaApiException(
+                    f"{response.status_code}: Failed to list versions of {uid} - {response.json()}"
+                )
+
+            # Newer Grafana versions wrap the list of versions in an object with a continueToken for the next page,
+            # and older versions are paged by an offset
+            body = json_codec.loads(response.content)
+            page = body.get("versions", []) if isinstance(body, dict) else body
+            continue_token = body.get("continueToken") if isinstance(body, dict) else None
+
+            page_versions = [item["version"] for item in page]
+            unseen = {version for version in page_versions if version > after} - versions
+            versions |= unseen
+            if len(page) < page_size or min(page_versions) <= after:
+                return sorted(versions)
+
+            # A server that ignores the paging parameters sends the same page again, which would otherwise never end
+            if not unseen:
+                logger.warning(
+                    f"Stopped listing the versions of {uid}, as a page only repeated versions already listed"
+                )
+                return sorted(versions)
+
+            if continue_token:
+                params = urlencode({"limit": page_size, "continueToken": continue_token})
+            elif "continueToken" in params:
+                return sorted(versions)
+            else:
+                start += page_size
+                params = urlencode({"limit": page_size, "start": start})
+
+    def version_bytes(self, uid: str, version: int) -> bytes:
+        """Get a version of a dashboard as it was sent by Grafana, including who created it and when"""
+        with self.api.metrics.phase("fetch"):
+            response = self.api.get(f"dashboards/uid/{uid}/versions/{version}")
+            if response.status_code != 200:
+                raise GrafanaApiException(
+                    f"{response.status_code}: Failed to get version {version} of dashboard {uid} - {response.json()}"
+                )
+            return response.content
+
+    def history(self, uid: str, *, after: int = 0) -> Iterator[tuple[int, bytes]]:
+        """
+        Get the versions of a dashboard that are newer than a given version, oldest first
+
+        The versions are listed up front and each is fetched as it is iterated, so the whole history isn't held in
+        memory at once.
+
+        Args:
+            uid: the dashboard uid
+            after: the newest version that is already known, or 0 for every version
+
+        Yields:
+            the version number, and the version as it was sent by Grafana
+
+        """
+        for version in self.versions(uid, after=after):
+            yield version, self.version_bytes(uid, version)
+
+    def dashboard_bytes(self, uid: str, *, envelope: bool = False) -> tuple[bytes | memoryview, int]:
+        """
+        Get the json definition of a dashboard as it was sent by Grafana, without decoding and re-encoding it
+
+        Args:
+            uid: the dashboard uid
+            envelope: keep the whole response, including the meta information such as the dashboard's folder
+
+        Returns:
+            the encoded dashboard and its version
+
+        """
+        with self.api.metrics.phase("fetch"):
+            response = self.api.get(f"dashboards/uid/{uid}")
+            if response.status_code != 200:
+                raise GrafanaApiException(f"{response.status_code}: Failed to get dashboard {uid} - {response.json()}")
+
+            # Grafana sends the small meta object before the dashboard, so only the meta needs to be decoded. Any other
+            # shape of response can't be split safely, as the dashboard wouldn't be known to be the last member
+            split = json_codec.split_last_member(response.content, "dashboard")
+            if split is not None and set(split[0]) == {"meta"} and bytes(split[1][:1]) == b"{":
+                members, dashboard = split
+                return response.content if envelope else dashboard, members["meta"].get("version", 0)
+
+            logger.debug(f"Decoding the whole response for dashboard {uid}, as the dashboard isn't its last member")
+            body = json_codec.loads(response.content)
+            content = response.content if envelope else json_codec.dumps(body["dashboard"], compatible=False)
+            return content, body["dashboard"].get("version", 0)
+
+    def save(
+        self, uid: str, file: Path, *, unchanged_sha256: str | None = None, file_format: str = "pretty"
+    ) -> tuple[int, str]:
+        """
+        Download a dashboard to a local path
+
+        Args:
+            uid: the dashboard uid
+            file: path of the json file to write
+            unchanged_sha256: if the downloaded content has this hash and the file exists, the file is not rewritten
+            file_format: "pretty" to reformat the dashboard consistently for version control, "raw" to write it as it
+                was sent by Grafana, or "envelope" to write the whole response as it was sent including its meta
+
+        Returns:
+            the version and sha256 hash of the saved dashboard
+
+        """
         file.parent.mkdir(parents=True, exist_ok=True)
+        content, version = self.content(uid, file_format=file_format)
+        return version, self._write_bytes(content, file, unchanged_sha256=unchanged_sha256)
 
-        dashboard = self.api.get(f"dashboards/uid/{uid}").json()["dashboard"]
-        self._write_json(dashboard, file)
+    def content(self, uid: str, *, file_format: str = "pretty") -> tuple[bytes | memoryview, int]:
+        """Get a dashboard encoded in one of the formats that it can be saved in, see save, and its version"""
+        if file_format == "pretty":
+            dashboard = self.dashboard_json(uid)
+            return self.file_content(dashboard), dashboard.get("version", 0)
+        return self.dashboard_bytes(uid, envelope=file_format == "envelope")
 
-    def save_home(self, directory: Path) -> None:
-        """Download the home dashboard"""
-        dest_file = directory / "home.json"
-        response = self.api.get("dashboards/home").json()
+    def home_dashboard_json(self) -> dict:
+        """Get the raw json definition of the home dashboard"""
+        with self.api.metrics.phase("fetch"):
+            response = json_codec.loads(self.api.get("dashboards/home").content)
 
         # If the dashboard has been set to a custom dashboard, the response will be a direct to that dashboard
         if "redirectUri" in response:
             home_uid = response["redirectUri"].split("/")[2]
-            logger.info(f"Custom home dashboard has been set: {home_uid=} and saved to {dest_file}")
-            dashboard = self.api.get(f"dashboards/uid/{home_uid}").json()["dashboard"]
-        else:
-            dashboard = response["dashboard"]
+            logger.info(f"Custom home dashboard has been set: {home_uid=}")
+            return self.dashboard_json(home_uid)
 
-        self._write_json(dashboard, dest_file)
+        return response["dashboard"]
+
+    def save_home(self, directory: Path) -> None:
+        """Download the home dashboard"""
+        dest_file = directory / "home.json"
+        dashboard = self.home_dashboard_json()
+
+        existing_sha256 = hashlib.sha256(dest_file.read_bytes()).hexdigest() if dest_file.is_file() else None
+        self._write_json(dashboard, dest_file, unchanged_sha256=existing_sha256)
 
     def create(self, dashboard: dict, folder_uid: str | None = None, overwrite: bool = True) -> None:
         """Create a new dashboard"""
         dashboard.pop("id", None)
+        self.create_encoded(
+            json_codec.dumps(dashboard, compatible=False),
+            dashboard["title"],
+            folder_uid,
+            overwrite,
+            uid=dashboard.get("uid"),
+        )
 
+    def create_encoded(
+        self,
+        content: bytes,
+        title: str,
+        folder_uid: str | None = None,
+        overwrite: bool = True,
+        *,
+        uid: str | None = None,
+    ) -> None:
+        """
+        Create a new dashboard from its json encoding, which is sent without being decoded and re-encoded
+
+        Args:
+            content: the encoded dashboard, without its id
+            title: the dashboard title, for messages
+            folder_uid: the folder to create the dashboard in, or None for the General folder
+            overwrite: replace any dashboard with the same uid
+            uid: the dashboard uid, without which the request isn't retried as it could create a duplicate dashboard
+
+        """
         if not folder_uid:
-            logger.warning(f"Dashboard {dashboard['title']} has no folder and will be added at the root level")
-        payload = {
-            "dashboard": dashboard,
+            logger.warning(f"Dashboard {title} has no folder and will be added at the root level")
+        options = {
             "folderUid": folder_uid,
             "message": f"Uploaded at {datetime.now()}",
             "overwrite": overwrite,
         }
+        # The dashboard is spliced in as the first member of the request body
+        payload = b'{"dashboard":' + content + b"," + json_codec.dumps(options, compatible=False)[1:]
 
-        response = self.api.post("dashboards/db", body=payload)
+        with self.api.metrics.phase("upload"):
+            response = self.api.post("dashboards/db", body=payload, idempotent=bool(uid))
 
         if response.status_code != 200:
-            logger.error(f"Failed to upload {dashboard['title']} - {response.json()}")
+            raise GrafanaApiException(f"{response.status_code}: Failed to upload {title} - {response.json()}")
 
     def create_home(self, dashboard: dict) -> str:
         """Create the home dashboard (store in the default General folder by convention)"""
         dashboard.pop("id", None)
 
-        response = self.api.post(
-            "dashboards/db",
-            body={
-                "dashboard": dashboard,
-                "folderId": 0,
-                "message": f"Uploaded at {datetime.now()}",
-                "overwrite": True,
-            },
-        )
+        with self.api.metrics.phase("upload"):
+            response = self.api.post(
+                "dashboards/db",
+                body={
+                    "dashboard": dashboard,
+                    "folderId": 0,
+                    "message": f"Uploaded at {datetime.now()}",
+                    "overwrite": True,
+                },
+                idempotent=bool(dashboard.get("uid")),
+            )
 
         if response.status_code != 200:
             raise GrafanaApiException(
@@ -103,15 +299,59 @@ class ApiDashboards(BaseHandler):
 
     def set_home(self, uid: str) -> None:
         """Set a given dashboard as the default home dashboard for the current organization"""
-        response = self.api.patch("/org/preferences", {"homeDashboardUID": uid})
+        with self.api.metrics.phase("upload"):
+            response = self.api.patch("/org/preferences", {"homeDashboardUID": uid})
         if response.status_code != 200:
             raise GrafanaApiException(f"Failed to set home dashboard {response.json()}")
 
-    def _write_json(self, data: dict, path: Path):
-        with path.open("w") as f:
-            f.write(json.dumps(data, indent=4))
+    @staticmethod
+    def content_hash(dashboard: dict) -> str:
+        """
+        A hash of the dashboard definition that ignores the fields Grafana changes on every save, so that a local file
+        and the dashboard stored in Grafana have the same hash if their content is the same
+        """
+        content = {key: value for key, value in dashboard.items() if key not in {"id", "version"}}
+        canonical = json_codec.dumps(content, sort_keys=True, compatible=False)
+        return hashlib.sha256(canonical).hexdigest()
+
+    @staticmethod
+    def file_content(dashboard: dict) -> bytes:
+        """Encodes a dashboard in the format that it is saved to file"""
+        return json_codec.dumps(dashboard, indent=4)
+
+    @staticmethod
+    def load_file(content: bytes) -> dict:
+        """Decodes a dashboard file, which may hold the whole response from Grafana including its meta"""
+        data = json_codec.loads(content)
+        if isinstance(data.get("dashboard"), dict) and "meta" in data:
+            return data["dashboard"]
+        return data
+
+    def _write_json(self, data: dict, path: Path, *, unchanged_sha256: str | None = None) -> str:
+        return self._write_bytes(self.file_content(data), path, unchanged_sha256=unchanged_sha256)
+
+    def _write_bytes(self, content: bytes | memoryview, path: Path, *, unchanged_sha256: str | None = None) -> str:
+        sha256 = hashlib.sha256(content).hexdigest()
+
+        # Leave identical files untouched so that their modification time is preserved
+        with self.api.metrics.phase("write"):
+            if sha256 != unchanged_sha256 or not path.is_file():
+                write_atomic(path, content)
+
+        return sha256
 
     def _response_to_model(self, response: httpx.Response):
-        body = response.json()
+        body = json_codec.loads(response.content)
         folder = self.model.model_validate(body)
         return folder
+
+
+def write_atomic(path: Path, content: bytes | memoryview) -> None:
+    """
+    Writes a file by renaming a temporary file into place, so the file is never left partly written if the process is
+    killed. The temporary file is hidden, so it is ignored when uploading
+    """
+    partial_path = path.with_name(f".{path.name}.partial")
+    with partial_path.open("wb") as file:
+        file.write(content)
+    os.replace(partial_path, path)
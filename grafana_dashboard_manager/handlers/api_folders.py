@@ -7,15 +7,29 @@ https://opensource.org/licenses/MIT.
 """
 
 import logging
-from typing import Type
+from collections.abc import Iterable, Iterator
+from typing import Type, TypeVar
+
+from pydantic import TypeAdapter
 
 from grafana_dashboard_manager.api.rest_client import RestClient
 from grafana_dashboard_manager.exceptions import FolderExistsException, FolderNotFoundException, GrafanaApiException
 from grafana_dashboard_manager.handlers.base_handler import BaseHandler
-from grafana_dashboard_manager.models import DashboardSearchResult, Folder
+from grafana_dashboard_manager.models import DashboardSearchResult, DashboardSummary, Folder
 
 logger = logging.getLogger(__name__)
 
+# The largest page size that the search API will return
+SEARCH_PAGE_SIZE = 5000
+
+T = TypeVar("T")
+
+# Listings are validated straight from the response bytes in a single call, rather than parsed then validated per item
+FOLDER_LIST = TypeAdapter(list[Folder])
+SEARCH_RESULT_LIST = TypeAdapter(list[DashboardSearchResult])
+DASHBOARD_SUMMARY_LIST = TypeAdapter(list[DashboardSummary])
+JSON_OBJECT_LIST = TypeAdapter(list[dict])
+
 
 class ApiFolders(BaseHandler[Folder]):
     """Handler class to interact with Folders via API"""
@@ -28,15 +42,73 @@ class ApiFolders(BaseHandler[Folder]):
 
     def all_folders(self) -> list[Folder]:
         """Get a list of all folders"""
-        response = self.api.get("folders")
-        body = response.json()
-        return [Folder.model_validate(folder) for folder in body]
+        with self.api.metrics.phase("list"):
+            response = self.api.get("folders")
+        return FOLDER_LIST.validate_json(response.content)
+
+    def folder_tree(self, page_size: int = SEARCH_PAGE_SIZE) -> dict[str, Folder]:
+        """
+        Get every folder at any depth of nesting with a single paginated search, keyed by the folder's path
+
+        The path is made up of the titles of the folder and its parents separated by "/", as used for the folder's
+        directory when downloading. Parents always come before their children.
+
+        Args:
+            page_size: number of folders to request per page of search results
+
+        Returns:
+            the folders keyed by path
+
+        """
+        return folder_tree_from_search(self._search_pages("search?type=dash-folder", page_size))
 
     def dashboards_in_folder(self, folder_id: int) -> list[DashboardSearchResult]:
         """Get a list of all dashboards within a given folder"""
-        response = self.api.get(f"search?folderIds={folder_id}")
-        body = response.json()
-        return [DashboardSearchResult.model_validate(dashboard) for dashboard in body]
+        return list(self._search_pages(f"search?type=dash-db&folderIds={folder_id}", adapter=SEARCH_RESULT_LIST))
+
+    def all_dashboards(
+        self, page_size: int = SEARCH_PAGE_SIZE, *, search_params: str = ""
+    ) -> Iterator[DashboardSummary]:
+        """
+        Get every dashboard in the instance using as few search requests as possible
+
+        Dashboards in the default General folder are skipped as they are not part of any folder.
+
+        Args:
+            page_size: number of dashboards to request per page of search results
+            search_params: additional query parameters to filter the search by, each preceded by "&"
+
+        Yields:
+            the uid, title, folder and tags of each dashboard
+
+        """
+        query = f"search?type=dash-db{search_params}"
+        for dashboard in self._search_pages(query, page_size, adapter=DASHBOARD_SUMMARY_LIST):
+            if not dashboard.folderUid:
+                logger.debug(f"Skipping dashboard in the General folder: {dashboard.title}")
+                continue
+            yield dashboard
+
+    def _search_pages(
+        self, query: str, page_size: int = SEARCH_PAGE_SIZE, *, adapter: TypeAdapter[list[T]] = JSON_OBJECT_LIST
+    ) -> Iterator[T]:
+        """
+        Follows the pages of a search query, as the search API otherwise truncates the results, validating each page of
+        results with the adapter
+        """
+        page = 1
+        while True:
+            with self.api.metrics.phase("list"):
+                response = self.api.get(f"{query}&limit={page_size}&page={page}")
+            if response.status_code != 200:
+                raise GrafanaApiException(f"Search failed for '{query}' page {page}: {response.json()}")
+
+            results = adapter.validate_json(response.content)
+            yield from results
+
+            if len(results) < page_size:
+                return
+            page += 1
 
     def general_folder(self) -> Folder:
         """Get details for the default General folder"""
@@ -60,13 +132,18 @@ class ApiFolders(BaseHandler[Folder]):
         except IndexError as exc:
             raise FolderNotFoundException(f"No results for folder with {name=}") from exc
 
-    def create(self, title: str, uid: str | None = None, *, overwrite: bool = True) -> Folder:
-        """Create a new dashboard"""
+    def create(
+        self, title: str, uid: str | None = None, *, parent_uid: str | None = None, overwrite: bool = True
+    ) -> Folder:
+        """Create a new folder, nested inside the parent folder if given"""
         body = {
             "uid": uid,
             "title": title,
         }
-        response = self.api.post("folders", body)
+        if parent_uid:
+            body["parentUid"] = parent_uid
+        with self.api.metrics.phase("upload"):
+            response = self.api.post("folders", body, idempotent=bool(uid))
 
         if response.status_code not in {200, 409, 412}:
             raise GrafanaApiException(f"Could not update folder '{title}': {response.json()}")
@@ -81,10 +158,34 @@ class ApiFolders(BaseHandler[Folder]):
             if overwrite is False:
                 raise FolderExistsException(f"Folder already exists: {title=} {uid=}. Use overwrite option")
 
-            response = self.api.put(f"folders/{uid}", {**body, "overwrite": True})
+            with self.api.metrics.phase("upload"):
+                response = self.api.put(f"folders/{uid}", {**body, "overwrite": True})
             if response.status_code == 200:
                 response_uid = response.json().get("uid")
                 logger.info(f"Updated folder title to '{title}' (uid={response_uid})")
                 return self.response_to_model(response)
             else:
                 raise GrafanaApiException(f"Could not update folder '{title}': {response.json()}")
+
+
+def folder_tree_from_search(results: Iterable[dict]) -> dict[str, Folder]:
+    """Keys the folders in the results of a folder search by their path, with parents before their children"""
+    folders = {
+        folder["uid"]: Folder(
+            id=folder["id"], uid=folder["uid"], title=folder["title"], parentUid=folder.get("folderUid") or None
+        )
+        for folder in results
+    }
+
+    def path(folder: Folder) -> str:
+        parent = folders.get(folder.parentUid) if folder.parentUid else None
+        name = folder_dirname(folder.title)
+        return f"{path(parent)}/{name}" if parent else name
+
+    paths = {path(folder): folder for folder in folders.values()}
+    return dict(sorted(paths.items(), key=lambda item: item[0].count("/")))
+
+
+def folder_dirname(title: str) -> str:
+    """Converts a folder title into a directory name, which can't contain path separators"""
+    return title.replace("/", "-").replace("\\", "-")
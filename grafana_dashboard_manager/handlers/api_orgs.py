@@ -0,0 +1,64 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+
+from pydantic import TypeAdapter
+
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.api.rest_client import RestClient
+from grafana_dashboard_manager.exceptions import GrafanaApiException
+from grafana_dashboard_manager.handlers.base_handler import BaseHandler
+from grafana_dashboard_manager.models import Org
+
+logger = logging.getLogger(__name__)
+
+ORGS_PAGE_SIZE = 1000
+
+ORG_LIST = TypeAdapter(list[Org])
+
+
+class ApiOrgs(BaseHandler[Org]):
+    """Handler class to interact with Organizations via API, which requires a Grafana server admin"""
+
+    model = Org
+
+    def __init__(self, api: RestClient):
+        """Provide a RestClient to use for API calls"""
+        self.api = api
+
+    def all_orgs(self) -> list[Org]:
+        """Get a list of all organizations"""
+        orgs: list[Org] = []
+        page = 1
+        while True:
+            response = self.api.get(f"orgs?perpage={ORGS_PAGE_SIZE}&page={page}")
+            if response.status_code != 200:
+                raise GrafanaApiException(
+                    f"{response.status_code}: Could not list organizations, a server admin login is required - "
+                    f"{response.json()}"
+                )
+
+            results = ORG_LIST.validate_json(response.content)
+            orgs.extend(results)
+
+            if len(results) < ORGS_PAGE_SIZE:
+                return orgs
+            page += 1
+
+    def create(self, name: str) -> Org:
+        """Create a new organization"""
+        response = self.api.post("orgs", {"name": name})
+        if response.status_code != 200:
+            raise GrafanaApiException(
+                f"{response.status_code}: Could not create organization '{name}' - {response.json()}"
+            )
+
+        org_id = json_codec.loads(response.content)["orgId"]
+        logger.info(f"Created organization '{name}' with id={org_id}")
+        return Org(id=org_id, name=name)
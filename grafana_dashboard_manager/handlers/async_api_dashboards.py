@@ -0,0 +1,109 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+from datetime import datetime
+
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.api.async_rest_client import AsyncRestClient
+from grafana_dashboard_manager.exceptions import GrafanaApiException
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncApiDashboards:
+    """Handler class to interact with Dashboards via API from coroutines"""
+
+    def __init__(self, api: AsyncRestClient):
+        """Provide an AsyncRestClient to use for API calls"""
+        self.api = api
+
+    async def dashboard_json(self, uid: str) -> dict:
+        """Get the raw json definition of a dashboard with a dashboard UID string"""
+        with self.api.metrics.phase("fetch"):
+            response = await self.api.get(f"dashboards/uid/{uid}")
+            if response.status_code != 200:
+                raise GrafanaApiException(f"{response.status_code}: Failed to get dashboard {uid} - {response.json()}")
+            return json_codec.loads(response.content)["dashboard"]
+
+    async def latest_version(self, uid: str) -> int | None:
+        """Get the latest version number of a dashboard, which is much cheaper than fetching the whole dashboard"""
+        with self.api.metrics.phase("list"):
+            response = await self.api.get(f"dashboards/uid/{uid}/versions?limit=1")
+        if response.status_code != 200:
+            logger.debug(f"Could not get versions of dashboard {uid}: {response.status_code}")
+            return None
+
+        # Newer Grafana versions wrap the list of versions in an object with a continueToken
+        body = json_codec.loads(response.content)
+        versions = body.get("versions", []) if isinstance(body, dict) else body
+        return versions[0]["version"] if versions else None
+
+    async def home_dashboard_json(self) -> dict:
+        """Get the raw json definition of the home dashboard"""
+        with self.api.metrics.phase("fetch"):
+            response = json_codec.loads((await self.api.get("dashboards/home")).content)
+
+        # If the dashboard has been set to a custom dashboard, the response will be a direct to that dashboard
+        if "redirectUri" in response:
+            home_uid = response["redirectUri"].split("/")[2]
+            logger.info(f"Custom home dashboard has been set: {home_uid=}")
+            return await self.dashboard_json(home_uid)
+
+        return response["dashboard"]
+
+    async def create(self, dashboard: dict, folder_uid: str | None = None, overwrite: bool = True) -> None:
+        """Create a new dashboard"""
+        dashboard.pop("id", None)
+
+        if not folder_uid:
+            logger.warning(f"Dashboard {dashboard['title']} has no folder and will be added at the root level")
+        payload = {
+            "dashboard": dashboard,
+            "folderUid": folder_uid,
+            "message": f"Uploaded at {datetime.now()}",
+            "overwrite": overwrite,
+        }
+
+        with self.api.metrics.phase("upload"):
+            response = await self.api.post("dashboards/db", body=payload, idempotent=bool(dashboard.get("uid")))
+
+        if response.status_code != 200:
+            raise GrafanaApiException(
+                f"{response.status_code}: Failed to upload {dashboard['title']} - {response.json()}"
+            )
+
+    async def create_home(self, dashboard: dict) -> str:
+        """Create the home dashboard (store in the default General folder by convention)"""
+        dashboard.pop("id", None)
+
+        with self.api.metrics.phase("upload"):
+            response = await self.api.post(
+                "dashboards/db",
+                body={
+                    "dashboard": dashboard,
+                    "folderId": 0,
+                    "message": f"Uploaded at {datetime.now()}",
+                    "overwrite": True,
+                },
+                idempotent=bool(dashboard.get("uid")),
+            )
+
+        if response.status_code != 200:
+            raise GrafanaApiException(
+                f"{response.status_code}: Failed to upload {dashboard['title']} - {response.json()}"
+            )
+
+        return response.json()["uid"]
+
+    async def set_home(self, uid: str) -> None:
+        """Set a given dashboard as the default home dashboard for the current organization"""
+        with self.api.metrics.phase("upload"):
+            response = await self.api.patch("/org/preferences", {"homeDashboardUID": uid})
+        if response.status_code != 200:
+            raise GrafanaApiException(f"Failed to set home dashboard {response.json()}")
@@ -0,0 +1,104 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+from collections.abc import AsyncIterator
+from typing import TypeVar
+
+from pydantic import TypeAdapter
+
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.api.async_rest_client import AsyncRestClient
+from grafana_dashboard_manager.exceptions import FolderExistsException, GrafanaApiException
+from grafana_dashboard_manager.handlers.api_folders import (
+    DASHBOARD_SUMMARY_LIST,
+    FOLDER_LIST,
+    JSON_OBJECT_LIST,
+    SEARCH_PAGE_SIZE,
+    folder_tree_from_search,
+)
+from grafana_dashboard_manager.models import DashboardSummary, Folder
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncApiFolders:
+    """Handler class to interact with Folders via API from coroutines"""
+
+    def __init__(self, api: AsyncRestClient):
+        """Provide an AsyncRestClient to use for API calls"""
+        self.api = api
+
+    async def all_folders(self) -> list[Folder]:
+        """Get a list of all folders"""
+        with self.api.metrics.phase("list"):
+            response = await self.api.get("folders")
+        return FOLDER_LIST.validate_json(response.content)
+
+    async def folder_tree(self, page_size: int = SEARCH_PAGE_SIZE) -> dict[str, Folder]:
+        """Get every folder at any depth of nesting, keyed by the folder's path with parents before their children"""
+        results = [folder async for folder in self._search_pages("search?type=dash-folder", page_size)]
+        return folder_tree_from_search(results)
+
+    async def all_dashboards(
+        self, page_size: int = SEARCH_PAGE_SIZE, *, search_params: str = ""
+    ) -> AsyncIterator[DashboardSummary]:
+        """Get every dashboard in the instance that is in a folder and matches the additional search parameters"""
+        query = f"search?type=dash-db{search_params}"
+        async for dashboard in self._search_pages(query, page_size, adapter=DASHBOARD_SUMMARY_LIST):
+            if not dashboard.folderUid:
+                logger.debug(f"Skipping dashboard in the General folder: {dashboard.title}")
+                continue
+            yield dashboard
+
+    async def _search_pages(
+        self, query: str, page_size: int = SEARCH_PAGE_SIZE, *, adapter: TypeAdapter[list[T]] = JSON_OBJECT_LIST
+    ) -> AsyncIterator[T]:
+        """Follows the pages of a search query, as the search API otherwise truncates the results"""
+        page = 1
+        while True:
+            with self.api.metrics.phase("list"):
+                response = await self.api.get(f"{query}&limit={page_size}&page={page}")
+            if response.status_code != 200:
+                raise GrafanaApiException(f"Search failed for '{query}' page {page}: {response.json()}")
+
+            results = adapter.validate_json(response.content)
+            for result in results:
+                yield result
+
+            if len(results) < page_size:
+                return
+            page += 1
+
+    async def create(
+        self, title: str, uid: str | None = None, *, parent_uid: str | None = None, overwrite: bool = True
+    ) -> Folder:
+        """Create a new folder, nested inside the parent folder if given"""
+        body = {
+            "uid": uid,
+            "title": title,
+        }
+        if parent_uid:
+            body["parentUid"] = parent_uid
+        with self.api.metrics.phase("upload"):
+            response = await self.api.post("folders", body, idempotent=bool(uid))
+
+        if response.status_code in {409, 412}:
+            # Retry with PUT (i.e. update)
+            if overwrite is False:
+                raise FolderExistsException(f"Folder already exists: {title=} {uid=}. Use overwrite option")
+            with self.api.metrics.phase("upload"):
+                response = await self.api.put(f"folders/{uid}", {**body, "overwrite": True})
+
+        if response.status_code != 200:
+            raise GrafanaApiException(f"Could not update folder '{title}': {response.json()}")
+
+        logger.info(f"Created or updated folder with title '{title}' (uid={response.json().get('uid')})")
+        return Folder.model_validate(json_codec.loads(response.content))
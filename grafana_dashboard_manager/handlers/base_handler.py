@@ -12,6 +12,8 @@ from typing import Generic, TypeVar
 import httpx
 from pydantic import BaseModel
 
+from grafana_dashboard_manager import json_codec
+
 logger = logging.getLogger(__name__)
 
 
@@ -46,6 +48,6 @@ class BaseHandler(Generic[T]):
 
     def response_to_model(self, response: httpx.Response):
         """Convert the HTTP response into the entity model"""
-        body = response.json()
+        body = json_codec.loads(response.content)
         folder = self.model.model_validate(body)
         return folder
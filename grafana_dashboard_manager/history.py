@@ -0,0 +1,106 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+import mmap
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.handlers.api_dashboards import write_atomic
+
+logger = logging.getLogger(__name__)
+
+WATERMARKS_FILE = "watermarks.json"
+
+
+class HistoryStore:
+    """
+    A directory holding the version history of each dashboard, which is only ever appended to
+
+    The versions of each dashboard are kept in <uid>.jsonl, oldest first with one version per line as it was sent by
+    Grafana. The newest version stored for each dashboard, its watermark, is also recorded in watermarks.json so that a
+    run can tell which dashboards have new versions without reading their files.
+    """
+
+    def __init__(self, root: Path):
+        """Use the store in the given directory"""
+        self.root = root
+
+    def path(self, uid: str) -> Path:
+        """The file holding the versions of a dashboard"""
+        return self.root / f"{uid.replace('/', '-')}.jsonl"
+
+    def watermarks(self) -> dict[str, int]:
+        """The newest version stored for each dashboard, keyed by uid"""
+        watermarks_file = self.root / WATERMARKS_FILE
+        if not watermarks_file.is_file():
+            return {}
+        return json_codec.loads(watermarks_file.read_bytes())
+
+    def save_watermarks(self, watermarks: dict[str, int]) -> None:
+        """Record the newest version stored for each dashboard, once their versions have been appended"""
+        content = json_codec.dumps(dict(sorted(watermarks.items())), indent=2, compatible=False)
+        write_atomic(self.root / WATERMARKS_FILE, content)
+
+    def append(self, uid: str, versions: Iterable[tuple[int, bytes]]) -> tuple[int, int]:
+        """
+        Append versions of a dashboard to its file, skipping any that are already there
+
+        A run that was interrupted may have appended versions without recording its watermarks, so the newest version in
+        the file is checked before the first version is appended. The file is synced once all of the versions have been
+        appended.
+
+        Args:
+            uid: the dashboard uid
+            versions: the version numbers and content of the versions, oldest first
+
+        Returns:
+            the number of versions appended, and the newest version in the file
+
+        """
+        appended = 0
+        newest = 0
+        file = None
+        try:
+            for version, content in versions:
+                if file is None:
+                    newest = self.newest_version(uid)
+                    file = self.path(uid).open("ab")
+                if version <= newest:
+                    continue
+                # Newlines can only be whitespace between the tokens of valid json, so removing them keeps the version
+                # on one line without decoding it
+                file.write(content.replace(b"\n", b"").replace(b"\r", b"") + b"\n")
+                appended += 1
+                newest = version
+            if file is not None:
+                file.flush()
+                os.fsync(file.fileno())
+        finally:
+            if file is not None:
+                file.close()
+        return appended, newest
+
+    def newest_version(self, uid: str) -> int:
+        """The newest version in a dashboard's file, removing any partly written version left by an interrupted run"""
+        path = self.path(uid)
+        if not path.is_file() or path.stat().st_size == 0:
+            return 0
+
+        with path.open("rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            end = content.rfind(b"\n") + 1
+            if end < len(content):
+                logger.warning(f"Removing a partly written version from the end of {path}")
+            start = content.rfind(b"\n", 0, end - 1) + 1 if end else 0
+            last_line = content[start:end]
+        if end < path.stat().st_size:
+            os.truncate(path, end)
+
+        return json_codec.loads(last_line)["version"] if last_line else 0
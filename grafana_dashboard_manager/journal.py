@@ -0,0 +1,156 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO
+
+from grafana_dashboard_manager import json_codec
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_JOURNAL_FILE = ".download-journal.jsonl"
+UPLOAD_JOURNAL_FILE = ".upload-journal.jsonl"
+
+
+class Journal:
+    """
+    An append-only record of the work completed by a run, so that a run which is interrupted can be resumed
+
+    Each completed item is a line of json, keyed by its kind (e.g. "folder" or "dashboard") and a key that is unique
+    within the kind. The first line is a header describing the run, and a journal is only resumed by a run with the same
+    header. Writes are flushed and synced to disk in batches, so a crash loses at most the last batch, whose work is
+    then repeated when resuming. A journal without a path is only kept in memory, for a run that can't be resumed.
+    """
+
+    def __init__(
+        self,
+        path: Path | None,
+        header: dict,
+        *,
+        resume: bool = False,
+        sync_every: int = 100,
+        sync_interval: float = 1.0,
+    ):
+        """
+        Open a journal, starting a new one unless resuming an existing one
+
+        Args:
+            path: the journal file, or None to keep the journal in memory only
+            header: describes the run, e.g. the command and the Grafana it is run against
+            resume: load the completed work from an existing journal at path, and append to it
+            sync_every: sync to disk after this many records
+            sync_interval: sync to disk if this many seconds have passed since the last sync
+
+        Raises:
+            ValueError: if resuming a journal that was written by a run with a different header
+
+        """
+        self.path = path
+        self.header = header
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._completed: dict[str, dict[str, dict]] = {}
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        self._file: BinaryIO | None = None
+        if path is None:
+            return
+        if resume and path.is_file():
+            self._load(path)
+            self._file = path.open("ab")
+            logger.info(f"Resuming from {path}, {self.completed_count()} items were already completed")
+        else:
+            if resume:
+                logger.warning(f"No journal found at {path}, nothing to resume")
+            self._file = path.open("wb")
+            self._append({"header": header})
+            self.sync()
+
+    def completed(self, kind: str, key: str) -> dict | None:
+        """The data recorded for a completed item, or None if the item has not been completed"""
+        return self._completed.get(kind, {}).get(key)
+
+    def completed_count(self, kind: str | None = None) -> int:
+        """The number of completed items, of a single kind if given"""
+        if kind is not None:
+            return len(self._completed.get(kind, {}))
+        return sum(len(items) for items in self._completed.values())
+
+    def record(self, kind: str, key: str, data: dict | None = None) -> None:
+        """Record that an item has been completed, along with any data needed to skip it when resuming"""
+        with self._lock:
+            self._completed.setdefault(kind, {})[key] = data or {}
+            if self._file is None:
+                return
+            self._append({"kind": kind, "key": key, "data": data or {}})
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    def sync(self) -> None:
+        """Flush the records written so far to disk"""
+        with self._lock:
+            self._sync()
+
+    def close(self, *, complete: bool = False) -> None:
+        """Close the journal, removing it if the run completed as there is then nothing left to resume"""
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+        if complete and self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "Journal":
+        """Use as a context manager, which removes the journal if no exception is raised"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Close the journal, keeping it to resume from if an exception was raised"""
+        self.close(complete=exc_type is None)
+
+    def _append(self, entry: dict) -> None:
+        self._file.write(json_codec.dumps(entry, compatible=False) + b"\n")
+
+    def _sync(self) -> None:
+        if self._file is None or self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _load(self, path: Path) -> None:
+        content = path.read_bytes()
+        # The last line is incomplete if the run was killed while writing it, so it is dropped before appending more
+        if not content.endswith(b"\n"):
+            content = content[: content.rfind(b"\n") + 1]
+            with path.open("r+b") as file:
+                file.truncate(len(content))
+        lines = content.splitlines()
+
+        try:
+            header = json_codec.loads(lines[0])["header"] if lines else None
+        except (json_codec.JSONDecodeError, KeyError, TypeError):
+            header = None
+        if header != self.header:
+            raise ValueError(f"The journal {path} was written by a different run ({header}), and can't be resumed")
+
+        for line in lines[1:]:
+            try:
+                entry = json_codec.loads(line)
+            except json_codec.JSONDecodeError:
+                logger.debug(f"Ignoring invalid journal entry: {line!r}")
+                continue
+            self._completed.setdefault(entry["kind"], {})[entry["key"]] = entry["data"]
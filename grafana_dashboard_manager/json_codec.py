@@ -0,0 +1,153 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import json
+import re
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# orjson's decode error subclasses the stdlib one, so this catches errors from either codec
+JSONDecodeError = json.JSONDecodeError
+
+# The start of an object member up to its value, and the separator before the next member
+MEMBER_KEY = re.compile(rb'\s*"((?:[^"\\]|\\.)*)"\s*:\s*')
+MEMBER_SEPARATOR = re.compile(rb"\s*,")
+OBJECT_START = re.compile(rb"\s*\{")
+
+# How much of a document is decoded at a time to find the end of a member's value
+DECODE_WINDOW = 64 * 1024
+
+# Every byte other than those delimiting strings, objects and arrays, and a string once the escapes are removed
+NOT_STRUCTURE = bytes(set(range(256)) - set(b'{}[]"'))
+QUOTED = re.compile(rb'"[^"]*"')
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:
+    """Decode json, using orjson if it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(data: Any, *, indent: int | None = None, sort_keys: bool = False, compatible: bool = True) -> bytes:
+    """
+    Encode json to utf-8 bytes
+
+    Args:
+        data: the object to encode
+        indent: pretty print with this many spaces of indentation, otherwise the output is compact
+        sort_keys: sort the keys of objects
+        compatible: produce exactly the same bytes as json.dumps, e.g. for files that are kept under version control.
+            Otherwise orjson is used if installed, which only indents by 2 spaces and does not escape non-ascii text
+
+    Returns:
+        the encoded json
+
+    """
+    if orjson is not None and not compatible:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(data, option=option)
+        except TypeError:
+            # e.g. integers larger than 64 bits, which the stdlib can still encode
+            pass
+
+    separators = None if indent or compatible else (",", ":")
+    return json.dumps(data, indent=indent, sort_keys=sort_keys, separators=separators).encode()
+
+
+def split_last_member(content: bytes, key: str) -> tuple[dict, memoryview] | None:
+    """
+    Splits a json object whose last member has the given key into its other members, which are decoded, and the value
+    of the last member, which is returned as a view of the encoded content without decoding it
+
+    This is much cheaper than decoding the whole object when the other members are small and the last member is large.
+
+    Args:
+        content: the encoded json object
+        key: the key of the last member
+
+    Returns:
+        the other members and the encoded value of the last member, or None if the content is not an object whose last
+        member has the key
+
+    """
+    end = len(content.rstrip())
+    match = OBJECT_START.match(content)
+    if match is None or not content[:end].endswith(b"}"):
+        return None
+
+    members: dict = {}
+    position = match.end()
+    decoder = json.JSONDecoder()
+    while match := MEMBER_KEY.match(content, position):
+        member_key = json.loads(b'"' + match.group(1) + b'"')
+        position = match.end()
+        if member_key == key:
+            # The value runs to the end of the object, which only holds if this really is the last member
+            value = memoryview(content)[position : end - 1]
+            return (members, value) if _is_single_value(value) else None
+
+        window = DECODE_WINDOW
+        while True:
+            # The window is cut at the start of a utf-8 character, so that the offsets can be converted back to bytes
+            cut = min(position + window, end)
+            while cut < end and content[cut] & 0xC0 == 0x80:
+                cut -= 1
+            text = content[position:cut].decode()
+            try:
+                members[member_key], length = decoder.raw_decode(text)
+                break
+            except json.JSONDecodeError:
+                if cut >= end:
+                    return None
+                window *= 4
+
+        position += len(text[:length].encode())
+        separator = MEMBER_SEPARATOR.match(content, position)
+        if separator is None:
+            return None
+        position = separator.end()
+
+    return None
+
+
+def _is_single_value(content: bytes | memoryview) -> bool:
+    """Whether encoded json is a single value, rather than one that is followed by other members, without decoding it"""
+    content = bytes(content).strip()
+    if content[:1] not in (b"{", b"["):
+        # Any other value is small enough to simply decode
+        try:
+            json.loads(content)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return False
+        return True
+
+    # Only the brackets outside of strings are kept. Once the escapes are removed every quote delimits a string, and
+    # adjacent quotes can be dropped first as nothing outside of a string is between them, leaving few strings to remove
+    structure = content.replace(b"\\\\", b"").replace(b'\\"', b"").translate(None, NOT_STRUCTURE).replace(b'""', b"")
+    brackets = QUOTED.sub(b"", structure)
+    if brackets[:1] + brackets[-1:] not in (b"{}", b"[]") or content[-1:] != brackets[-1:]:
+        return False
+
+    # The first bracket is closed by the last only if the brackets between them balance
+    inner = brackets[1:-1]
+    while inner:
+        reduced = inner.replace(b"{}", b"").replace(b"[]", b"")
+        if len(reduced) == len(inner):
+            return False
+        inner = reduced
+    return True
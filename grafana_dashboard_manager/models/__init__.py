@@ -6,5 +6,14 @@ license that can be found in the LICENSE file or at
 https://opensource.org/licenses/MIT.
 """
 
-from .dashboard import DashboardFolderLookup, DashboardResponse, DashboardSearchResult, FolderDashboards
+from .dashboard import (
+    DashboardFolderLookup,
+    DashboardManifestEntry,
+    DashboardResponse,
+    DashboardSearchResult,
+    DashboardSummary,
+    FolderDashboards,
+)
 from .folder import Folder, FolderDetails
+from .org import Org
+from .snapshot import Snapshot
@@ -7,6 +7,7 @@ https://opensource.org/licenses/MIT.
 """
 
 # ruff: noqa: D101
+from dataclasses import dataclass
 from typing import Literal
 
 from pydantic import BaseModel
@@ -50,11 +51,28 @@ class DashboardSearchResult(BaseModel):
     sortMeta: int
 
 
+@dataclass(frozen=True, slots=True)
+class DashboardSummary:
+    """
+    The fields of a dashboard search result that are needed to download it, kept for every dashboard in the instance
+
+    A slotted dataclass takes a fraction of the memory of a DashboardSearchResult, and the other fields of the search
+    result are ignored when validating, so they are never copied out of the response.
+    """
+
+    uid: str
+    title: str
+    # Empty for dashboards in the General folder
+    folderUid: str = ""
+    tags: tuple[str, ...] = ()
+
+
 class DashboardFolderLookup(BaseModel):
     uid: str
     id: int
     title: str
-    dashboards: list[DashboardSearchResult] = []
+    parentUid: str | None = None
+    dashboards: list[DashboardSummary] = []
 
 
 class FolderDashboards(BaseModel):
@@ -62,6 +80,16 @@ class FolderDashboards(BaseModel):
     dashboards: list[DashboardFolderLookup]
 
 
+class DashboardManifestEntry(BaseModel):
+    uid: str
+    version: int
+    sha256: str
+    path: str
+    # Recorded so that uploads can be filtered without reading each file, and missing from older manifests
+    title: str | None = None
+    tags: list[str] = []
+
+
 class DashboardResponse(BaseModel):
     dashboard: Dashboard
     meta: DashboardMeta
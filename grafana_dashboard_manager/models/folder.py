@@ -16,6 +16,7 @@ class Folder(BaseModel):
     id: int
     uid: str
     title: str
+    parentUid: str | None = None
 
 
 class FolderDetails(Folder):
@@ -0,0 +1,15 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+# ruff: noqa: D101
+from pydantic import BaseModel
+
+
+class Org(BaseModel):
+    id: int
+    name: str
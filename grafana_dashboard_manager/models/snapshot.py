@@ -0,0 +1,34 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+# ruff: noqa: D101
+from datetime import datetime
+
+from pydantic import BaseModel
+
+from .dashboard import DashboardManifestEntry
+from .folder import Folder
+
+
+class Snapshot(BaseModel):
+    name: str
+    created: datetime
+    host: str
+    org: int | None = None
+    # Keyed by folder path, with parents before their children
+    folders: dict[str, Folder] = {}
+    # Keyed by dashboard uid, each with the sha256 of the blob holding its content
+    dashboards: dict[str, DashboardManifestEntry] = {}
+    home: str | None = None
+
+    def blobs(self) -> set[str]:
+        """The hashes of every blob the snapshot refers to"""
+        blobs = {entry.sha256 for entry in self.dashboards.values()}
+        if self.home:
+            blobs.add(self.home)
+        return blobs
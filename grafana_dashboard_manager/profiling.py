@@ -0,0 +1,92 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def profiled(stats_file: Path, *, memory: bool = False, top: int = 25) -> Iterator[None]:
+    """
+    Profiles the CPU time, and optionally the memory allocations, of the code run in the block including any worker
+    threads it starts
+
+    The profile is written to stats_file in the pstats format, for use with tools such as snakeviz, and a summary of the
+    top functions and allocation sites is written alongside it with a .txt suffix.
+
+    Args:
+        stats_file: where to write the pstats file
+        memory: also trace memory allocations with tracemalloc, which slows the run down considerably
+        top: number of functions and allocation sites to include in the summary
+
+    """
+    profiler = cProfile.Profile()
+    thread_profilers: list[cProfile.Profile] = []
+    lock = threading.Lock()
+
+    # Before Python 3.12 a profiler only sees the thread that enabled it, so each new thread enables its own
+    per_thread = sys.version_info < (3, 12)
+
+    def profile_thread(frame, event, arg):
+        """Called for the first event in each new thread, replacing itself with a profiler for that thread"""
+        sys.setprofile(None)
+        thread_profiler = cProfile.Profile()
+        thread_profiler.enable()
+        with lock:
+            thread_profilers.append(thread_profiler)
+
+    if memory:
+        tracemalloc.start()
+    if per_thread:
+        threading.setprofile(profile_thread)
+    profiler.enable()
+
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if per_thread:
+            threading.setprofile(None)
+
+        # Take the memory snapshot before the profile is processed, so that it only includes the profiled code
+        if memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"), tracemalloc.Filter(False, __file__)]
+            )
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        stats = pstats.Stats(profiler)
+        with lock:
+            for thread_profiler in thread_profilers:
+                stats.add(thread_profiler)
+        stats.dump_stats(stats_file)
+
+        summary = io.StringIO()
+        stats.stream = summary  # type: ignore[attr-defined]
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+
+        if memory:
+            summary.write(f"Traced memory: {current / 1024**2:.1f} MiB at exit, {peak / 1024**2:.1f} MiB peak\n\n")
+            summary.write(f"Top {top} allocation sites by size still allocated at exit:\n")
+            summary.writelines(f"{statistic}\n" for statistic in snapshot.statistics("lineno")[:top])
+
+        summary_file = stats_file.with_name(f"{stats_file.name}.txt")
+        summary_file.write_text(summary.getvalue())
+        logger.info(f"Wrote profile to {stats_file} with a summary in {summary_file}")
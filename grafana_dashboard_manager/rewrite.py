@@ -0,0 +1,188 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import logging
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+from grafana_dashboard_manager.models.folder import Folder
+
+logger = logging.getLogger(__name__)
+
+
+def iter_panels(dashboard: dict) -> Iterator[dict]:
+    """
+    Yields every panel of a dashboard once, including the panels of legacy "rows" and those nested inside collapsed
+    rows, without recursion
+    """
+    stack: list[list] = [dashboard.get("panels") or []]
+    stack.extend(row.get("panels") or [] for row in dashboard.get("rows") or [] if isinstance(row, dict))
+
+    while stack:
+        for panel in stack.pop():
+            if not isinstance(panel, dict):
+                continue
+            yield panel
+            # A collapsed row holds its panels itself, rather than them following it in the dashboard's panels
+            if panel.get("panels"):
+                stack.append(panel["panels"])
+
+
+@dataclass
+class FolderIndex:
+    """Lookups of the folders that dashboards are uploaded to, by title and by the id and uid the dashboards refer to"""
+
+    by_title: dict[str, Folder] = field(default_factory=dict)
+    by_id: dict[int, Folder] = field(default_factory=dict)
+    by_uid: dict[str, Folder] = field(default_factory=dict)
+    # Keyed by the id and uid of the folder a dashboard came from, which may clash with those of another target folder
+    by_source_id: dict[int, Folder] = field(default_factory=dict)
+    by_source_uid: dict[str, Folder] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, folders: dict[str, Folder], source_folders: dict[str, Folder] | None = None) -> "FolderIndex":
+        """
+        Indexes the folders that dashboards are uploaded to
+
+        Args:
+            folders: the folders in the Grafana being uploaded to, keyed by path with parents before their children
+            source_folders: the same folders where the dashboards came from, keyed by path, whose ids and uids may be
+                referred to by the dashboards
+
+        Returns:
+            the index
+
+        """
+        index = cls()
+        for path, folder in folders.items():
+            index.add(folder, (source_folders or {}).get(path))
+        return index
+
+    def add(self, folder: Folder, source: Folder | None = None) -> None:
+        """Adds a folder, which is also found by the id and uid of its source folder if given"""
+        # Titles aren't unique when folders are nested, so the least nested folder with a title is used
+        self.by_title.setdefault(folder.title, folder)
+        self.by_id[folder.id] = folder
+        self.by_uid[folder.uid] = folder
+        if source is not None:
+            self.by_source_id[source.id] = folder
+            self.by_source_uid[source.uid] = folder
+
+    def find(self, uid: str | None, id: int | None) -> Folder | None:
+        """
+        The folder with the given uid or id, which dashboards use to refer to their source folders, so those take
+        precedence over any target folder with the same uid or id
+        """
+        return (
+            self.by_source_uid.get(uid or "")
+            or self.by_source_id.get(id or 0)
+            or self.by_uid.get(uid or "")
+            or self.by_id.get(id or 0)
+        )
+
+
+class RewritePass:
+    """A transformation that is applied during the single walk of a dashboard"""
+
+    def dashboard(self, dashboard: dict) -> None:
+        """Rewrites the top level of the dashboard in place"""
+
+    def panel(self, panel: dict) -> None:
+        """Rewrites a single panel in place"""
+
+
+class FolderRemapPass(RewritePass):
+    """Points dashlist panels at the folders in the Grafana being uploaded to"""
+
+    def __init__(self, index: FolderIndex):
+        """Looks up folders using the given index"""
+        self.index = index
+
+    def panel(self, panel: dict) -> None:
+        """Updates the folder id and uid of a dashlist panel"""
+        if panel.get("type") != "dashlist":
+            return
+
+        options = panel.get("options")
+        # Some dashboard panels may not contain an `options` field
+        if not options:
+            logger.debug(f"Panel {panel.get('title')} does not have an options field to modify")
+            return
+
+        # Prefer the folder the panel refers to, then fall back to a folder with the same title as the panel
+        folder = self.index.find(options.get("folderUID"), options.get("folderId")) or self.index.by_title.get(
+            panel.get("title") or ""
+        )
+        # If there's no folder, it could be referencing other things like recent dashboards, alerts etc
+        if folder is None:
+            logger.debug(f"Panel {panel.get('title')} was not found in folders")
+            return
+
+        # Only the fields that are already set are updated
+        if options.get("folderId") and options["folderId"] != folder.id:
+            logger.debug(f"Updating folderId of panel {panel.get('title')} to {folder.id}")
+            options["folderId"] = folder.id
+        if options.get("folderUID") and options["folderUID"] != folder.uid:
+            logger.debug(f"Updating folderUID of panel {panel.get('title')} to {folder.uid}")
+            options["folderUID"] = folder.uid
+
+
+class DatasourceRemapPass(RewritePass):
+    """Replaces the uids of datasources, for when the same datasource has a different uid in each environment"""
+
+    def __init__(self, uids: dict[str, str]):
+        """Maps each datasource uid in uids to its value"""
+        self.uids = uids
+
+    def dashboard(self, dashboard: dict) -> None:
+        """Updates the datasources of template variables and annotations"""
+        for key in ("templating", "annotations"):
+            for item in (dashboard.get(key) or {}).get("list") or []:
+                self._remap(item)
+
+    def panel(self, panel: dict) -> None:
+        """Updates the datasources of a panel and its queries"""
+        self._remap(panel)
+        for target in panel.get("targets") or []:
+            self._remap(target)
+
+    def _remap(self, item: dict) -> None:
+        datasource = item.get("datasource") if isinstance(item, dict) else None
+        if isinstance(datasource, dict) and datasource.get("uid") in self.uids:
+            datasource["uid"] = self.uids[datasource["uid"]]
+
+
+class StripVersionPass(RewritePass):
+    """Removes the id and version of a dashboard, which belong to the Grafana it was downloaded from"""
+
+    def dashboard(self, dashboard: dict) -> None:
+        """Removes the id and version fields"""
+        dashboard.pop("id", None)
+        dashboard.pop("version", None)
+
+
+class DashboardRewriter:
+    """Applies a set of rewrite passes to a dashboard in a single walk of its panels"""
+
+    def __init__(self, passes: Iterable[RewritePass]):
+        """Applies the passes in the given order"""
+        self.passes = list(passes)
+        # Only passes that rewrite panels are called for each panel
+        self.panel_passes = [p for p in self.passes if type(p).panel is not RewritePass.panel]
+
+    def rewrite(self, dashboard: dict) -> dict:
+        """Rewrites the dashboard in place, and returns it"""
+        for rewrite_pass in self.passes:
+            rewrite_pass.dashboard(dashboard)
+
+        if self.panel_passes:
+            for panel in iter_panels(dashboard):
+                for rewrite_pass in self.panel_passes:
+                    rewrite_pass.panel(panel)
+
+        return dashboard
@@ -0,0 +1,177 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from grafana_dashboard_manager import json_codec
+from grafana_dashboard_manager.bundle import DashboardFile
+from grafana_dashboard_manager.handlers.api_dashboards import write_atomic
+from grafana_dashboard_manager.models import Snapshot
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = "blobs"
+SNAPSHOTS_DIR = "snapshots"
+LATEST_SNAPSHOT = "latest"
+
+# Blobs written this recently are never collected, as they may belong to a snapshot that is still being downloaded
+GC_GRACE_SECONDS = 3600
+
+
+class SnapshotStore:
+    """
+    A directory of snapshots, in which each distinct dashboard is stored once however many snapshots it is in
+
+    Dashboards are stored as blobs named by the sha256 of their content, in blobs/<first 2 characters>/<sha256>. Each
+    snapshot is a small json file in snapshots/ recording the folders and the blob of each dashboard, so a snapshot of
+    an instance where little has changed only adds the blobs of the dashboards that changed.
+    """
+
+    def __init__(self, root: Path):
+        """Use the store in the given directory, which is laid out when first written to"""
+        self.root = root
+        self.blobs_dir = root / BLOBS_DIR
+        self.snapshots_dir = root / SNAPSHOTS_DIR
+
+    def blob_path(self, sha256: str) -> Path:
+        """The file holding the blob with the given hash"""
+        return self.blobs_dir / sha256[:2] / sha256
+
+    def has_blob(self, sha256: str) -> bool:
+        """Whether the blob with the given hash is in the store"""
+        return self.blob_path(sha256).is_file()
+
+    def put(self, content: bytes | memoryview) -> tuple[str, bool]:
+        """
+        Add a blob to the store, unless it is already there
+
+        Returns:
+            the sha256 of the content, and whether a new blob was written
+
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(sha256)
+        if path.is_file():
+            # Mark the blob as recently used, so that it isn't collected before the snapshot using it is saved
+            os.utime(path)
+            return sha256, False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, content)
+        return sha256, True
+
+    def get(self, sha256: str) -> bytes:
+        """The content of a blob"""
+        return self.blob_path(sha256).read_bytes()
+
+    def snapshots(self) -> list[Snapshot]:
+        """Every snapshot in the store, oldest first"""
+        if not self.snapshots_dir.is_dir():
+            return []
+        snapshots = [self._read(path) for path in self.snapshots_dir.glob("*.json")]
+        return sorted(snapshots, key=lambda snapshot: snapshot.created)
+
+    def exists(self, name: str) -> bool:
+        """Whether the store has a snapshot with the given name"""
+        return self._snapshot_path(name).is_file()
+
+    def load(self, name: str = LATEST_SNAPSHOT) -> Snapshot:
+        """
+        Read a snapshot by its name, or the most recent snapshot if the name is "latest"
+
+        Raises:
+            ValueError: if there is no such snapshot
+
+        """
+        if name == LATEST_SNAPSHOT:
+            snapshots = self.snapshots()
+            if not snapshots:
+                raise ValueError(f"There are no snapshots in {self.root}")
+            return snapshots[-1]
+
+        if not self.exists(name):
+            names = ", ".join(snapshot.name for snapshot in self.snapshots()) or "none"
+            raise ValueError(f"No snapshot named '{name}' in {self.root}, the snapshots are: {names}")
+        return self._read(self._snapshot_path(name))
+
+    def save(self, snapshot: Snapshot) -> None:
+        """Record a snapshot, whose blobs must already have been added"""
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        content = json_codec.dumps(snapshot.model_dump(mode="json"), indent=2, compatible=False)
+        write_atomic(self._snapshot_path(snapshot.name), content)
+
+    def prune(self, keep_days: int, *, now: datetime | None = None) -> list[str]:
+        """
+        Delete the snapshots older than the given number of days, always keeping the most recent snapshot
+
+        Returns:
+            the names of the deleted snapshots
+
+        """
+        cutoff = (now or datetime.now(UTC)) - timedelta(days=keep_days)
+        pruned = [snapshot.name for snapshot in self.snapshots()[:-1] if snapshot.created < cutoff]
+        for name in pruned:
+            self._snapshot_path(name).unlink()
+            logger.info(f"Deleted snapshot {name}")
+        return pruned
+
+    def collect_garbage(self) -> tuple[int, int]:
+        """
+        Delete the blobs that no snapshot refers to
+
+        Returns:
+            the number of blobs deleted, and their total size in bytes
+
+        """
+        referenced = set().union(*(snapshot.blobs() for snapshot in self.snapshots()))
+        grace_cutoff = time.time() - GC_GRACE_SECONDS
+
+        count = size = 0
+        for path in self._blob_paths():
+            if path.name in referenced:
+                continue
+            stat = path.stat()
+            if stat.st_mtime > grace_cutoff:
+                continue
+            path.unlink()
+            count += 1
+            size += stat.st_size
+
+        logger.info(f"Deleted {count} unreferenced blobs ({size} bytes) from {self.root}")
+        return count, size
+
+    def dashboard_files(self, snapshot: Snapshot) -> Iterator[DashboardFile]:
+        """The dashboards of a snapshot as files in their folders, which are read from the store when uploaded"""
+        for entry in snapshot.dashboards.values():
+            folder, _, name = entry.path.rpartition("/")
+            yield DashboardFile(folder, name, path=self.blob_path(entry.sha256))
+
+    def _blob_paths(self) -> Iterator[Path]:
+        if not self.blobs_dir.is_dir():
+            return
+        for prefix in self.blobs_dir.iterdir():
+            if prefix.is_dir():
+                # Partial files left by an interrupted write are hidden, and are collected like any other blob
+                yield from (path for path in prefix.iterdir() if path.is_file())
+
+    def _snapshot_path(self, name: str) -> Path:
+        return self.snapshots_dir / f"{name}.json"
+
+    def _read(self, path: Path) -> Snapshot:
+        return Snapshot.model_validate(json_codec.loads(path.read_bytes()))
+
+
+def snapshot_name(created: datetime) -> str:
+    """The default name of a snapshot, which sorts in the order the snapshots were taken"""
+    return created.strftime("%Y%m%dT%H%M%SZ")
@@ -7,31 +7,39 @@ https://opensource.org/licenses/MIT.
 """
 
 import logging
+import sys
 from pathlib import Path
+from pprint import pformat
+from typing import TYPE_CHECKING
 
-import rich
-from rich.filesize import decimal
-from rich.logging import RichHandler
-from rich.markup import escape
-from rich.panel import Panel
-from rich.pretty import Pretty
-from rich.prompt import Confirm
-from rich.text import Text
-from rich.traceback import install
-from rich.tree import Tree
+# rich is only imported when the output is to a terminal, as it is slow to import and its formatting is lost otherwise
+if TYPE_CHECKING:
+    from rich.tree import Tree
 
-from grafana_dashboard_manager.models import DashboardFolderLookup
+    from grafana_dashboard_manager.models import DashboardFolderLookup
 
 logger = logging.getLogger(__name__)
 
 
+def is_interactive() -> bool:
+    """Whether the output is to a terminal, where it is displayed with rich"""
+    return sys.stdout.isatty()
+
+
 def configure_logging(verbose: int):
     """Sets up the python logging format and level"""
-    install(show_locals=False)
     log_level = "DEBUG" if verbose > 0 else "INFO"
-    logging.basicConfig(
-        level=log_level, format="%(message)s", datefmt="[%X]", handlers=[RichHandler(rich_tracebacks=True)]
-    )
+    if is_interactive():
+        from rich.logging import RichHandler
+        from rich.traceback import install
+
+        install(show_locals=False)
+        handler: logging.Handler = RichHandler(rich_tracebacks=True)
+        log_format = "%(message)s"
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+        log_format = "%(asctime)s %(levelname)-8s %(message)s"
+    logging.basicConfig(level=log_level, format=log_format, datefmt="[%X]", handlers=[handler])
     logging.log(logging.getLevelName(log_level), f"Logging level is set to {log_level}")
 
     # In normal usage, don't log every http request
@@ -41,14 +49,20 @@ def configure_logging(verbose: int):
 
 def confirm(user_prompt: str):
     """A user interactive call to confirm an action"""
+    from rich.prompt import Confirm
+
     should_continue = Confirm.ask(user_prompt)
     if not should_continue:
         logger.info("Aborted")
         exit(0)
 
 
-def walk_directory(directory: Path, tree: Tree) -> Tree:
+def walk_directory(directory: Path, tree: "Tree") -> "Tree":
     """Recursively build a Tree with directory contents."""
+    from rich.filesize import decimal
+    from rich.markup import escape
+    from rich.text import Text
+
     # Sort dirs first then by filename
     paths = sorted(Path(directory).iterdir(), key=lambda path: (path.is_file(), path.name.lower()))
     for path in paths:
@@ -70,13 +84,39 @@ def walk_directory(directory: Path, tree: Tree) -> Tree:
 
 def show_dashboards(source_dir: Path) -> None:
     """Display a tree hierarchy of a folder of dashboards on the local disk"""
+    if not is_interactive():
+        print(f"Dashboards: {source_dir}")
+        for path in sorted(source_dir.rglob("*")):
+            relative_path = path.relative_to(source_dir)
+            if any(part.startswith(".") for part in relative_path.parts):
+                continue
+            indent = "  " * len(relative_path.parts)
+            print(f"{indent}{path.name}/" if path.is_dir() else f"{indent}{path.name} ({path.stat().st_size} bytes)")
+        return
+
+    import rich
+    from rich.panel import Panel
+    from rich.tree import Tree
+
     tree = Tree(f":open_file_folder: [link file://{source_dir}]{source_dir}", guide_style="bold bright_blue")
     tree = walk_directory(source_dir, tree)
     rich.print(Panel(tree, title="Dashboards:"))
 
 
-def show_dashboard_folders(source: dict[str, DashboardFolderLookup]) -> None:
+def show_dashboard_folders(source: dict[str, "DashboardFolderLookup"]) -> None:
     """Displays a tree hierarchy of a dict of DashboardFolderLookup objects"""
+    if not is_interactive():
+        print("Dashboards:")
+        for title, contents in source.items():
+            print(f"  {title}/")
+            for dashboard in contents.dashboards:
+                print(f"    {dashboard.title} (uid={dashboard.uid})")
+        return
+
+    import rich
+    from rich.panel import Panel
+    from rich.tree import Tree
+
     tree = Tree("Grafana Root:")
     for title, contents in source.items():
         folder_branch = tree.add(f"📂 {title}", style="bold green")
@@ -87,4 +127,12 @@ def show_dashboard_folders(source: dict[str, DashboardFolderLookup]) -> None:
 
 def show_info(title: str, data: dict) -> None:
     """Wraps input data in a panel"""
+    if not is_interactive():
+        print(f"{title}:\n{pformat(data)}")
+        return
+
+    import rich
+    from rich.panel import Panel
+    from rich.pretty import Pretty
+
     rich.print(Panel(Pretty(data), title=title))
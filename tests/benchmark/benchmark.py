@@ -0,0 +1,162 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+
+End-to-end throughput benchmark of the download and upload commands against a local fake Grafana server.
+
+Usage:
+    python tests/benchmark/benchmark.py --dashboards 10 1000 50000 --jobs 8 --latency 0.005
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from fake_grafana import FakeGrafanaOptions, fake_grafana
+from rich import print as rich_print
+from rich.table import Table
+
+
+@dataclass
+class BenchmarkResult:
+    """The measurements of running a single command against the fake Grafana server"""
+
+    command: str
+    dashboards: int
+    jobs: int
+    seconds: float
+    dashboards_per_sec: float
+    requests: int
+    p50_ms: float
+    p99_ms: float
+    peak_rss_mb: float
+
+
+def _peak_rss_mb() -> float:
+    """The peak resident set size of this process, which ru_maxrss reports in bytes on macOS and kilobytes elsewhere"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def _run_command(command: str, port: int, directory: str, dashboards: int, args: dict, results) -> None:
+    """Runs a command in this process, which is a fresh process for each command so that the peak RSS is its own"""
+    # The commands print the dashboard tree, which is part of their cost but would swamp the benchmark output
+    sys.stdout = open(os.devnull, "w")  # noqa: SIM115
+    logging.basicConfig(level=logging.ERROR)
+
+    from grafana_dashboard_manager.commands import download_dashboards, upload_dashboards
+    from grafana_dashboard_manager.global_config import GlobalConfig
+    from grafana_dashboard_manager.grafana.factory import client_from_config
+
+    func = download_dashboards if command == "download" else upload_dashboards
+    directory_option = "destination" if command == "download" else "source"
+    config = GlobalConfig.model_validate(
+        {
+            "func": func,
+            "scheme": "http",
+            "host": "127.0.0.1",
+            "port": port,
+            "token": "benchmark",
+            "non_interactive": True,
+            "jobs": args["jobs"],
+            "max_retries": args["max_retries"],
+            directory_option: directory,
+        }
+    )
+    client = client_from_config(config)
+
+    # Time each request from being sent until its response headers are received, counting each retry separately
+    latencies: list[float] = []
+
+    def on_request(request):
+        request.extensions["benchmark_start"] = time.perf_counter()
+
+    def on_response(response):
+        latencies.append(time.perf_counter() - response.request.extensions["benchmark_start"])
+
+    client._api.client.event_hooks = {"request": [on_request], "response": [on_response]}
+
+    start = time.perf_counter()
+    func(config, client)
+    seconds = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    result = BenchmarkResult(
+        command=command,
+        dashboards=dashboards,
+        jobs=args["jobs"],
+        seconds=round(seconds, 3),
+        dashboards_per_sec=round(dashboards / seconds, 1),
+        requests=len(latencies),
+        p50_ms=round(percentiles[49] * 1000, 2),
+        p99_ms=round(percentiles[98] * 1000, 2),
+        peak_rss_mb=round(_peak_rss_mb(), 1),
+    )
+    results.put(asdict(result))
+
+
+def run_command(command: str, port: int, directory: str, dashboards: int, args: dict) -> BenchmarkResult:
+    """Runs a command in a separate process and returns its measurements"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_command, args=(command, port, directory, dashboards, args, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"The {command} benchmark failed with exit code {process.exitcode}")
+    return BenchmarkResult(**results.get())
+
+
+def benchmark(dashboards: int, args: dict) -> list[BenchmarkResult]:
+    """Downloads the dataset from a fake Grafana, then uploads the download to an empty fake Grafana"""
+    options = {"latency": args["latency"], "error_rate": args["error_rate"], "panels": args["panels"]}
+    with tempfile.TemporaryDirectory() as directory:
+        with fake_grafana(FakeGrafanaOptions(dashboards=dashboards, folders=args["folders"], **options)) as port:
+            download = run_command("download", port, directory, dashboards, args)
+        with fake_grafana(FakeGrafanaOptions(dashboards=0, folders=0, **options)) as port:
+            upload = run_command("upload", port, directory, dashboards, args)
+    return [download, upload]
+
+
+def main():
+    """Runs the benchmarks for each dataset size and prints the results"""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[1], formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--dashboards", type=int, nargs="+", default=[10, 1000], help="Dataset sizes (default 10 1000)")
+    parser.add_argument("--folders", type=int, default=10, help="Number of folders to spread dashboards over")
+    parser.add_argument("--panels", type=int, default=20, help="Number of panels in each dashboard (default 20)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the server waits before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that receive a 503")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Concurrent requests to make (default 1)")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries after a 503 response (default 5)")
+    parser.add_argument("--output", type=Path, help="Also write the results to this json file")
+    args = vars(parser.parse_args())
+
+    results = [result for dashboards in args["dashboards"] for result in benchmark(dashboards, args)]
+
+    table = Table(title="Benchmark results")
+    for column in ("Command", "Dashboards", "Jobs", "Seconds", "Dash/s", "Requests", "p50 ms", "p99 ms", "Peak RSS MB"):
+        table.add_column(column, justify="left" if column == "Command" else "right")
+    for result in results:
+        table.add_row(*(str(value) for value in asdict(result).values()))
+    rich_print(table)
+
+    if args["output"]:
+        args["output"].write_text(json.dumps([asdict(result) for result in results], indent=2))
+
+
+if __name__ == "__main__":
+    main()
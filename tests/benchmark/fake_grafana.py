@@ -0,0 +1,319 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import json
+import multiprocessing
+import random
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass(frozen=True)
+class FakeGrafanaOptions:
+    """The dataset and behaviour of a fake Grafana server"""
+
+    dashboards: int = 0
+    folders: int = 10
+    panels: int = 20
+    versions: int = 1
+    latency: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+class FakeGrafana:
+    """
+    The in-memory state of a Grafana instance, implementing the subset of the HTTP API used by grafana-dashboard-manager
+
+    The initial dashboards are generated on request from their index, so that large datasets use little memory.
+    Dashboards that are uploaded are stored as they were received.
+    """
+
+    def __init__(self, options: FakeGrafanaOptions):
+        """Create the folders and the index of dashboards for the given dataset size"""
+        self.options = options
+        self.lock = threading.Lock()
+        self.random = random.Random(options.seed)
+        self.folders: dict[str, dict] = {}
+        self.next_folder_id = 1
+        self.home_uid: str | None = None
+
+        # uid -> (folder uid, title, version), and the stored body of each uploaded version. The initial versions of the
+        # generated dashboards differ only by their version number
+        self.dashboards: dict[str, tuple[str, str, int]] = {}
+        self.uploaded: dict[str, dict] = {}
+        self.uploaded_versions: dict[str, dict[int, dict]] = {}
+
+        folder_uids = [self._add_folder(f"folder-{i}", f"Folder {i}", None)["uid"] for i in range(options.folders)]
+        for i in range(options.dashboards if folder_uids else 0):
+            self.dashboards[f"dash-{i}"] = (folder_uids[i % len(folder_uids)], f"Dashboard {i}", options.versions)
+
+    def handle(self, method: str, path: str, query: dict[str, list[str]], body: dict | None) -> tuple[int, object]:
+        """Returns the status code and json body of a response to an API request"""
+        if self.options.latency:
+            time.sleep(self.options.latency)
+        if self.options.error_rate and self.random.random() < self.options.error_rate:
+            return 503, {"message": "Service unavailable"}
+
+        parts = path.split("/")
+        with self.lock:
+            match method, parts:
+                case "GET", ["folders"]:
+                    return 200, list(self.folders.values())
+                case "GET", ["folders", "uid", uid]:
+                    return (200, self.folders[uid]) if uid in self.folders else (404, {"message": "Folder not found"})
+                case "POST", ["folders"]:
+                    return self._create_folder(body or {})
+                case "PUT", ["folders", uid]:
+                    if uid not in self.folders:
+                        return 404, {"message": "Folder not found"}
+                    self.folders[uid]["title"] = (body or {}).get("title", self.folders[uid]["title"])
+                    return 200, self.folders[uid]
+                case "GET", ["search"]:
+                    return 200, self._search(query)
+                case "GET", ["dashboards", "uid", uid, "versions"]:
+                    if uid not in self.dashboards:
+                        return 404, {"message": "Dashboard not found"}
+                    return 200, self._versions(uid, query)
+                case "GET", ["dashboards", "uid", uid, "versions", version]:
+                    if uid not in self.dashboards or not 1 <= int(version) <= self.dashboards[uid][2]:
+                        return 404, {"message": "Dashboard version not found"}
+                    return 200, self._version(uid, int(version))
+                case "GET", ["dashboards", "uid", uid]:
+                    if uid not in self.dashboards:
+                        return 404, {"message": "Dashboard not found"}
+                    return 200, self._dashboard_response(uid)
+                case "GET", ["dashboards", "home"]:
+                    if self.home_uid:
+                        return 200, {"redirectUri": f"/d/{self.home_uid}/home"}
+                    return 200, {"dashboard": {"title": "Home", "panels": []}, "meta": {}}
+                case "POST", ["dashboards", "db"]:
+                    return self._save_dashboard(body or {})
+                case "PATCH" | "PUT", ["org", "preferences"]:
+                    self.home_uid = (body or {}).get("homeDashboardUID")
+                    return 200, {"message": "Preferences updated"}
+
+        return 404, {"message": f"Not implemented: {method} {path}"}
+
+    def _add_folder(self, uid: str, title: str, parent_uid: str | None) -> dict:
+        folder = {"id": self.next_folder_id, "uid": uid, "title": title}
+        if parent_uid:
+            folder["parentUid"] = parent_uid
+        self.folders[uid] = folder
+        self.next_folder_id += 1
+        return folder
+
+    def _create_folder(self, body: dict) -> tuple[int, dict]:
+        uid = body.get("uid") or f"auto-{self.next_folder_id}"
+        if uid in self.folders:
+            return 409, {"message": "A folder with the same uid already exists"}
+        return 200, self._add_folder(uid, body["title"], body.get("parentUid"))
+
+    def _search(self, query: dict[str, list[str]]) -> list[dict]:
+        limit = int(query.get("limit", ["1000"])[0])
+        page = int(query.get("page", ["1"])[0])
+
+        if query.get("type") == ["dash-folder"]:
+            items = [
+                {**folder, "type": "dash-folder", "folderUid": folder.get("parentUid", "")}
+                for folder in self.folders.values()
+            ]
+            return items[(page - 1) * limit : page * limit]
+
+        # As with Grafana, every given parameter must match and a dashboard must have all of the tags
+        uids = list(self.dashboards)
+        if "dashboardUIDs" in query:
+            selected = {uid for value in query["dashboardUIDs"] for uid in value.split(",")}
+            uids = [uid for uid in uids if uid in selected]
+        if "folderIds" in query:
+            ids = {int(folder_id) for value in query["folderIds"] for folder_id in value.split(",")}
+            folder_uids = {folder["uid"] for folder in self.folders.values() if folder["id"] in ids}
+            uids = [uid for uid in uids if self.dashboards[uid][0] in folder_uids]
+        if "tag" in query:
+            uids = [uid for uid in uids if set(query["tag"]).issubset(self._tags(uid))]
+        if "query" in query:
+            text = query["query"][0].lower()
+            uids = [uid for uid in uids if text in self.dashboards[uid][1].lower()]
+
+        return [self._search_item(uid) for uid in uids[(page - 1) * limit : page * limit]]
+
+    def _search_item(self, uid: str) -> dict:
+        folder_uid, title, _ = self.dashboards[uid]
+        folder = self.folders.get(folder_uid, {"id": 0, "uid": "", "title": "General"})
+        return {
+            "id": zlib.crc32(uid.encode()),
+            "uid": uid,
+            "title": title,
+            "uri": f"db/{uid}",
+            "url": f"/d/{uid}",
+            "slug": "",
+            "type": "dash-db",
+            "tags": self._tags(uid),
+            "isStarred": False,
+            "folderId": folder["id"],
+            "folderUid": folder["uid"],
+            "folderTitle": folder["title"],
+            "folderUrl": f"/dashboards/f/{folder['uid']}",
+            "sortMeta": 0,
+        }
+
+    def _tags(self, uid: str) -> list[str]:
+        if uid in self.uploaded:
+            return self.uploaded[uid].get("tags") or []
+        # Each generated dashboard belongs to one of a few teams
+        return [f"team-{zlib.crc32(uid.encode()) % 4}"]
+
+    def _dashboard_response(self, uid: str) -> dict:
+        folder_uid, title, version = self.dashboards[uid]
+        folder = self.folders.get(folder_uid, {"id": 0, "uid": "", "title": "General"})
+        dashboard = self.uploaded.get(uid) or self._generate_dashboard(uid, title)
+        # Grafana sends the meta first
+        return {
+            "meta": {
+                "folderId": folder["id"],
+                "folderUid": folder["uid"],
+                "folderTitle": folder["title"],
+                "version": version,
+            },
+            "dashboard": {**dashboard, "version": version},
+        }
+
+    def _versions(self, uid: str, query: dict[str, list[str]]) -> dict:
+        """The versions of a dashboard newest first, paginated by an offset as with older Grafana versions"""
+        limit = int(query.get("limit", ["1000"])[0])
+        start = int(query.get("start", ["0"])[0])
+        latest = self.dashboards[uid][2] - start
+        versions = [
+            {"id": version, "dashboardUid": uid, "version": version, "parentVersion": version - 1, "message": ""}
+            for version in range(latest, max(latest - limit, 0), -1)
+        ]
+        return {"versions": versions, "continueToken": ""}
+
+    def _version(self, uid: str, version: int) -> dict:
+        dashboard = self.uploaded_versions.get(uid, {}).get(version)
+        if dashboard is None:
+            dashboard = self._generate_dashboard(uid, self.dashboards[uid][1])
+        return {
+            "id": version,
+            "uid": uid,
+            "version": version,
+            "parentVersion": version - 1,
+            "created": "2024-01-01T00:00:00Z",
+            "createdBy": "admin",
+            "message": "",
+            "data": {**dashboard, "version": version},
+        }
+
+    def _generate_dashboard(self, uid: str, title: str) -> dict:
+        """A dashboard with a realistic number of panels, each with a query and field config"""
+        panels = [
+            {
+                "id": i + 1,
+                "type": "timeseries",
+                "title": f"Panel {i}",
+                "gridPos": {"h": 8, "w": 12, "x": (i % 2) * 12, "y": (i // 2) * 8},
+                "datasource": {"type": "prometheus", "uid": "prometheus"},
+                "targets": [{"refId": "A", "expr": f'rate(http_requests_total{{job="{uid}", panel="{i}"}}[5m])'}],
+                "fieldConfig": {"defaults": {"unit": "reqps", "color": {"mode": "palette-classic"}}, "overrides": []},
+                "options": {"legend": {"displayMode": "list", "placement": "bottom"}, "tooltip": {"mode": "single"}},
+            }
+            for i in range(self.options.panels)
+        ]
+        return {
+            "id": zlib.crc32(uid.encode()),
+            "uid": uid,
+            "title": title,
+            "tags": self._tags(uid),
+            "schemaVersion": 39,
+            "panels": panels,
+        }
+
+    def _save_dashboard(self, body: dict) -> tuple[int, dict]:
+        dashboard = body["dashboard"]
+        uid = dashboard.get("uid") or f"auto-{len(self.dashboards)}"
+        folder_uid = body.get("folderUid") or ""
+        version = self.dashboards[uid][2] + 1 if uid in self.dashboards else 1
+        self.dashboards[uid] = (folder_uid, dashboard["title"], version)
+        self.uploaded[uid] = {**dashboard, "uid": uid}
+        self.uploaded_versions.setdefault(uid, {})[version] = self.uploaded[uid]
+        return 200, {"id": zlib.crc32(uid.encode()), "uid": uid, "status": "success", "version": version}
+
+
+def _handler(grafana: FakeGrafana) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        # Keep connections alive so that the client's connection pool is exercised as it would be with Grafana
+        protocol_version = "HTTP/1.1"
+        # The headers and body are written separately, which would otherwise be delayed by Nagle's algorithm
+        disable_nagle_algorithm = True
+
+        def _respond(self, method: str) -> None:
+            url = urlsplit(self.path)
+            path = "/".join(part for part in url.path.split("/") if part)
+            path = path.removeprefix("api/")
+
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length)) if length else None
+
+            status, data = grafana.handle(method, path, parse_qs(url.query), body)
+            content = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):  # noqa: N802
+            self._respond("GET")
+
+        def do_POST(self):  # noqa: N802
+            self._respond("POST")
+
+        def do_PUT(self):  # noqa: N802
+            self._respond("PUT")
+
+        def do_PATCH(self):  # noqa: N802
+            self._respond("PATCH")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def _serve(options: FakeGrafanaOptions, port_queue: multiprocessing.Queue) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(FakeGrafana(options)))
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+@contextmanager
+def fake_grafana(options: FakeGrafanaOptions) -> Iterator[int]:
+    """
+    Runs a fake Grafana server in a separate process, so that it does not add to the memory usage or compete for the GIL
+    of the process being measured
+
+    Yields:
+        the port the server is listening on at 127.0.0.1
+
+    """
+    context = multiprocessing.get_context("spawn")
+    port_queue = context.Queue()
+    process = context.Process(target=_serve, args=(options, port_queue), daemon=True)
+    process.start()
+    try:
+        yield port_queue.get(timeout=60)
+    finally:
+        process.terminate()
+        process.join()
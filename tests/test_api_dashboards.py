@@ -0,0 +1,60 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from grafana_dashboard_manager.api.metrics import Metrics
+from grafana_dashboard_manager.handlers.api_dashboards import ApiDashboards
+
+
+class VersionsApi:
+    """Serves the versions list of a dashboard with the given newest version, newest first"""
+
+    def __init__(self, newest: int, *, paged: bool = True, continue_token: bool = False):
+        """Pages by continueToken if continue_token, otherwise by offset"""
+        self.newest = newest
+        self.paged = paged
+        self.continue_token = continue_token
+        self.metrics = Metrics()
+        self.requests: list[str] = []
+
+    def get(self, resource: str) -> httpx.Response:
+        """Returns a page of versions, ignoring the paging parameters unless paged"""
+        self.requests.append(resource)
+        query = {key: values[0] for key, values in parse_qs(urlsplit(resource).query).items()}
+        limit = int(query["limit"])
+        start = int(query.get("continueToken") or query.get("start") or 0) if self.paged else 0
+        versions = [{"version": version} for version in range(self.newest - start, 0, -1)][:limit]
+        if not self.continue_token:
+            return httpx.Response(200, json=versions)
+        token = str(start + limit) if self.paged and start + limit < self.newest else ""
+        return httpx.Response(200, json={"versions": versions, "continueToken": token})
+
+
+def test_lists_versions_after_watermark_by_offset():
+    """Older Grafana versions are paged by an offset, and paging stops at the known versions"""
+    api = VersionsApi(25)
+    assert ApiDashboards(api).versions("a", after=7, page_size=10) == list(range(8, 26))
+    assert len(api.requests) == 2
+
+
+def test_lists_versions_by_continue_token():
+    """Newer Grafana versions are paged by a continueToken"""
+    api = VersionsApi(25, continue_token=True)
+    assert ApiDashboards(api).versions("a", page_size=10) == list(range(1, 26))
+    assert "continueToken=20" in api.requests[-1]
+
+
+def test_stops_when_server_ignores_paging():
+    """A server that sends the same page whatever the paging parameters doesn't list it forever"""
+    for continue_token in (False, True):
+        api = VersionsApi(25, paged=False, continue_token=continue_token)
+        assert ApiDashboards(api).versions("a", page_size=10) == list(range(16, 26))
+        assert len(api.requests) == 2
@@ -0,0 +1,37 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import re
+import subprocess
+import sys
+
+import pytest
+
+# Dependencies that must not be imported just to parse the arguments, so that the cli starts quickly
+DEFERRED_MODULES = ("httpx", "pydantic", "rich")
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+\d+ \|\s+\d+ \|\s*(\S+)$")
+
+
+def imported_modules(*argv: str) -> set[str]:
+    """Every module imported by running python with argv"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {match.group(1) for line in result.stderr.splitlines() if (match := IMPORT_TIME_LINE.match(line))}
+
+
+@pytest.mark.parametrize("argv", [["--help"], ["upload", "--help"], ["download", "--help"]])
+def test_help_does_not_import_heavy_dependencies(argv):
+    """The heavy dependencies are only imported once a command runs"""
+    modules = imported_modules("-m", "grafana_dashboard_manager", *argv)
+    assert "grafana_dashboard_manager" in modules
+    assert sorted(module for module in modules if module.split(".")[0] in DEFERRED_MODULES) == []
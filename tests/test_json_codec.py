@@ -0,0 +1,88 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import json
+
+import pytest
+
+from grafana_dashboard_manager import json_codec
+
+
+def split(content: bytes, key: str = "dashboard") -> tuple[dict, bytes] | None:
+    """Splits the content, copying the value so it can be compared"""
+    result = json_codec.split_last_member(content, key)
+    return None if result is None else (result[0], bytes(result[1]))
+
+
+def test_splits_last_member():
+    """The members before the key are decoded, and its value is left encoded"""
+    content = b'{"meta": {"version": 3, "url": "/d/x"}, "dashboard": {"title": "A", "panels": [{"id": 1}]}}'
+    assert split(content) == ({"meta": {"version": 3, "url": "/d/x"}}, b'{"title": "A", "panels": [{"id": 1}]}')
+
+
+def test_splits_with_surrounding_whitespace():
+    """Whitespace around the object and its members is allowed"""
+    content = b' \n{\n  "meta": {},\n  "dashboard": {"x": 1}\n}\n'
+    members, value = split(content)
+    assert members == {"meta": {}}
+    assert json.loads(value) == {"x": 1}
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b'{"meta":{},"dashboard":{"x":1},"extra":2}',
+        b'{"meta":{},"dashboard":{"x":1},"extra":{"y":2}}',
+        b'{"meta":{},"dashboard":{"x":1},"extra":[1]}',
+        b'{"meta":{},"dashboard":{"x":"}"},"extra":"{"}',
+        b'{"meta":{},"dashboard":1,"extra":2}',
+        b'{"meta":{},"dashboard":"a","extra":"b"}',
+    ],
+)
+def test_rejects_key_that_is_not_last(content):
+    """A key that is followed by other members can't be split, as its value doesn't run to the end"""
+    assert split(content) is None
+
+
+@pytest.mark.parametrize("content", [b"[1, 2]", b'{"meta": {}}', b'{"meta": {}, "dashboard": {"x": 1}', b"not json"])
+def test_rejects_content_without_last_member(content):
+    """Content that isn't an object ending with the key can't be split"""
+    assert split(content) is None
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        b'{"expr": "rate(x[5m])", "legend": "{{instance}}"}',
+        b'{"a": "quote \\" and brace }", "b": "backslash \\\\"}',
+        b'{"a": "\\\\\\"}\\\\", "b": [{}, [], {"c": []}]}',
+        b'{"a": "", "b": "", "c": "]"}',
+        b'[{"a": 1}, {"b": "["}]',
+        b'"text"',
+        b"12.5",
+        b"null",
+    ],
+)
+def test_keeps_value_with_brackets_and_escapes(value):
+    """Brackets and quotes inside strings don't affect where the value is found to end"""
+    members, split_value = split(b'{"meta": {"title": "{[\\""}, "dashboard": ' + value + b"}")
+    assert members == {"meta": {"title": '{["'}}
+    assert split_value == value
+
+
+def test_decodes_members_larger_than_window(monkeypatch):
+    """Members that don't fit the decode window, including multi-byte characters at its edge, are decoded"""
+    monkeypatch.setattr(json_codec, "DECODE_WINDOW", 8)
+    meta = {"title": "é" * 50, "tags": list(range(20))}
+    content = json.dumps({"meta": meta, "dashboard": {"x": 1}}, ensure_ascii=False).encode()
+    assert split(content) == ({"meta": meta}, b'{"x": 1}')
+
+
+def test_matches_escaped_key():
+    """Keys are compared once their escapes are decoded"""
+    assert split(b'{"a\\"b": 1, "dash\\u0062oard": [1]}') == ({'a"b': 1}, b"[1]")
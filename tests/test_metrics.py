@@ -0,0 +1,30 @@
+"""
+Copyright (c) 2024 BEAM CONNECTIVITY LIMITED
+
+Use of this source code is governed by an MIT-style
+license that can be found in the LICENSE file or at
+https://opensource.org/licenses/MIT.
+"""
+
+import pytest
+
+from grafana_dashboard_manager.api.metrics import endpoint_template
+
+
+@pytest.mark.parametrize(
+    "resource, endpoint",
+    [
+        ("dashboards/uid/abc", "dashboards/uid/:uid"),
+        ("/dashboards/uid/abc?x=1", "dashboards/uid/:uid"),
+        ("dashboards/uid/abc/versions?limit=100&start=100", "dashboards/uid/:uid/versions"),
+        ("dashboards/uid/abc/versions/17", "dashboards/uid/:uid/versions/:version"),
+        ("dashboards/id/3", "dashboards/id/:id"),
+        ("folders/uid/abc", "folders/uid/:uid"),
+        ("folders/abc", "folders/:uid"),
+        ("folders", "folders"),
+        ("search?type=dash-db&page=2", "search"),
+    ],
+)
+def test_identifiers_are_replaced(resource, endpoint):
+    """Each endpoint is a single series, whatever the identifiers in the resource path"""
+    assert endpoint_template(resource) == endpoint